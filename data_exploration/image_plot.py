@@ -1,12 +1,14 @@
 from typing import List, Type
+
+import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib import colors as colors
 from matplotlib import cm as cmx
-from matplotlib.patches import ConnectionPatch
+from matplotlib.collections import LineCollection
 import imageProcessing.utilities as IPUtils
 
 # takes two images (of the same pixel size!) as input and returns a combined image of double the image width
-from image_stiching.pair import Pair
+from image_stiching.pair import Pair, get_pair_points
 
 
 def prepareMatchingImage(left_pixel_array, right_pixel_array, image_width, image_height):
@@ -29,7 +31,7 @@ def plot_side_by_side_pairs(left_px_array: List, right_px_array: List, pairs: Li
     right_px_array : List
         The right image pixel array
     pairs : List[Type[Pair]]
-        The list of pairs to plot
+        The list of pairs to plot, or a PairSet
     title : str
         The title of the plot
     unique_color : bool
@@ -41,21 +43,17 @@ def plot_side_by_side_pairs(left_px_array: List, right_px_array: List, pairs: Li
     ax = plt.gca()
     ax.set_title(title)
 
+    # every pair is a line segment of the combined image, drawn in a single collection
+    left_points, right_points = get_pair_points(pairs)
+    segments = np.stack([left_points, right_points + (width, 0)], axis=1)
+
     if unique_color:
         cmap = plt.cm.jet
         cNorm = colors.Normalize(vmin=0, vmax=len(pairs))
         scalarMap = cmx.ScalarMappable(norm=cNorm, cmap=cmap)
-
-    colorIndex = 0
-    for pair in pairs:
-        if unique_color:
-            colorVal = scalarMap.to_rgba(colorIndex)
-        else:
-            colorVal = 'r'
-        colorIndex += 1
-        point_a = (pair.corner1.x, pair.corner1.y)
-        point_b = (pair.corner2.x + width, pair.corner2.y)
-        connection = ConnectionPatch(point_a, point_b, "data", edgecolor=colorVal, linewidth=1)
-        ax.add_artist(connection)
+        colorVal = scalarMap.to_rgba(np.arange(len(pairs)))
+    else:
+        colorVal = 'r'
+    ax.add_collection(LineCollection(segments, colors=colorVal, linewidths=1))
 
     plt.show()
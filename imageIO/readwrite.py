@@ -28,110 +28,251 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import tempfile
+import time
+import zlib
+
 import imageIO.png
 import numpy as np
-from imageProcessing.utilities import rgbToGreyscale
+
+# PNG filter types tried for every row by writeNdArrayToPNG, average is left out as it rarely wins the heuristic
+# http://www.w3.org/TR/PNG/#9Filter-types
+PNG_FILTER_NONE = 0
+PNG_FILTER_SUB = 1
+PNG_FILTER_UP = 2
+PNG_FILTER_PAETH = 4
+PNG_ROW_FILTERS = (PNG_FILTER_NONE, PNG_FILTER_SUB, PNG_FILTER_UP, PNG_FILTER_PAETH)
 
 
 def readGreyscaleImage(input_filename):
-    image_reader = imageIO.png.Reader(filename=input_filename)
-    # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
-    (image_width, image_height, greyscale_image_rows, greyscale_image_info) = image_reader.read()
+    with open(input_filename, 'rb') as input_file:
+        image_reader = imageIO.png.Reader(file=input_file)
+        # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
+        (image_width, image_height, greyscale_image_rows, greyscale_image_info) = image_reader.read()
 
-    print("read image width={}, height={}".format(image_width, image_height))
+        print("read image width={}, height={}".format(image_width, image_height))
 
-    # our pixel array is a list of lists, where each inner list stores one row of greyscale pixels
-    pixel_array = []
+        # our pixel array is a list of lists, where each inner list stores one row of greyscale pixels
+        pixel_array = []
 
-    for row in greyscale_image_rows:
-        pixel_row = []
-        for idx in range(len(row)):
-            pixel_row.append(row[idx])
+        for row in greyscale_image_rows:
+            pixel_row = []
+            for idx in range(len(row)):
+                pixel_row.append(row[idx])
 
-        pixel_array.append(pixel_row)
+            pixel_array.append(pixel_row)
 
     return (image_width, image_height, pixel_array)
 
 
 def readRGBImageToSeparatePixelArrays(input_filename):
 
-    image_reader = imageIO.png.Reader(filename=input_filename)
-    # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
-    (image_width, image_height, rgb_image_rows, rgb_image_info) = image_reader.read()
-
-    print("read image width={}, height={}".format(image_width, image_height))
+    (image_width, image_height, rgb_array) = readRGBImageToNdArray(input_filename)
 
     # our pixel arrays are lists of lists, where each inner list stores one row of greyscale pixels
-    pixel_array_r = []
-    pixel_array_g = []
-    pixel_array_b = []
-
-    for row in rgb_image_rows:
-        pixel_row_r = []
-        pixel_row_g = []
-        pixel_row_b = []
-        r = 0
-        g = 0
-        b = 0
-        for elem in range(len(row)):
-            # RGB triplets are stored consecutively in image_rows
-            if elem % 3 == 0:
-                r = row[elem]
-            elif elem % 3 == 1:
-                g = row[elem]
-            else:
-                b = row[elem]
-                pixel_row_r.append(r)
-                pixel_row_g.append(g)
-                pixel_row_b.append(b)
-
-        pixel_array_r.append(pixel_row_r)
-        pixel_array_g.append(pixel_row_g)
-        pixel_array_b.append(pixel_row_b)
+    pixel_array_r = rgb_array[:, :, 0].tolist()
+    pixel_array_g = rgb_array[:, :, 1].tolist()
+    pixel_array_b = rgb_array[:, :, 2].tolist()
 
     return (image_width, image_height, pixel_array_r, pixel_array_g, pixel_array_b)
 
 
 def readRGBImageAndConvertToGreyscalePixelArray(input_filename):
 
-    image_reader = imageIO.png.Reader(filename=input_filename)
-    # png reader gives us width and height, as well as RGB data in image_rows (a list of rows of RGB triplets)
-    (image_width, image_height, rgb_image_rows, rgb_image_info) = image_reader.read()
+    (image_width, image_height, pixel_array) = readRGBImageAndConvertToGreyscaleNdArray(input_filename)
+
+    # our pixel array is a list of lists, where each inner list stores one row of greyscale pixels
+    return (image_width, image_height, pixel_array.tolist())
+
+
+def readRGBImageAndConvertToNdArray(input_filename):
+    (image_width, image_height, rgb_array) = readRGBImageToNdArray(input_filename)
+    return rgb_array
+
+
+# Decode a png file straight into a preallocated (height, width, planes) ndarray, one row at a time.
+# 8 bit straightlaced images without palette are unfiltered row by row from the png reader and copied into the
+# array without intermediate python lists, 8 bit interlaced images are filled one Adam7 pass at a time,
+# any other image goes through the generic png reader. The file is closed once the image is decoded.
+def readPNGImageToNdArray(input_filename):
+    with open(input_filename, 'rb') as input_file:
+        return readPNGFileToNdArray(imageIO.png.Reader(file=input_file))
+
+
+# Decode the image of a png reader over an open file into a (height, width, planes) ndarray, as readPNGImageToNdArray
+def readPNGFileToNdArray(image_reader):
+    image_reader.preamble()
+    image_width, image_height, planes = image_reader.width, image_reader.height, image_reader.planes
+
+    if image_reader.bitdepth == 8 and image_reader.interlace and not image_reader.colormap:
+        pixel_array = image_reader._deinterlace_ndarray(image_reader._iter_decompressed_idat())
+        return (image_width, image_height, pixel_array.reshape(image_height, image_width, planes))
+
+    if image_reader.bitdepth != 8 or image_reader.interlace or image_reader.colormap:
+        (image_width, image_height, rows, info) = image_reader.asDirect()
+        dtype = np.uint16 if info['bitdepth'] > 8 else np.uint8
+        pixel_array = np.array([np.asarray(row, dtype=dtype) for row in rows], dtype=dtype)
+        return (image_width, image_height, pixel_array.reshape(image_height, image_width, info['planes']))
+
+    pixel_array = np.empty((image_height, image_width * planes), dtype=np.uint8)
+    raw = image_reader._iter_decompressed_idat()
+    for y, row in enumerate(image_reader._iter_straight_packed(raw)):
+        pixel_array[y] = np.frombuffer(row, dtype=np.uint8)
+
+    return (image_width, image_height, pixel_array.reshape(image_height, image_width, planes))
+
+
+def readRGBImageToNdArray(input_filename):
+    (image_width, image_height, pixel_array) = readPNGImageToNdArray(input_filename)
 
     print("read image width={}, height={}".format(image_width, image_height))
 
-    # our pixel array is a list of lists, where each inner list stores one row of greyscale pixels
-    pixel_array = []
-
-    for row in rgb_image_rows:
-        pixel_row = []
-        r = 0
-        g = 0
-        b = 0
-        for elem in range(len(row)):
-            # RGB triplets are stored consecutively in image_rows
-            if elem % 3 == 0:
-                r = row[elem]
-            elif elem % 3 == 1:
-                g = row[elem]
-            else:
-                b = row[elem]
-                greyscale_value = rgbToGreyscale(r,g,b)
-                pixel_row.append(greyscale_value)
-
-        pixel_array.append(pixel_row)
+    # RGB triplets are the first three planes, an alpha plane is dropped
+    return (image_width, image_height, pixel_array[:, :, :3])
 
-    return (image_width, image_height, pixel_array)
 
+# Decode a png file one row at a time into a (height, width, 3) np.memmap backed by a file, for images that do not
+# fit in memory. Only one IDAT chunk and a block of decompressed rows are held in memory at a time, and readers of
+# the memmap only page in the regions they slice. Without a memmap_filename the memmap is backed by an anonymous temporary file, removed once the memmap
+# is released. Interlaced, palette and non 8 bit images are decoded in memory first and then copied.
+def readRGBImageToMemmap(input_filename, memmap_filename=None):
+    with open(input_filename, 'rb') as input_file:
+        image_reader = imageIO.png.Reader(file=input_file)
+        image_reader.preamble()
+        image_width, image_height, planes = image_reader.width, image_reader.height, image_reader.planes
+
+        if image_reader.bitdepth != 8 or image_reader.interlace or image_reader.colormap:
+            (image_width, image_height, pixel_array) = readPNGFileToNdArray(image_reader)
+            print("read image width={}, height={}".format(image_width, image_height))
+            rgb_array = pixel_array[:, :, :3]
+            memmap_array = createMemmapArray(rgb_array.shape, rgb_array.dtype, memmap_filename)
+            memmap_array[:] = rgb_array
+            return memmap_array
+
+        print("read image width={}, height={}".format(image_width, image_height))
+
+        # RGB triplets are the first three planes, as in readRGBImageToNdArray
+        memmap_array = createMemmapArray((image_height, image_width, min(planes, 3)), np.uint8, memmap_filename)
+        raw = image_reader._iter_decompressed_idat()
+        for y, row in enumerate(image_reader._iter_straight_packed(raw)):
+            memmap_array[y] = np.frombuffer(row, dtype=np.uint8).reshape(image_width, planes)[:, :3]
+
+    return memmap_array
+
+
+# np.memmap of the given shape and dtype in a new file, or in an anonymous temporary file if no filename is given.
+# The memory map keeps its own handle on the temporary file, so the file object is closed straight away.
+def createMemmapArray(shape, dtype, memmap_filename=None):
+    if memmap_filename is None:
+        with tempfile.TemporaryFile() as memmap_file:
+            return np.memmap(memmap_file, dtype=dtype, mode="w+", shape=tuple(shape))
+    return np.memmap(memmap_filename, dtype=dtype, mode="w+", shape=tuple(shape))
+
+
+# Same weights and rounding as rgbToGreyscale, computed for the whole image at once.
+# np.round rounds half to even like the python round used by rgbToGreyscale.
+def readRGBImageAndConvertToGreyscaleNdArray(input_filename):
+    (image_width, image_height, rgb_array) = readRGBImageToNdArray(input_filename)
+    return (image_width, image_height, convertRGBNdArrayToGreyscale(rgb_array))
+
+
+def convertRGBNdArrayToGreyscale(rgb_array):
+    r, g, b = [rgb_array[:, :, i].astype(np.float64) for i in range(3)]
+    return np.round(0.299 * r + 0.587 * g + 0.114 * b).astype(np.uint8)
 
-def readRGBImageAndConvertToNdArray(input_filename):
-    (image_width, image_height, pixel_array_r, pixel_array_g, pixel_array_b) \
-        = readRGBImageToSeparatePixelArrays(input_filename)
-    return np.dstack([pixel_array_r, pixel_array_g, pixel_array_b])
 
 def writeGreyscalePixelArraytoPNG(output_filename, pixel_array, image_width, image_height):
     # now write the pixel array as a greyscale png
-    infile = open(output_filename, 'wb')  # binary mode is important
-    writer = imageIO.png.Writer(image_width, image_height, greyscale=True)
-    writer.write(infile, pixel_array)
-    infile.close()
\ No newline at end of file
+    pixel_array = np.asarray(pixel_array, dtype=np.uint8).reshape(image_height, image_width)
+    writeNdArrayToPNG(output_filename, pixel_array)
+
+
+# Filter every row of a block of rows with each of the candidate filter types, and pick per row the filter with the
+# smallest sum of absolute values of the filtered bytes taken as signed, the heuristic recommended by the png spec.
+# previous_row is the unfiltered row above the block, all zeros for the first block.
+# Returns a (rows, 1 + row bytes) uint8 array of filter type byte followed by the filtered row.
+def filterRowsForPNG(block, previous_row, planes, filter_types=PNG_ROW_FILTERS):
+    rows = block.astype(np.int16)
+    above = np.empty_like(rows)
+    above[0] = previous_row
+    above[1:] = rows[:-1]
+
+    # left is the byte of the previous pixel, upper_left the same byte in the row above, zero before the first pixel
+    left = np.zeros_like(rows)
+    left[:, planes:] = rows[:, :-planes]
+    upper_left = np.zeros_like(rows)
+    upper_left[:, planes:] = above[:, :-planes]
+
+    candidates = []
+    for filter_type in filter_types:
+        if filter_type == PNG_FILTER_NONE:
+            predictor = 0
+        elif filter_type == PNG_FILTER_SUB:
+            predictor = left
+        elif filter_type == PNG_FILTER_UP:
+            predictor = above
+        elif filter_type == PNG_FILTER_PAETH:
+            pa = np.abs(above - upper_left)
+            pb = np.abs(left - upper_left)
+            pc = np.abs(left + above - 2 * upper_left)
+            predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, above, upper_left))
+        else:
+            raise ValueError("unsupported png filter type {}".format(filter_type))
+        candidates.append((rows - predictor).astype(np.uint8))
+
+    candidates = np.stack(candidates)
+    cost = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+    best = np.argmin(cost, axis=0)
+
+    filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = np.asarray(filter_types, dtype=np.uint8)[best]
+    filtered[:, 1:] = candidates[best, np.arange(rows.shape[0])]
+    return filtered
+
+
+# Write a (height, width) greyscale or (height, width, planes) greyscale+alpha, RGB or RGBA uint8 ndarray as a png.
+# Rows are filtered and compressed a block of about chunk_limit bytes at a time, and every compressed block is
+# streamed to the file as its own IDAT chunk, so only one block of the image is copied at any time.
+# compression_level and compression_strategy are passed to zlib, e.g. zlib.Z_RLE is fast on large flat areas.
+# Returns the size of the written file in bytes, which is also printed with the write time if verbose is set.
+def writeNdArrayToPNG(output_filename, pixel_array, compression_level=6, compression_strategy=zlib.Z_DEFAULT_STRATEGY,
+                      filter_types=PNG_ROW_FILTERS, chunk_limit=2 ** 20, verbose=False):
+    start_time = time.perf_counter()
+
+    pixel_array = np.asarray(pixel_array)
+    if pixel_array.dtype != np.uint8:
+        raise ValueError("expected an uint8 pixel array, got {}".format(pixel_array.dtype))
+    if pixel_array.ndim == 2:
+        pixel_array = pixel_array[:, :, np.newaxis]
+    image_height, image_width, planes = pixel_array.shape
+    if planes not in (1, 2, 3, 4):
+        raise ValueError("expected 1 to 4 planes per pixel, got {}".format(planes))
+
+    writer = imageIO.png.Writer(image_width, image_height, greyscale=planes < 3, alpha=planes % 2 == 0, bitdepth=8)
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                                  compression_strategy)
+
+    row_bytes = image_width * planes
+    block_height = max(1, chunk_limit // max(1, row_bytes))
+    previous_row = np.zeros(row_bytes, dtype=np.int16)
+
+    with open(output_filename, 'wb') as outfile:
+        writer.write_preamble(outfile)
+
+        for y in range(0, image_height, block_height):
+            block = pixel_array[y:y + block_height].reshape(-1, row_bytes)
+            compressed = compressor.compress(filterRowsForPNG(block, previous_row, planes, filter_types))
+            if len(compressed):
+                imageIO.png.write_chunk(outfile, b'IDAT', compressed)
+            previous_row = block[-1]
+
+        imageIO.png.write_chunk(outfile, b'IDAT', compressor.flush())
+        # http://www.w3.org/TR/PNG/#11IEND
+        imageIO.png.write_chunk(outfile, b'IEND')
+        file_size = outfile.tell()
+
+    if verbose:
+        print("wrote image width={}, height={}, size={} bytes in {:.4f}s".format(
+            image_width, image_height, file_size, time.perf_counter() - start_time))
+
+    return file_size
@@ -28,9 +28,82 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import numpy as np
+
 import imageProcessing.utilities as IPUtils
 
-def computeSeparableConvolution2DOddNTapBorderZero(pixel_array, image_width, image_height, kernelAlongX, kernelAlongY = []):
+# Available convolution engines. The numpy engine operates on whole rows/columns of an ndarray at once,
+# the python engine is the original list based implementation and is kept as reference for equivalence tests.
+ENGINE_NUMPY = "numpy"
+ENGINE_PYTHON = "python"
+CONVOLUTION_ENGINES = (ENGINE_NUMPY, ENGINE_PYTHON)
+
+default_engine = ENGINE_NUMPY
+
+
+def setDefaultConvolutionEngine(engine):
+    global default_engine
+    if engine not in CONVOLUTION_ENGINES:
+        raise ValueError("unknown convolution engine {}, expected one of {}".format(engine, CONVOLUTION_ENGINES))
+    default_engine = engine
+
+
+# The numpy engine returns an ndarray and the python engine a list of lists. Both support read access by
+# result[y][x], which is all that the callers (smoothing, harris_util and pixelops) do with the result. A caller
+# that appends to the rows or relies on python number types has to select the python engine.
+def computeSeparableConvolution2DOddNTapBorderZero(pixel_array, image_width, image_height, kernelAlongX, kernelAlongY = [],
+                                                   engine = None):
+
+    if engine is None:
+        engine = default_engine
+
+    if engine == ENGINE_NUMPY:
+        return computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixel_array, kernelAlongX, kernelAlongY)
+    elif engine == ENGINE_PYTHON:
+        return computeSeparableConvolution2DOddNTapBorderZeroReference(pixel_array, image_width, image_height,
+                                                                        kernelAlongX, kernelAlongY)
+
+    raise ValueError("unknown convolution engine {}, expected one of {}".format(engine, CONVOLUTION_ENGINES))
+
+
+# ndarray version of the separable convolution with the same zero border semantics as the reference implementation.
+# float32 and float64 input keep their dtype, any other input (e.g. int greyscale lists) is computed in float64.
+# The taps are accumulated in the same order as the reference, so float64 results are identical to it.
+def computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixel_array, kernelAlongX, kernelAlongY = [], dtype = None):
+
+    if len(kernelAlongY) == 0:
+        kernelAlongY = kernelAlongX
+
+    pixels = np.asarray(pixel_array)
+    if dtype is None:
+        dtype = pixels.dtype if pixels.dtype in (np.float32, np.float64) else np.float64
+    dtype = np.dtype(dtype)
+    pixels = pixels.astype(dtype, copy=False)
+    image_height, image_width = pixels.shape
+
+    intermediate = np.zeros((image_height, image_width), dtype=dtype)
+    final = np.zeros((image_height, image_width), dtype=dtype)
+
+    # two pass algorithm for separable convolutions, each tap is applied to the full valid region at once
+
+    kernel_offset = len(kernelAlongX) // 2
+    valid_width = image_width - 2 * kernel_offset
+    if valid_width > 0:
+        accumulator = intermediate[:, kernel_offset:kernel_offset + valid_width]
+        for tap, weight in enumerate(kernelAlongX):
+            accumulator += dtype.type(weight) * pixels[:, tap:tap + valid_width]
+
+    kernel_offset = len(kernelAlongY) // 2
+    valid_height = image_height - 2 * kernel_offset
+    if valid_height > 0:
+        accumulator = final[kernel_offset:kernel_offset + valid_height, :]
+        for tap, weight in enumerate(kernelAlongY):
+            accumulator += dtype.type(weight) * intermediate[tap:tap + valid_height, :]
+
+    return final
+
+
+def computeSeparableConvolution2DOddNTapBorderZeroReference(pixel_array, image_width, image_height, kernelAlongX, kernelAlongY = []):
 
     if len(kernelAlongY) == 0:
         kernelAlongY = kernelAlongX
@@ -61,4 +134,4 @@ def computeSeparableConvolution2DOddNTapBorderZero(pixel_array, image_width, ima
                     convolution = convolution + kernelAlongY[kernel_offset+yy] * intermediate[y+yy][x]
                 final[y][x] = convolution
 
-    return final
\ No newline at end of file
+    return final
@@ -0,0 +1,107 @@
+from collections import namedtuple
+
+import numpy as np
+
+
+# Summed area tables of an image and of its square. Both tables have a leading row and column of zeros, so the sum
+# over the rectangle [top, top + height) x [left, left + width) is
+#   table[top + height, left + width] - table[top, left + width] - table[top + height, left] + table[top, left]
+# The tables are accumulated relative to the mean of the image (offset), which keeps their magnitude, and the
+# cancellation between the four terms, small. The rectangle statistics add the offset back.
+# A stack of images (..., H, W) has a stack of tables (..., H + 1, W + 1) and an offset per image.
+IntegralImages = namedtuple("IntegralImages", "sum sum_of_squares offset")
+
+# relative rounding error of the tables, energies below it are treated as zero (e.g. flat rectangles)
+ENERGY_TOLERANCE = 64 * np.finfo(np.float64).eps
+
+
+# energy of the whole image around its mean, or of every image of a stack, the magnitude of the tables
+def computeImageEnergy(pixel_array):
+
+    pixels = np.asarray(pixel_array, dtype=np.float64)
+    if pixels.size == 0:
+        return np.zeros(pixels.shape[:-2])
+    return np.sum(np.square(pixels - pixels.mean(axis=(-2, -1), keepdims=True)), axis=(-2, -1))
+
+
+# energy up to which a rectangle is flat, the same rule for the statistics of the tables and the direct statistics of
+# a rectangle, so that both agree on which rectangles are flat. The rounding error of the tables grows with the energy
+# of the image, the one of the direct statistics with the squared mean of the rectangle.
+def computeFlatEnergyTolerance(mean, area, image_energy):
+
+    return ENERGY_TOLERANCE * (image_energy + area * np.square(mean))
+
+
+def computeIntegralImages(pixel_array):
+
+    pixels = np.asarray(pixel_array, dtype=np.float64)
+    image_height, image_width = pixels.shape[-2:]
+    offset = pixels.mean(axis=(-2, -1)) if pixels.size > 0 else np.zeros(pixels.shape[:-2])
+
+    # the tables are accumulated in place, first down the columns then along the rows
+    sum_table = np.zeros(pixels.shape[:-2] + (image_height + 1, image_width + 1))
+    sum_of_squares_table = np.zeros(pixels.shape[:-2] + (image_height + 1, image_width + 1))
+    sums = sum_table[..., 1:, 1:]
+    squares = sum_of_squares_table[..., 1:, 1:]
+    np.subtract(pixels, offset[..., None, None], out=sums)
+    np.square(sums, out=squares)
+    for table in (sums, squares):
+        np.cumsum(table, axis=-2, out=table)
+        np.cumsum(table, axis=-1, out=table)
+
+    return IntegralImages(sum_table, sum_of_squares_table, offset)
+
+
+# sum over every rectangle of a single image, top, left, height and width are scalars or arrays of the same shape
+def computeRectangleSums(table, top, left, height, width):
+
+    bottom = np.asarray(top) + height
+    right = np.asarray(left) + width
+    return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+
+# sum over the height x width rectangle at every position of the tables, shape (..., H - height + 1, W - width + 1)
+def computeAllRectangleSums(table, height, width):
+
+    return (table[..., height:, width:] - table[..., :-height, width:]
+            - table[..., height:, :-width] + table[..., :-height, :-width])
+
+
+# mean and energy (sum of the squared deviations from the mean) of every rectangle, in O(1) per rectangle
+def computeRectangleMeanAndEnergy(integral_images, top, left, height, width):
+
+    area = height * width
+    sums = computeRectangleSums(integral_images.sum, top, left, height, width)
+    squares = computeRectangleSums(integral_images.sum_of_squares, top, left, height, width)
+    return finishMeanAndEnergy(sums, squares, area, integral_images.offset,
+                               integral_images.sum_of_squares[-1, -1])
+
+
+# mean and energy of the height x width rectangle at every position of the image, or of every image of a stack
+def computeAllRectangleMeanAndEnergy(integral_images, height, width):
+
+    area = height * width
+    sums = computeAllRectangleSums(integral_images.sum, height, width)
+    squares = computeAllRectangleSums(integral_images.sum_of_squares, height, width)
+    return finishMeanAndEnergy(sums, squares, area, integral_images.offset[..., None, None],
+                               integral_images.sum_of_squares[..., -1:, -1:])
+
+
+def computeRectangleMeanAndVariance(integral_images, top, left, height, width):
+
+    (mean, energy) = computeRectangleMeanAndEnergy(integral_images, top, left, height, width)
+    return (mean, energy / (height * width))
+
+
+def finishMeanAndEnergy(sums, squares, area, offset, total_squares):
+
+    centered_mean = sums / area
+    energy = squares - sums * centered_mean
+    mean = centered_mean + offset
+
+    # the energy is a difference of sums as large as the whole table, anything within its rounding error is zero,
+    # total_squares is the energy of the image around its mean
+    tolerance = computeFlatEnergyTolerance(mean, area, total_squares)
+    energy = np.where(energy > tolerance, energy, 0.0)
+
+    return (mean, energy)
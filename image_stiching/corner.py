@@ -1,5 +1,6 @@
 import heapq
-from typing import Tuple, List, Type
+from collections.abc import Sequence
+from typing import Tuple, List, Type, Optional
 import numpy as np
 
 """
@@ -19,6 +20,9 @@ the highest response corner.
 # Default image type is np array.
 ImageArray = np.ndarray
 
+# Compact representation of corners, one record per corner
+CORNER_DTYPE = np.dtype([("x", np.int64), ("y", np.int64), ("corner_response", np.float64)])
+
 
 class Corner:
     """Class Corner
@@ -72,3 +76,199 @@ def get_all_corner_from_response(corner_response: ImageArray) -> List[Type[Corne
     for index, val in np.ndenumerate(corner_response):
         heapq.heappush(pq, Corner(index, val))
     return pq
+
+
+def get_n_strongest_corner_from_response(corner_response: ImageArray, n_corner: Optional[int] = None) -> np.ndarray:
+    """
+    Get the n strongest corner in the image without creating a Corner object per pixel.
+    Suppressed pixels (response of exactly 0) are removed first, the n strongest of the remaining pixels are then
+    selected with a partial sort, and only those are sorted.
+
+    Parameters
+    ----------
+    corner_response : np.ndarray
+        Harris Response which contains the intensity of how the pixel represent a corner, where the location
+        maps to the pixel index.
+    n_corner : Optional[int]
+        Number of corners to select, if none are supplied all non suppressed corners are returned.
+    Returns
+    -------
+    np.ndarray
+        Record array of CORNER_DTYPE with fields x, y and corner_response, sorted by decreasing response.
+        Corners with the same response are in raster order.
+    """
+    corner_response = np.asarray(corner_response)
+    flat_response = corner_response.ravel()
+    candidates = np.flatnonzero(flat_response != 0)
+
+    if n_corner is not None and n_corner < len(candidates):
+        if n_corner <= 0:
+            candidates = candidates[:0]
+        else:
+            # the n strongest unordered, then pad with every candidate tied with the weakest of them,
+            # so the raster order tie break below does not depend on the partition
+            strongest = np.argpartition(-flat_response[candidates], n_corner - 1)[:n_corner]
+            weakest = flat_response[candidates[strongest]].min()
+            candidates = candidates[flat_response[candidates] >= weakest]
+
+    order = np.lexsort((candidates, -flat_response[candidates]))
+    candidates = candidates[order][:n_corner]
+
+    corners = np.empty(len(candidates), dtype=CORNER_DTYPE)
+    corners["y"], corners["x"] = np.unravel_index(candidates, corner_response.shape)
+    corners["corner_response"] = flat_response[candidates]
+    return corners
+
+
+class CornerSet(Sequence):
+    """Class CornerSet
+        Columnar set of corners: contiguous arrays of the x, y coordinates and the Harris response, and optionally
+        a (N, D) matrix of the flattened feature descriptors, row i being the descriptor of corner i.
+        Indexing with an integer returns a Corner view of the corner, created when first accessed and kept so that
+        the same object is returned on every access, so a CornerSet can be used wherever a list of Corner is.
+        Indexing with a slice, an index array or a boolean mask returns a new CornerSet.
+        The Corner views are read only copies, setting their attributes does not change the CornerSet.
+    """
+    x: np.ndarray = None
+    y: np.ndarray = None
+    corner_response: np.ndarray = None
+    feature_descriptors: Optional[np.ndarray] = None
+    descriptor_shape: Optional[Tuple[int, ...]] = None
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, corner_response: np.ndarray,
+                 feature_descriptors: Optional[np.ndarray] = None,
+                 descriptor_shape: Optional[Tuple[int, ...]] = None):
+        """Class Constructor
+        Parameters
+        ----------
+        x : np.ndarray
+            (N,) x coordinate of every corner
+        y : np.ndarray
+            (N,) y coordinate of every corner
+        corner_response : np.ndarray
+            (N,) Harris Response of every corner
+        feature_descriptors : Optional[np.ndarray]
+            (N, D) flattened feature descriptor of every corner
+        descriptor_shape : Optional[Tuple[int, ...]]
+            shape of the feature descriptor of the Corner views, e.g. (patch_size, patch_size), the flat rows of
+            feature_descriptors are used if none is supplied
+        """
+        self.x = np.ascontiguousarray(x, dtype=np.int64).reshape(-1)
+        self.y = np.ascontiguousarray(y, dtype=np.int64).reshape(-1)
+        self.corner_response = np.ascontiguousarray(corner_response, dtype=np.float64).reshape(-1)
+        if not len(self.x) == len(self.y) == len(self.corner_response):
+            raise ValueError(f"x, y and corner_response must have the same length, got {len(self.x)}, "
+                             f"{len(self.y)} and {len(self.corner_response)}")
+
+        if feature_descriptors is not None:
+            feature_descriptors = np.asarray(feature_descriptors)
+            # an empty set keeps the length of the descriptors, which can not be inferred from zero rows
+            n_columns = int(np.prod(feature_descriptors.shape[1:])) if len(self.x) == 0 else -1
+            feature_descriptors = feature_descriptors.reshape(len(self.x), n_columns)
+        self.feature_descriptors = feature_descriptors
+        self.descriptor_shape = descriptor_shape
+        self._materialized: List[Optional[Corner]] = [None] * len(self.x)
+
+    @classmethod
+    def from_records(cls, corners: np.ndarray, feature_descriptors: Optional[np.ndarray] = None,
+                     descriptor_shape: Optional[Tuple[int, ...]] = None) -> "CornerSet":
+        """
+        Create a CornerSet from a record array of CORNER_DTYPE, e.g. the result of
+        get_n_strongest_corner_from_response
+        """
+        return cls(corners["x"], corners["y"], corners["corner_response"], feature_descriptors, descriptor_shape)
+
+    @classmethod
+    def from_corners(cls, corners: List[Type[Corner]]) -> "CornerSet":
+        """
+        Create a CornerSet from a list of Corner, with their feature descriptors if every corner has one
+        """
+        if isinstance(corners, CornerSet):
+            return corners
+
+        corners = list(corners)
+        feature_descriptors, descriptor_shape = None, None
+        if corners and all(c.feature_descriptor is not None for c in corners):
+            descriptor_shape = np.shape(corners[0].feature_descriptor)
+            feature_descriptors = np.array([np.ravel(c.feature_descriptor) for c in corners])
+        return cls([c.x for c in corners], [c.y for c in corners], [c.corner_response for c in corners],
+                   feature_descriptors, descriptor_shape)
+
+    def to_records(self) -> np.ndarray:
+        """
+        Get the corners as a record array of CORNER_DTYPE
+        """
+        corners = np.empty(len(self), dtype=CORNER_DTYPE)
+        corners["x"], corners["y"], corners["corner_response"] = self.x, self.y, self.corner_response
+        return corners
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        (N, 2) x, y coordinate of every corner
+        """
+        return np.stack([self.x, self.y], axis=1).astype(np.float64)
+
+    def with_feature_descriptors(self, feature_descriptors: np.ndarray,
+                                 descriptor_shape: Optional[Tuple[int, ...]] = None) -> "CornerSet":
+        """
+        Get the same corners with the (N, D) feature descriptor matrix
+        """
+        return CornerSet(self.x, self.y, self.corner_response, feature_descriptors, descriptor_shape)
+
+    def sort_by_response(self) -> "CornerSet":
+        """
+        Get the corners sorted by decreasing response, corners with the same response keep their order
+        """
+        return self[np.argsort(-self.corner_response, kind="stable")]
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._get_corner(int(index))
+
+        if isinstance(index, slice):
+            index = np.arange(len(self))[index]
+        index = np.asarray(index)
+        feature_descriptors = None if self.feature_descriptors is None else self.feature_descriptors[index]
+        return CornerSet(self.x[index], self.y[index], self.corner_response[index], feature_descriptors,
+                         self.descriptor_shape)
+
+    def _get_corner(self, index: int) -> Corner:
+        corner = self._materialized[index]
+        if corner is None:
+            corner = Corner((self.y[index].item(), self.x[index].item()), self.corner_response[index].item())
+            if self.feature_descriptors is not None:
+                descriptor = self.feature_descriptors[index]
+                corner.feature_descriptor = descriptor if self.descriptor_shape is None \
+                    else descriptor.reshape(self.descriptor_shape)
+            self._materialized[index] = corner
+        return corner
+
+    def __getstate__(self):
+        # the Corner views are not pickled, they are created again when accessed
+        state = self.__dict__.copy()
+        state["_materialized"] = [None] * len(self)
+        return state
+
+    def __repr__(self):
+        return str(list(self))
+
+
+def get_corner_points(corners: List[Type[Corner]]) -> np.ndarray:
+    """
+    Get the coordinate of every corner
+    Parameters
+    ----------
+    corners : List[Type[Corner]]
+        List of corners, or a CornerSet
+    Returns
+    -------
+    np.ndarray
+        (N, 2) x, y coordinate of every corner
+    """
+    if isinstance(corners, CornerSet):
+        return corners.points
+    return np.array([(c.x, c.y) for c in corners], dtype=np.float64).reshape(-1, 2)
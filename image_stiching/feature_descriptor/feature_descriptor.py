@@ -1,8 +1,14 @@
 from typing import List, Type, Tuple, Optional
 import numpy as np
-from image_stiching.corner import Corner
-from image_stiching.harris_conrner_detection.harris_util import compute_gaussian_averaging
-from image_stiching.pair import Pair
+from numpy.lib.stride_tricks import sliding_window_view
+
+import imageProcessing.convolve2D as IPConv2D
+import imageProcessing.integralimage as IPIntegral
+from image_stiching.corner import Corner, CornerSet, get_corner_points
+from image_stiching.feature_descriptor.grid_index import GridIndex
+from image_stiching.harris_conrner_detection.harris_util import get_gaussian_kernel
+from image_stiching.homography.homography import compute_map_points
+from image_stiching.pair import Pair, PairSet
 from image_stiching.performance_evaulation.timer import measure_elapsed_time
 
 """
@@ -12,15 +18,38 @@ Feature Descriptor is a class that is used to compute the feature descriptor of
 
 ImageArray = np.ndarray
 
+# Type of the feature descriptor matrix, single precision halves the memory and the cost of the ncc products
+DESCRIPTOR_DTYPE = np.float32
+
+# The patch statistics come from summed area tables when the patches cover at least this many times the pixels of
+# the image, below it building the tables costs more than the direct statistics of the patches
+INTEGRAL_IMAGE_MIN_COVERAGE = 3
+
+# Minimum ncc of the best location of a dense search for a corner to be matched
+DENSE_NCC_MIN_SCORE = 0.8
+
+# Minimum ncc of a corner with a single candidate within the search radius, which has no second best for the ratio test
+LONE_CANDIDATE_MIN_NCC = 0.8
+
 
 @measure_elapsed_time
 def match_corner_by_ncc(image_data_1: Tuple[ImageArray, List[Type[Corner]]],
                         image_data_2: Tuple[ImageArray, List[Type[Corner]]],
                         feature_descriptor_patch_size: Optional[int] = 15,
-                        threshold: Optional[float] = 0.85) -> \
-        List[Pair]:
+                        threshold: Optional[float] = 0.85,
+                        homography: Optional[np.ndarray] = None,
+                        translation: Optional[Tuple[float, float]] = None,
+                        search_radius: Optional[float] = 20,
+                        dense_search: Optional[bool] = False) -> \
+        PairSet:
     """
     Match the feature descriptors of the corners.
+    If a prior homography or a coarse translation is supplied, the matching is guided: each corner of the first
+    image is only compared with the corners of the second image within search_radius of its predicted location,
+    see compare_ncc_within_radius, otherwise every pair of corners is compared.
+    With dense_search, the descriptor of each corner of the first image is instead scored against every location
+    around its prediction in the second image, see match_corner_by_dense_ncc, and the corners of the second image
+    are not used.
 
     Parameters
     ----------
@@ -32,68 +61,383 @@ def match_corner_by_ncc(image_data_1: Tuple[ImageArray, List[Type[Corner]]],
         Size of the patch of normalized cross correlation
     threshold : Optional[float]
         Threshold ratio for the best match and the second-best match.
+    homography : Optional[np.ndarray]
+        Prior homography mapping the first image coordinate to the second image coordinate
+    translation : Optional[Tuple[float, float]]
+        Coarse x, y offset of the second image, only used if no homography is supplied
+    search_radius : Optional[float]
+        Search radius in pixel of the guided matching
+    dense_search : Optional[bool]
+        Whether to search every location around the prediction, requires a homography or a translation
 
     Returns
     -------
-        List[Tuple[Type[Corner], Type[Corner]]] : List of matched corners
+        PairSet : matched corners
     """
     left_px_array, left_corners = image_data_1
     right_px_array, right_corners = image_data_2
 
     left_corners = compute_feature_descriptor(left_corners, left_px_array, feature_descriptor_patch_size)
+    if dense_search:
+        if homography is None and translation is None:
+            raise ValueError("dense_search requires a homography or a translation to predict the locations")
+        predicted_points = predict_corner_locations(left_corners, homography=homography, translation=translation)
+        return match_corner_by_dense_ncc(left_corners, right_px_array, predicted_points, search_radius)
+
     right_corners = compute_feature_descriptor(right_corners, right_px_array, feature_descriptor_patch_size)
-    pairs = compare_all_ncc(left_corners, right_corners, threshold)
+    return match_described_corners(left_corners, right_corners, threshold, homography=homography,
+                                   translation=translation, search_radius=search_radius)
 
-    return pairs
+
+def match_described_corners(left_corners: List[Type[Corner]],
+                            right_corners: List[Type[Corner]],
+                            threshold: float,
+                            homography: Optional[np.ndarray] = None,
+                            translation: Optional[Tuple[float, float]] = None,
+                            search_radius: Optional[float] = 20) -> PairSet:
+    """
+    Match corners whose feature descriptors are already computed, see match_corner_by_ncc.
+
+    Parameters
+    ----------
+    left_corners : List[Type[Corner]]
+        List of corners of the first image with their feature descriptors
+    right_corners : List[Type[Corner]]
+        List of corners of the second image with their feature descriptors
+    threshold : float
+        Threshold ratio for the best match and the second-best match.
+    homography : Optional[np.ndarray]
+        Prior homography mapping the first image coordinate to the second image coordinate
+    translation : Optional[Tuple[float, float]]
+        Coarse x, y offset of the second image, only used if no homography is supplied
+    search_radius : Optional[float]
+        Search radius in pixel of the guided matching
+
+    Returns
+    -------
+        PairSet : matched corners
+    """
+    if homography is None and translation is None:
+        return compare_all_ncc_batched(left_corners, right_corners, threshold)
+
+    predicted_points = predict_corner_locations(left_corners, homography=homography, translation=translation)
+    return compare_ncc_within_radius(left_corners, right_corners, predicted_points, search_radius, threshold)
+
+
+def smooth_feature_image(img: np.ndarray) -> np.ndarray:
+    """
+    Smooth the image the feature descriptors are computed from
+
+    Parameters
+    ----------
+    img : np.ndarray
+        Greyscale image
+
+    Returns
+    -------
+        np.ndarray, the image smoothed by a 3 x 3 gaussian, in float64
+    """
+    return IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(
+        img, get_gaussian_kernel(3, sigma=1), dtype=np.float64)
 
 
 @measure_elapsed_time
-def compute_feature_descriptor(corners: List[Type[Corner]], img: np.ndarray, patch_size: int) -> \
-        List[Type[Corner]]:
+def compute_feature_descriptor(corners: List[Type[Corner]], img: np.ndarray, patch_size: int,
+                               dtype: Optional[np.dtype] = DESCRIPTOR_DTYPE,
+                               integral_images: Optional[IPIntegral.IntegralImages] = None) -> CornerSet:
     """
     Get the patches from the image
     The patch is the region of interest around the corner, which is used for the feature descriptor.
     The patch is a square of size patch_size x patch_size. If a contour is too close to the border,
     the corner is not considered.
+    All patches are gathered at once from a sliding window view of the smoothed image, then mean centered and
+    normalised together, so the rows of the descriptor matrix are ready for the matrix multiplication of the ncc.
+    When the patches cover more pixels than INTEGRAL_IMAGE_MIN_COVERAGE times the image, or when the tables are
+    supplied, the mean and the norm of every patch come from the summed area tables of the image in O(1) whatever
+    the patch size. Flat patches have a zero descriptor, on both paths a patch is flat when its energy is within
+    the tolerance of IPIntegral.computeFlatEnergyTolerance.
 
     Parameters
     ----------
     corners : List[Type[Corner]]
-        List of corners that is outputted by the harris corner detection
+        List of corners that is outputted by the harris corner detection, or a CornerSet
     patch_size : int
         Size of the patch of normalized cross correlation
     img : np.ndarray
         Image that is used to get the patches
+    dtype : Optional[np.dtype]
+        Type of the feature descriptors, the normalisation is computed in float64 before the conversion
+    integral_images : Optional[IPIntegral.IntegralImages]
+        Summed area tables of the smoothed image, see smooth_feature_image, e.g. shared with a dense search
 
     Returns
     -------
-        List[Type[Corner]] : List of corners with the patches
+        CornerSet : the corners away from the border, with the (N, patch_size^2) feature descriptor matrix
     """
+    corners = CornerSet.from_corners(corners)
     center_index = patch_size // 2
 
-    img = np.array(img)
-    img = compute_gaussian_averaging(img, windows_size=3)
+    img = smooth_feature_image(img)
 
-    result_corners = []
+    # ignore border
     height, width = img.shape
-    for c in corners:
-        # ignore border
-        if not (c.x < center_index or c.x >= width - center_index
-                or c.y < center_index or c.y >= height - center_index):
-            # getting the window
-            patch: np.ndarray = img[c.y - center_index: c.y + center_index + 1,
-                                c.x - center_index: c.x + center_index + 1]
+    inside = (corners.x >= center_index) & (corners.x < width - center_index) \
+        & (corners.y >= center_index) & (corners.y < height - center_index)
+    corners = corners[inside]
+    if len(corners) == 0:
+        return corners.with_feature_descriptors(np.zeros((0, patch_size * patch_size), dtype=dtype),
+                                                (patch_size, patch_size))
+
+    # (N, patch_size, patch_size) windows around every corner, gathered with a single fancy indexing
+    top, left = corners.y - center_index, corners.x - center_index
+    windows = sliding_window_view(img, (patch_size, patch_size))
+    patches = windows[top, left].reshape(len(corners), -1)
+
+    # normalize every patch to zero mean and unit norm, flat patches are left to zero
+    if integral_images is None and len(corners) * patch_size ** 2 >= INTEGRAL_IMAGE_MIN_COVERAGE * height * width:
+        integral_images = IPIntegral.computeIntegralImages(img)
+    if integral_images is not None:
+        mean, energy = IPIntegral.computeRectangleMeanAndEnergy(integral_images, top, left, patch_size, patch_size)
+    else:
+        mean = patches.mean(axis=1)
+        energy = np.sum((patches - mean[:, None]) ** 2, axis=1)
+        # the same flat patches as the summed area tables
+        tolerance = IPIntegral.computeFlatEnergyTolerance(mean, patch_size ** 2, IPIntegral.computeImageEnergy(img))
+        energy[energy <= tolerance] = 0
+
+    with np.errstate(divide="ignore"):
+        inverse_std = np.where(energy > 0, 1 / np.sqrt(energy), 0.0)
+    patches -= mean[:, None]
+    patches *= inverse_std[:, None]
+
+    return corners.with_feature_descriptors(patches.astype(dtype, copy=False), (patch_size, patch_size))
+
+
+def compute_dense_ncc(feature_descriptor: np.ndarray, search_region: np.ndarray,
+                      integral_images: Optional[IPIntegral.IntegralImages] = None) -> np.ndarray:
+    """
+    Score a feature descriptor against every location of a search region.
+    As the descriptor is zero mean with unit norm, the ncc at a location is the correlation of the descriptor with
+    the window at that location, divided by the norm of the window around its mean. The norms of all windows come
+    from the summed area tables of the region.
 
-            # pre-compute the standard deviation and normalize the patch
-            patch = (patch - np.mean(patch))
-            std = (np.sqrt(np.sum(patch ** 2)))
+    Parameters
+    ----------
+    feature_descriptor : np.ndarray
+        (P, Q) feature descriptor, e.g. of compute_feature_descriptor
+    search_region : np.ndarray
+        (H, W) region of the smoothed image, see smooth_feature_image
+    integral_images : Optional[IPIntegral.IntegralImages]
+        Summed area tables of the search region, computed if none are supplied
 
-            # set feature descriptor and handle zero division error
-            c.feature_descriptor = patch / std if std != 0 else patch / 1e-10
+    Returns
+    -------
+        np.ndarray, (H - P + 1, W - Q + 1) ncc of the window with its top left corner at every location,
+        0 where the window is flat
+    """
+    template = np.asarray(feature_descriptor, dtype=np.float64)
+    height, width = template.shape
+    if integral_images is None:
+        integral_images = IPIntegral.computeIntegralImages(search_region)
 
-            result_corners.append(c)
+    correlation = np.einsum("ijkl,kl->ij", sliding_window_view(np.asarray(search_region, dtype=np.float64),
+                                                               (height, width)), template)
+    _, energy = IPIntegral.computeAllRectangleMeanAndEnergy(integral_images, height, width)
+    norm = np.sqrt(energy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norm > 0, correlation / norm, 0.0)
 
-    return result_corners
+
+def compute_dense_ncc_fft(feature_descriptors: np.ndarray, search_regions: np.ndarray) -> np.ndarray:
+    """
+    Score every feature descriptor against every location of its own search region, see compute_dense_ncc.
+    The correlations of a whole batch are computed in the frequency domain, the correlation with a template of
+    P x Q costs O(log(H W)) per location instead of O(P Q), and the norms of the windows come from the summed area
+    tables of the regions.
+
+    Parameters
+    ----------
+    feature_descriptors : np.ndarray
+        (B, P, Q) zero mean and unit norm feature descriptors, e.g. of compute_feature_descriptor
+    search_regions : np.ndarray
+        (B, H, W) region of the smoothed image of every descriptor, see smooth_feature_image
+
+    Returns
+    -------
+        np.ndarray, (B, H - P + 1, W - Q + 1) ncc of the window with its top left corner at every location,
+        0 where the window is flat
+    """
+    templates = np.asarray(feature_descriptors, dtype=np.float64)
+    regions = np.asarray(search_regions, dtype=np.float64)
+    height, width = templates.shape[-2:]
+    region_shape = regions.shape[-2:]
+
+    # circular cross correlation, the valid locations are the ones where the template does not wrap around
+    spectrum = np.fft.rfft2(regions, s=region_shape) * np.conj(np.fft.rfft2(templates, s=region_shape))
+    correlation = np.fft.irfft2(spectrum, s=region_shape)[..., :region_shape[0] - height + 1,
+                                                          :region_shape[1] - width + 1]
+
+    _, energy = IPIntegral.computeAllRectangleMeanAndEnergy(IPIntegral.computeIntegralImages(regions), height, width)
+    norm = np.sqrt(energy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norm > 0, correlation / norm, 0.0)
+
+
+def find_ncc_peaks(surfaces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the maximum of every ncc surface, refined to sub-pixel by fitting a parabola through the maximum and its
+    two neighbours along x and along y. There is no refinement along an axis where the maximum is on the border of
+    the surface, or next to a location excluded with -inf.
+
+    Parameters
+    ----------
+    surfaces : np.ndarray
+        (B, H, W) ncc surfaces, e.g. of compute_dense_ncc_fft
+
+    Returns
+    -------
+        Tuple[np.ndarray, np.ndarray], (B, 2) x, y location of every peak in the surface coordinates, and (B,)
+        interpolated ncc at every peak
+    """
+    surfaces = np.asarray(surfaces, dtype=np.float64)
+    batch, height, width = surfaces.shape
+    rows = np.arange(batch)
+    peak_y, peak_x = np.unravel_index(np.argmax(surfaces.reshape(batch, -1), axis=1), (height, width))
+    peak = surfaces[rows, peak_y, peak_x]
+
+    def parabola_vertex(before, after, available):
+        # vertex of the parabola through (-1, before), (0, peak), (1, after)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            curvature = before - 2 * peak + after
+            available = available & np.isfinite(before) & np.isfinite(after) & (curvature < 0)
+            offset = np.clip(np.where(available, 0.5 * (before - after) / curvature, 0.0), -0.5, 0.5)
+            return offset, np.where(available, -0.25 * (before - after) * offset, 0.0)
+
+    inside_x = (peak_x > 0) & (peak_x < width - 1)
+    inside_y = (peak_y > 0) & (peak_y < height - 1)
+    offset_x, gain_x = parabola_vertex(surfaces[rows, peak_y, np.maximum(peak_x - 1, 0)],
+                                       surfaces[rows, peak_y, np.minimum(peak_x + 1, width - 1)], inside_x)
+    offset_y, gain_y = parabola_vertex(surfaces[rows, np.maximum(peak_y - 1, 0), peak_x],
+                                       surfaces[rows, np.minimum(peak_y + 1, height - 1), peak_x], inside_y)
+
+    points = np.stack([peak_x + offset_x, peak_y + offset_y], axis=1)
+    return points, peak + gain_x + gain_y
+
+
+@measure_elapsed_time
+def refine_corner_locations(corners: CornerSet, img: np.ndarray, predicted_points: np.ndarray,
+                            search_radius: float, block_size: Optional[int] = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the sub-pixel location of every described corner of the first image in the second image, as the peak of
+    the ncc of its descriptor with every window within search_radius along x and y of its predicted location.
+    The search regions of block_size corners are cut from the smoothed image and scored at once with
+    compute_dense_ncc_fft. A search region crossing the border of the image is moved inside it, the windows outside
+    the search and the windows that are not entirely inside the image are excluded.
+
+    Parameters
+    ----------
+    corners : CornerSet
+        Corners of the first image with their feature descriptors, see compute_feature_descriptor
+    img : np.ndarray
+        Second image
+    predicted_points : np.ndarray
+        (len(corners), 2) predicted x, y location of every corner in the second image
+    search_radius : float
+        Maximum distance in pixel along x and y between a location and the predicted location
+    block_size : Optional[int]
+        Number of corners scored at once
+
+    Returns
+    -------
+        Tuple[np.ndarray, np.ndarray], (N, 2) x, y sub-pixel location of every corner in the second image, and (N,)
+        ncc at that location, nan and -inf for corners without any window inside the image
+    """
+    corners = CornerSet.from_corners(corners)
+    img = smooth_feature_image(img)
+    height, width = img.shape
+    patch_height, patch_width = corners.descriptor_shape
+    radius = int(np.ceil(search_radius))
+    region_height, region_width = 2 * radius + patch_height, 2 * radius + patch_width
+    # an image smaller than a search region is zero padded at the bottom and the right, those windows are excluded
+    img = np.pad(img, ((0, max(region_height - height, 0)), (0, max(region_width - width, 0))))
+    region_windows = sliding_window_view(img, (region_height, region_width))
+
+    # top left corner, in the image, of the first window of every search, far away predictions are left out
+    predicted_points = np.asarray(predicted_points, dtype=np.float64).reshape(-1, 2)
+    valid = np.all(np.isfinite(predicted_points), axis=1)
+    centers = np.round(np.where(valid[:, None], predicted_points, 0)).astype(np.int64)
+    valid &= (centers[:, 0] >= -radius) & (centers[:, 0] < width + radius) \
+        & (centers[:, 1] >= -radius) & (centers[:, 1] < height + radius)
+    tops = np.where(valid, centers[:, 1], 0) - radius - patch_height // 2
+    lefts = np.where(valid, centers[:, 0], 0) - radius - patch_width // 2
+
+    # the search regions are moved inside the image, and the searched windows clipped to the image
+    region_tops = np.clip(tops, 0, img.shape[0] - region_height)
+    region_lefts = np.clip(lefts, 0, img.shape[1] - region_width)
+    first_tops, last_tops = np.maximum(tops, 0), np.minimum(tops + 2 * radius, height - patch_height)
+    first_lefts, last_lefts = np.maximum(lefts, 0), np.minimum(lefts + 2 * radius, width - patch_width)
+
+    points = np.full((len(corners), 2), np.nan)
+    ncc = np.full(len(corners), -np.inf)
+    offsets = np.arange(2 * radius + 1)
+    for start in range(0, len(corners), block_size):
+        block = np.flatnonzero(valid[start:start + block_size]) + start
+        if len(block) == 0:
+            continue
+
+        top, left = region_tops[block], region_lefts[block]
+        surfaces = compute_dense_ncc_fft(
+            corners.feature_descriptors[block].reshape((len(block),) + corners.descriptor_shape),
+            region_windows[top, left])
+
+        # exclude the windows outside the search or not entirely inside the image
+        window_tops, window_lefts = top[:, None] + offsets, left[:, None] + offsets
+        rows_inside = (window_tops >= first_tops[block, None]) & (window_tops <= last_tops[block, None])
+        columns_inside = (window_lefts >= first_lefts[block, None]) & (window_lefts <= last_lefts[block, None])
+        surfaces[~(rows_inside[:, :, None] & columns_inside[:, None, :])] = -np.inf
+
+        peaks, peak_ncc = find_ncc_peaks(surfaces)
+        found = np.isfinite(peak_ncc)
+        points[block[found]] = peaks[found] + np.stack([left + patch_width // 2, top + patch_height // 2],
+                                                       axis=1)[found]
+        ncc[block[found]] = peak_ncc[found]
+
+    return points, ncc
+
+
+@measure_elapsed_time
+def match_corner_by_dense_ncc(corners: CornerSet, img: np.ndarray, predicted_points: np.ndarray,
+                              search_radius: float, min_ncc: Optional[float] = DENSE_NCC_MIN_SCORE) -> PairSet:
+    """
+    Match each described corner of the first image with the location of the second image, within search_radius
+    along x and y of its predicted location, whose window has the highest ncc with the descriptor of the corner,
+    see refine_corner_locations. The sub-pixel location is rounded to the nearest pixel.
+    Unlike compare_ncc_within_radius, the second image does not need any detected corner.
+
+    Parameters
+    ----------
+    corners : CornerSet
+        Corners of the first image with their feature descriptors, see compute_feature_descriptor
+    img : np.ndarray
+        Second image
+    predicted_points : np.ndarray
+        (len(corners), 2) predicted x, y location of every corner in the second image
+    search_radius : float
+        Maximum distance in pixel along x and y between a location and the predicted location
+    min_ncc : Optional[float]
+        Minimum ncc of the best location for the corner to be matched
+
+    Returns
+    -------
+        PairSet : pairs of the corners with a corner at their best location, whose corner response is 0
+    """
+    corners = CornerSet.from_corners(corners)
+    points, ncc = refine_corner_locations(corners, img, predicted_points, search_radius)
+
+    index1 = np.flatnonzero(ncc >= min_ncc)
+    points = np.round(points[index1]).astype(np.int64)
+    return PairSet(corners, CornerSet(points[:, 0], points[:, 1], np.zeros(len(index1))), index1,
+                   np.arange(len(index1)), ncc[index1])
 
 
 def compute_ncc(c1: Type[Corner], c2: Type[Corner]) -> float:
@@ -161,16 +505,197 @@ def compare_all_ncc(corners1: List[Type[Corner]], corners2: List[Type[Corner]],
     return pairs
 
 
+def stack_feature_descriptors(corners: List[Type[Corner]]) -> np.ndarray:
+    """
+    Stack the feature descriptors of the corners into a single matrix.
+
+    Parameters
+    ----------
+    corners : List[Type[Corner]]
+        List of corners with feature descriptors of patch_size x patch_size, or a CornerSet
+
+    Returns
+    -------
+        np.ndarray, (N, patch_size^2) matrix, where row i is the flattened descriptor of corner i
+    """
+    if isinstance(corners, CornerSet) and corners.feature_descriptors is not None:
+        return corners.feature_descriptors
+    return np.array([c.feature_descriptor.ravel() for c in corners])
+
+
+@measure_elapsed_time
+def compare_all_ncc_batched(corners1: List[Type[Corner]], corners2: List[Type[Corner]], threshold: float,
+                            block_size: Optional[int] = 1024) -> PairSet:
+    """
+    compare the two list of corners, and return the best matches.
+    Batched implementation of compare_all_ncc. As the feature descriptors are already zero mean and normalised,
+    the ncc of every pair is a single matrix multiplication of the stacked descriptors. The score matrix is computed
+    block_size rows at a time to bound the memory usage to block_size x len(corners2) scores.
+
+    Produce the same pairs as compare_all_ncc, including its tie breaking: the best match is the first corner
+    with the highest score, and the first corner of corners2 is counted as a second-best candidate
+    even when it is the best match.
+
+    Parameters
+    ----------
+    corners1 : List[Type[Corner]]
+        List of corners retrieved from the first image
+    corners2 : List[Type[Corner]]
+        List of corners retrieved from the second image
+    threshold : float
+        Threshold ratio for the best match and the second best match
+    block_size : Optional[int]
+        Number of corners of the first image scored at once
+    lone_candidate_min_ncc : Optional[float]
+        Minimum ncc of a corner with a single candidate within the radius
+
+    Returns
+    -------
+        PairSet
+            List of pairs of the corners that are the best match for each corner in the first list
+    """
+    corners1, corners2 = CornerSet.from_corners(corners1), CornerSet.from_corners(corners2)
+    if len(corners1) == 0 or len(corners2) == 0:
+        return PairSet(corners1, corners2, [], [], [])
+
+    descriptors1 = stack_feature_descriptors(corners1)
+    descriptors2 = stack_feature_descriptors(corners2)
+
+    index1, index2, ncc = [], [], []
+    for start in range(0, len(corners1), block_size):
+        scores = descriptors1[start:start + block_size] @ descriptors2.T
+        rows = np.arange(len(scores))
+
+        # top 2 selection, first occurrence of the maximum is the best match
+        best_index = np.argmax(scores, axis=1)
+        best = scores[rows, best_index]
+        first = scores[:, 0].copy()
+        scores[rows, best_index] = -np.inf
+        second_best = np.maximum(scores.max(axis=1), first)
+
+        # check ratio between 2nd best match and best
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matched = np.flatnonzero(second_best / best <= threshold)
+
+        index1.append(start + matched)
+        index2.append(best_index[matched])
+        ncc.append(best[matched])
+
+    return PairSet(corners1, corners2, np.concatenate(index1), np.concatenate(index2), np.concatenate(ncc))
+
+
+def predict_corner_locations(corners: List[Type[Corner]], homography: Optional[np.ndarray] = None,
+                             translation: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Predict where the corners of the first image are in the second image.
+
+    Parameters
+    ----------
+    corners : List[Type[Corner]]
+        List of corners retrieved from the first image
+    homography : Optional[np.ndarray]
+        Prior homography mapping the first image coordinate to the second image coordinate
+    translation : Optional[Tuple[float, float]]
+        Coarse x, y offset of the second image, only used if no homography is supplied
+
+    Returns
+    -------
+        np.ndarray, (len(corners), 2) predicted x, y location of every corner in the second image
+    """
+    points = get_corner_points(corners)
+    if homography is not None:
+        predicted_x, predicted_y = compute_map_points(points[:, 0], points[:, 1], homography)
+        return np.stack([predicted_x, predicted_y], axis=1)
+    if translation is not None:
+        return points + np.asarray(translation, dtype=np.float64)
+    return points
+
+
+@measure_elapsed_time
+def compare_ncc_within_radius(corners1: List[Type[Corner]], corners2: List[Type[Corner]],
+                              predicted_points: np.ndarray, search_radius: float, threshold: float,
+                              block_size: Optional[int] = 1024,
+                              lone_candidate_min_ncc: Optional[float] = LONE_CANDIDATE_MIN_NCC) -> PairSet:
+    """
+    compare each corner of the first list only with the corners of the second list within search_radius of its
+    predicted location, e.g. the location predicted by a homography estimated at a coarser pyramid level.
+    O(N.k) complexity where k is the number of corners around a prediction: the corners of the second list are
+    placed in a GridIndex with cells of search_radius, so only the corners of the 3 x 3 cells around a prediction
+    are candidates, and only the ncc of the candidates is computed.
+    The ratio test is applied among the candidates within the radius, a corner with a single candidate has no second
+    best and is only matched if its ncc is at least lone_candidate_min_ncc.
+
+    Parameters
+    ----------
+    corners1 : List[Type[Corner]]
+        List of corners retrieved from the first image
+    corners2 : List[Type[Corner]]
+        List of corners retrieved from the second image
+    predicted_points : np.ndarray
+        (len(corners1), 2) predicted x, y location of every corner of the first list in the second image
+    search_radius : float
+        Maximum distance in pixel between a candidate and the predicted location
+    threshold : float
+        Threshold ratio for the best match and the second best match
+    block_size : Optional[int]
+        Number of corners of the first image scored at once
+    lone_candidate_min_ncc : Optional[float]
+        Minimum ncc of a corner with a single candidate within the radius
+
+    Returns
+    -------
+        PairSet
+            List of pairs of the corners that are the best match for each corner in the first list
+    """
+    corners1, corners2 = CornerSet.from_corners(corners1), CornerSet.from_corners(corners2)
+    if len(corners1) == 0 or len(corners2) == 0:
+        return PairSet(corners1, corners2, [], [], [])
+
+    descriptors1 = stack_feature_descriptors(corners1)
+    # the last row is the padding of the candidates, it never wins as its score is replaced by -inf
+    descriptors2 = stack_feature_descriptors(corners2)
+    descriptors2 = np.vstack([descriptors2, np.zeros((1, descriptors2.shape[1]), dtype=descriptors2.dtype)])
+    grid = GridIndex(get_corner_points(corners2), cell_size=search_radius)
+
+    index1, index2, ncc = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], [np.zeros(0)]
+    for start in range(0, len(corners1), block_size):
+        # (B, K) candidates in the order of corners2, so that ties are broken as in compare_all_ncc_batched
+        candidates = grid.candidates_within(predicted_points[start:start + block_size], search_radius)
+        scores = np.einsum("bd,bkd->bk", descriptors1[start:start + block_size], descriptors2[candidates])
+        scores[candidates == len(grid)] = -np.inf
+        if scores.shape[1] == 0:
+            continue
+        rows = np.arange(len(scores))
+
+        best_index = np.argmax(scores, axis=1)
+        best = scores[rows, best_index]
+        scores[rows, best_index] = -np.inf
+        second_best = scores.max(axis=1)
+
+        # a corner without any candidate has a best score of -inf, a corner with a single candidate a second best of
+        # -inf, which would always pass the ratio test
+        lone = second_best == -np.inf
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matched = np.flatnonzero((best > 0) & np.where(lone, best >= lone_candidate_min_ncc,
+                                                           second_best / best <= threshold))
+
+        index1.append(start + matched)
+        index2.append(candidates[matched, best_index[matched]])
+        ncc.append(best[matched])
+
+    return PairSet(corners1, corners2, np.concatenate(index1), np.concatenate(index2), np.concatenate(ncc))
+
+
 @measure_elapsed_time
 def reject_outlier_pairs(pairs: List[Pair], m: Optional[float] = 2, width_offset: Optional[int] = 0) \
-        -> List[Pair]:
+        -> PairSet:
     """
     Reject outliers from the data.
 
     Parameters
     ----------
     pairs : List[Type[Pair]]
-        List of pairs
+        List of pairs, or a PairSet
     m : int
         Number of standard deviations to include, a lower number will reject more outliers'
     width_offset : int
@@ -178,23 +703,17 @@ def reject_outlier_pairs(pairs: List[Pair], m: Optional[float] = 2, width_offset
 
     Returns
     -------
-        List[float]
-            List of data without outliers
+        PairSet
+            Pairs without outliers
     """
-    pairs = np.array(pairs)
+    pairs = PairSet.from_pairs(pairs)
 
     # distance outlier detection
-    distances = [pair.distance for pair in pairs]
-    mean = np.mean(distances)
-    std = np.std(distances)
-    i = np.array([abs(pair.distance - mean) <= m * std for pair in pairs])
-    pairs = pairs[i]
+    distances = pairs.distances
+    pairs = pairs[np.abs(distances - np.mean(distances)) <= m * np.std(distances)]
 
     # gradient outlier detection
-    slopes = [pair.cal_gradient(width_offset=width_offset) for pair in pairs]
-    mean = np.mean(slopes)
-    std = np.std(slopes)
-    i = np.array([abs(pair.cal_gradient(width_offset=width_offset) - mean) <= m * std for pair in pairs])
-    pairs = pairs[i]
+    slopes = pairs.compute_gradients(width_offset=width_offset)
+    pairs = pairs[np.abs(slopes - np.mean(slopes)) <= m * np.std(slopes)]
 
     return pairs
@@ -0,0 +1,142 @@
+from typing import Tuple
+
+import numpy as np
+
+"""
+Uniform grid spatial index of corner locations, used to only compare a corner with the corners close to where it
+is expected to be.
+@Author Neville Loh
+"""
+
+
+class GridIndex:
+    """Class GridIndex
+        Uniform grid over a set of points, the points are sorted by the cell that contains them so that every cell is
+        a contiguous range of the sorted points. A radius query only visits the cells that overlap the bounding box of
+        the search circle, so with a cell size close to the search radius a query costs about the number of points
+        in 3 x 3 cells.
+    """
+    points: np.ndarray = None
+    cell_size: float = None
+
+    def __init__(self, points: np.ndarray, cell_size: float):
+        """Class Constructor
+        Parameters
+        ----------
+        points : np.ndarray
+            (N, 2) x, y coordinates of the points
+        cell_size : float
+            Width and height of a grid cell
+        """
+        if cell_size <= 0:
+            raise ValueError(f"cell_size must be positive, got {cell_size}")
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = cell_size
+
+        cell_ids = self.get_cell_ids(self.get_cells(self.points))
+        self.order = np.argsort(cell_ids, kind="stable")
+        self.cell_ids, self.cell_starts, self.cell_counts = np.unique(cell_ids[self.order], return_index=True,
+                                                                      return_counts=True)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def get_cells(self, points: np.ndarray) -> np.ndarray:
+        """
+        Get the cell that contains every point.
+
+        Parameters
+        ----------
+        points : np.ndarray
+            (N, 2) x, y coordinates
+
+        Returns
+        -------
+            np.ndarray, (N, 2) cell x, cell y of every point
+        """
+        return np.floor(points / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def get_cell_ids(cells: np.ndarray) -> np.ndarray:
+        """
+        Encode every cell x, cell y in a single integer, cells are assumed to be within +-2^31.
+
+        Parameters
+        ----------
+        cells : np.ndarray
+            (N, 2) cell x, cell y
+
+        Returns
+        -------
+            np.ndarray, (N,) cell ids
+        """
+        return (cells[:, 1] << 32) + cells[:, 0]
+
+    def candidates_within(self, points: np.ndarray, radius: float) -> np.ndarray:
+        """
+        Get the points within the radius of every query point.
+
+        Parameters
+        ----------
+        points : np.ndarray
+            (M, 2) x, y of the centre of every search, non finite centres have no candidate
+        radius : float
+            Search radius
+
+        Returns
+        -------
+            np.ndarray, (M, K) indices of the points within the radius of every search in increasing order,
+            padded with len(self) where a search has less than K points
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self) == 0:
+            return np.zeros((len(points), 0), dtype=np.int64)
+
+        finite = np.all(np.isfinite(points), axis=1)
+        cells = self.get_cells(np.where(finite[:, None], points, 0))
+        reach = int(np.ceil(radius / self.cell_size))
+
+        columns = []
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                cell_ids = self.get_cell_ids(cells + (dx, dy))
+                position = np.minimum(np.searchsorted(self.cell_ids, cell_ids), len(self.cell_ids) - 1)
+                counts = np.where(finite & (self.cell_ids[position] == cell_ids), self.cell_counts[position], 0)
+                if not counts.any():
+                    continue
+
+                # every point of the cell, as a column range of the sorted points
+                offsets = np.arange(counts.max())
+                sorted_index = self.cell_starts[position][:, None] + offsets
+                columns.append(np.where(offsets < counts[:, None],
+                                        self.order[np.minimum(sorted_index, len(self) - 1)], len(self)))
+
+        if not columns:
+            return np.full((len(points), 0), len(self), dtype=np.int64)
+
+        candidates = np.hstack(columns)
+        padded_points = np.vstack([self.points, np.full((1, 2), np.inf)])
+        # the padding is at infinity, so is a centre that is not finite, their distance is nan and never within radius
+        with np.errstate(invalid="ignore"):
+            distance = np.hypot(padded_points[candidates, 0] - points[:, None, 0],
+                                padded_points[candidates, 1] - points[:, None, 1])
+        candidates = np.sort(np.where(distance <= radius, candidates, len(self)), axis=1)
+        return candidates[:, :max(1, int((candidates < len(self)).sum(axis=1).max()))]
+
+    def query(self, point: Tuple[float, float], radius: float) -> np.ndarray:
+        """
+        Get the points within the radius of a location.
+
+        Parameters
+        ----------
+        point : Tuple[float, float]
+            x, y of the centre of the search
+        radius : float
+            Search radius
+
+        Returns
+        -------
+            np.ndarray, indices of the points within the radius in increasing order
+        """
+        candidates = self.candidates_within(np.asarray([point]), radius)[0]
+        return candidates[candidates < len(self)]
@@ -1,10 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import heapq
 import imageProcessing.smoothing as IPSmooth
 from typing import List, Tuple, Optional, Type
 from matplotlib import pyplot as plt
-from image_stiching.corner import Corner, get_all_corner_from_response
-from image_stiching.harris_conrner_detection.harris_util import sobel, compute_gaussian_averaging
+from image_stiching.corner import Corner, CornerSet, get_n_strongest_corner_from_response
+from image_stiching.harris_conrner_detection.harris_util import sobel, compute_gaussian_averaging, sliding_window_max
 from image_stiching.performance_evaulation.timer import measure_elapsed_time
 
 """
@@ -17,14 +18,22 @@ A generic implementation of Harris Corner detection Algorithm
 # Default image type is np array.
 ImageArray = np.ndarray
 
+# Available non-max suppression modes
+SUPPRESSION_MAX_FILTER = "max_filter"
+SUPPRESSION_BRUTEFORCE = "bruteforce"
+
 
 @measure_elapsed_time
 def compute_harris_corner(img_original: List[List[int]],
                           n_corner: Optional[int] = 5,
                           alpha: Optional[float] = 0.04,
                           gaussian_window_size: Optional[int] = 5,
-                          plot_image: Optional[bool] = False) \
-        -> List[Type[Corner]]:
+                          plot_image: Optional[bool] = False,
+                          suppression_mode: Optional[str] = SUPPRESSION_MAX_FILTER,
+                          min_corner_distance: Optional[int] = 0,
+                          n_bands: Optional[int] = 1,
+                          n_workers: Optional[int] = None) \
+        -> CornerSet:
     """
     Compute the harris corner for the picture
     return the corner activated value in decreasing value
@@ -33,9 +42,99 @@ def compute_harris_corner(img_original: List[List[int]],
         alpha: Optional[float], default =0.04,
         gaussian_window_size: Optional[int], default =5,
         plot_image: Optional[bool], default =False)
+        suppression_mode: Optional[str], default ="max_filter", either "max_filter" or "bruteforce"
+        min_corner_distance: Optional[int], default =0, only used by the "max_filter" suppression mode
+        n_bands: Optional[int], default =1, number of horizontal bands the response is computed in,
+            see compute_harris_response_in_bands
+        n_workers: Optional[int], default =None, number of threads computing the bands, None for the number of
+            processors
+
+    """
+
+    # Compute the Harris response for each pixel, band by band, the bands are seamless
+    if n_bands > 1:
+        corner_img_array = compute_harris_response_in_bands(img_original, alpha, gaussian_window_size,
+                                                            n_bands=n_bands, n_workers=n_workers)
+    else:
+        corner_img_array = compute_harris_response(img_original, alpha, gaussian_window_size)
+
+    # Apply local non-max suppression, then prepare n=1000 strongest conner per image,
+    # Corner objects are only created when accessed
+    pq_n_best_corner = CornerSet.from_records(select_corners_from_response(corner_img_array, n_corner,
+                                                                   suppression_mode=suppression_mode,
+                                                                   min_corner_distance=min_corner_distance))
+
+    # Plot the image if optional argument plot_image is true
+    if plot_image:
+        plot_corners(img_original, pq_n_best_corner)
+
+    # Return List of Corner in decreasing response
+    return pq_n_best_corner
+
 
+def plot_corners(img_original: ImageArray, corners: List[Type[Corner]]) -> None:
+    """Plot the corners over the image
+    Parameters
+    ----------
+    img_original : ImageArray
+        greyscale image
+    corners : List[Type[Corner]]
+        corners to plot
+    """
+    plt.figure(figsize=(20, 18))
+    plt.gray()
+    plt.imshow(img_original)
+    plt.scatter(*zip(*[(corner.x, corner.y) for corner in corners]), s=1, color='r')
+    plt.axis('off')
+    plt.show()
+
+
+def select_corners_from_response(corner_img_array: ImageArray,
+                                 n_corner: Optional[int] = 5,
+                                 suppression_mode: Optional[str] = SUPPRESSION_MAX_FILTER,
+                                 min_corner_distance: Optional[int] = 0) -> np.ndarray:
+    """Select the n strongest corners of a Harris response after local non-max suppression
+    Parameters
+    ----------
+    corner_img_array : ImageArray
+        Harris response of every pixel, see compute_harris_response
+    n_corner : Optional[int]
+        number of corners to select
+    suppression_mode : Optional[str]
+        either "max_filter" or "bruteforce"
+    min_corner_distance : Optional[int]
+        only used by the "max_filter" suppression mode
+    Returns
+    -------
+    np.ndarray
+        record array of CORNER_DTYPE, sorted by decreasing response
     """
+    if suppression_mode == SUPPRESSION_BRUTEFORCE:
+        corner_img_array = bruteforce_non_max_suppression(corner_img_array, window_size=3)
+    elif suppression_mode == SUPPRESSION_MAX_FILTER:
+        corner_img_array = non_max_suppression(corner_img_array, window_size=3, min_distance=min_corner_distance)
+    else:
+        raise ValueError(f"Unknown suppression mode {suppression_mode}, "
+                         f"expected {SUPPRESSION_MAX_FILTER} or {SUPPRESSION_BRUTEFORCE}")
+    return get_n_strongest_corner_from_response(corner_img_array, n_corner)
+
+
+def compute_harris_response(img_original: ImageArray, alpha: float, gaussian_window_size: int) -> ImageArray:
+    """Compute the Harris response of every pixel, before non-max suppression
+    Parameters
+    ----------
+    img_original : ImageArray
+        The greyscale image
+    alpha : float
+        The Harris response constant alpha
+    gaussian_window_size : int
+        The size of the gaussian window applied to the square and mixed derivatives
 
+    Returns
+    -------
+    ImageArray
+        An ImageArray, where each coordinate contains the Harris response of each pixel.
+    """
     # Apply Gaussian filter, blur and smoothing for the input image
     np_original = np.array(img_original)
     height, width = np.shape(np_original)
@@ -52,25 +151,63 @@ def compute_harris_corner(img_original: List[List[int]],
         = [compute_gaussian_averaging(img, windows_size=gaussian_window_size) for img in result_tuple]
 
     # Compute the Harris response for each pixel
-    corner_img_array = get_image_cornerness(ix2_blur_left, iy2_blur_left, ixiy_blur_left, alpha)
+    return get_image_cornerness(ix2_blur_left, iy2_blur_left, ixiy_blur_left, alpha)
 
-    # Apply local non-max suppression for each piexels
-    corner_img_array = bruteforce_non_max_suppression(corner_img_array, window_size=3)
 
-    # Prepare n=1000 strongest conner per image
-    pq_n_best_corner = heapq.nsmallest(n_corner, get_all_corner_from_response(corner_img_array))
+def get_harris_halo(gaussian_window_size: int) -> int:
+    """Compute the number of rows of the input a band of the Harris response depends on, above and below the band
+    The radius of the 3x3 smoothing, of the Sobel filter and of the gaussian window add up, as every filter is
+    applied to the result of the previous one.
+    Parameters
+    ----------
+    gaussian_window_size : int
+        The size of the gaussian window applied to the square and mixed derivatives
 
-    # Plot the image if optional argument plot_image is true
-    if plot_image:
-        plt.figure(figsize=(20, 18))
-        plt.gray()
-        plt.imshow(img_original)
-        plt.scatter(*zip(*[(corner.x, corner.y) for corner in pq_n_best_corner]), s=1, color='r')
-        plt.axis('off')
-        plt.show()
-
-    # Return List of Corner as heap
-    return pq_n_best_corner
+    Returns
+    -------
+    int
+        The number of halo rows
+    """
+    return 1 + 1 + gaussian_window_size // 2
+
+
+def compute_harris_response_in_bands(img_original: ImageArray, alpha: float, gaussian_window_size: int,
+                                     n_bands: int, n_workers: Optional[int] = None) -> ImageArray:
+    """Compute the Harris response of every pixel in horizontal bands on a thread pool
+    Each band is computed with halo rows of the neighbouring bands, see get_harris_halo, which absorb the zero border
+    of the filters at the cut, and the halo is cropped from the result. The response is identical to
+    compute_harris_response, without seam at the band boundaries.
+    Parameters
+    ----------
+    img_original : ImageArray
+        The greyscale image
+    alpha : float
+        The Harris response constant alpha
+    gaussian_window_size : int
+        The size of the gaussian window applied to the square and mixed derivatives
+    n_bands : int
+        The number of bands
+    n_workers : Optional[int]
+        The number of threads, if none are supplied the number of processors is used
+
+    Returns
+    -------
+    ImageArray
+        An ImageArray, where each coordinate contains the Harris response of each pixel.
+    """
+    np_original = np.asarray(img_original)
+    height = np_original.shape[0]
+    halo = get_harris_halo(gaussian_window_size)
+    bounds = np.linspace(0, height, min(n_bands, height) + 1).astype(int)
+
+    def compute_band(y0: int, y1: int) -> ImageArray:
+        halo_y0, halo_y1 = max(0, y0 - halo), min(height, y1 + halo)
+        response = compute_harris_response(np_original[halo_y0:halo_y1], alpha, gaussian_window_size)
+        return response[y0 - halo_y0:y1 - halo_y0]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        bands = list(executor.map(compute_band, bounds[:-1], bounds[1:]))
+    return np.vstack(bands)
 
 
 def get_square_and_mixed_derivatives(i_x: ImageArray, i_y: ImageArray) -> Tuple[ImageArray, ImageArray, ImageArray]:
@@ -158,3 +295,127 @@ def bruteforce_non_max_suppression(input_img: ImageArray, window_size: Optional[
             window += 1
 
     return input_img.reshape(height, width)
+
+
+def non_max_suppression(input_img: ImageArray, window_size: Optional[int] = 3, min_distance: Optional[int] = 0) \
+        -> ImageArray:
+    """Applied local non max suppression for the image with a separable sliding window max filter
+    The result is identical to bruteforce_non_max_suppression, which scans the windows in raster order and
+    suppresses the center to 0 in place unless np.argmax of the window, i.e. the first maximum, is the center.
+    Pixels closer than window_size // 2 to the border are left untouched.
+
+    Because the scan is in place, a pixel is compared with the already suppressed pixels before it in the window.
+    A kept pixel is never smaller than the pixels after it in its window, so it suppresses all of them, and a
+    suppressed pixel no longer blocks the pixels after it. The kept pixels are then the candidates, the pixels
+    that are a maximum against the original pixels after them and the border pixels before them, greedily selected
+    in raster order so that no two kept pixels share a window. The candidates are computed with sliding window
+    max filters, and the few candidates within the window of an earlier candidate are resolved together.
+
+    Parameters
+    ----------
+    input_img : ImageArray
+        The input image array before suppression
+    window_size :  Optional[int]
+        Suppression windows size, only works for odd number, if none are supplied, a default value of 3 is used
+    min_distance : Optional[int]
+        If greater than 0, positive corners within min_distance pixels (in both x and y) of a stronger kept corner
+        are suppressed as well, similar to the minimum distance of the Solem implementation.
+
+    Returns
+    -------
+    ImageArray
+        An ImageArray after suppression
+    """
+    input_img = np.asarray(input_img)
+    height, width = np.shape(input_img)
+    result = input_img.copy()
+    offset = window_size // 2
+    if offset == 0 or height < window_size or width < window_size:
+        return result
+
+    interior = np.zeros((height, width), dtype=bool)
+    interior[offset:height - offset, offset:width - offset] = True
+
+    # max of the pixels after the center, which are still original when the center is visited
+    row_max = sliding_window_max(input_img, offset, offset, axis=1)
+    after = np.maximum(sliding_window_max(row_max, -1, offset, axis=0),
+                       sliding_window_max(input_img, -1, offset, axis=1))
+
+    # a suppressed pixel is 0, so a pixel that is not positive can only be kept if every pixel before it is on the
+    # border, which only holds for the first interior pixel
+    candidates = interior & (input_img >= after) & (input_img > 0)
+    candidates[offset, offset] = input_img[offset, offset] >= after[offset, offset]
+
+    # the pixels before the center in raster order, the rows above and the pixels to the left
+    before_offsets = [(dy, dx) for dy in range(-offset, 0) for dx in range(-offset, offset + 1)] \
+        + [(0, dx) for dx in range(-offset, 0)]
+
+    # the border pixels are never suppressed, the candidates must be greater than the ones before them
+    ys, xs = np.nonzero(candidates)
+    border_before = np.full(len(ys), -np.inf)
+    for dy, dx in before_offsets:
+        on_border = ~interior[ys + dy, xs + dx]
+        if on_border.any():
+            border_before[on_border] = np.maximum(border_before[on_border], input_img[ys + dy, xs + dx][on_border])
+    beats_border = input_img[ys, xs] > border_before
+    candidates[ys[~beats_border], xs[~beats_border]] = False
+    ys, xs = ys[beats_border], xs[beats_border]
+
+    # index of the earlier candidates in the window of every candidate, -1 for none
+    candidate_index = np.full((height, width), -1, dtype=np.int64)
+    candidate_index[ys, xs] = np.arange(len(ys))
+    earlier = np.stack([candidate_index[ys + dy, xs + dx] for dy, dx in before_offsets], axis=1)
+
+    # a candidate with no earlier candidate in its window is kept. The others are settled level by level in
+    # raster order, a candidate is kept if none of its earlier candidates is, once all of them are settled.
+    # The last entry stands for no candidate.
+    kept = np.ones(len(ys) + 1, dtype=bool)
+    kept[-1] = False
+    settled = np.ones(len(ys) + 1, dtype=bool)
+    pending = np.flatnonzero(np.any(earlier >= 0, axis=1))
+    earlier = earlier[pending]
+    settled[pending] = False
+    while len(pending) > 0:
+        ready = np.all(settled[earlier], axis=1)
+        kept[pending[ready]] = ~np.any(kept[earlier[ready]], axis=1)
+        settled[pending[ready]] = True
+        pending, earlier = pending[~ready], earlier[~ready]
+
+    keep_mask = np.zeros((height, width), dtype=bool)
+    keep_mask[candidates] = kept[:-1]
+    result[interior & ~keep_mask] = 0
+
+    if min_distance > 0:
+        result = suppress_by_min_distance(result, min_distance)
+
+    return result
+
+
+def suppress_by_min_distance(input_img: ImageArray, min_distance: int) -> ImageArray:
+    """Greedily keep the strongest positive corners, suppressing any weaker positive corner within min_distance
+    pixels in both x and y of an already kept corner. Corners of equal response are visited in raster order.
+
+    Parameters
+    ----------
+    input_img : ImageArray
+        The input image array, usually after non max suppression
+    min_distance : int
+        Minimum distance between two corners
+
+    Returns
+    -------
+    ImageArray
+        An ImageArray after suppression
+    """
+    result = input_img.copy()
+    candidates = np.flatnonzero(result > 0)
+    order = candidates[np.argsort(-result.flat[candidates], kind="stable")]
+
+    allowed = np.ones(result.shape, dtype=bool)
+    for y, x in zip(*np.unravel_index(order, result.shape)):
+        if allowed[y, x]:
+            allowed[max(y - min_distance, 0):y + min_distance + 1, max(x - min_distance, 0):x + min_distance + 1] = False
+        else:
+            result[y, x] = 0
+
+    return result
@@ -56,7 +56,7 @@ def compute_gaussian_averaging(pixel_array: ImageArray, windows_size: Optional[i
     image_height, image_width = np.shape(pixel_array)
     kernel = get_gaussian_kernel(windows_size, sigma=1)
     averaged = IPConv2D.computeSeparableConvolution2DOddNTapBorderZero(
-        pixel_array.tolist(), image_width, image_height, kernel)
+        pixel_array, image_width, image_height, kernel)
 
     return np.array(averaged)
 
@@ -88,3 +88,46 @@ def get_gaussian_kernel(window_size: int, sigma: float, offset: Optional[float]
         result = np.add(result, row)
 
     return result / sum(result)
+
+
+def sliding_window_max(input_img: ImageArray, before: int, after: int, axis: int) -> ImageArray:
+    """Compute the running maximum of the image along an axis with the van Herk/Gil-Werman algorithm
+    The window of each pixel i covers [i - before, i + after] along the given axis, either bound may be negative
+    as long as the window is not empty. The window is padded with -inf outside the image. The cost per pixel is constant regardless of the window size.
+
+    Parameters
+    ----------
+    input_img : ImageArray
+        A 2 dimensional imageArray
+    before : int
+        Number of pixels before the current pixel that is included in the window
+    after : int
+        Number of pixels after the current pixel that is included in the window
+    axis : int
+        The axis the window slides along, 0 for columns and 1 for rows
+
+    Returns
+    -------
+    ImageArray
+        An ImageArray of the same shape, where each coordinate contains the maximum of its window
+    """
+    input_img = np.moveaxis(np.asarray(input_img, dtype=np.float64), axis, -1)
+    length = input_img.shape[-1]
+    window_size = before + after + 1
+    pad_before = max(before, 0)
+
+    # pad so the window of every pixel is inside the array, and the array splits into whole blocks
+    n_block = -(-(pad_before + length + max(after, 0) + window_size) // window_size)
+    padded = np.full(input_img.shape[:-1] + (n_block * window_size,), -np.inf)
+    padded[..., pad_before:pad_before + length] = input_img
+
+    # prefix max and suffix max within each block of window_size
+    blocks = padded.reshape(input_img.shape[:-1] + (n_block, window_size))
+    prefix_max = np.maximum.accumulate(blocks, axis=-1).reshape(padded.shape)
+    suffix_max = np.flip(np.maximum.accumulate(np.flip(blocks, axis=-1), axis=-1), axis=-1).reshape(padded.shape)
+
+    # a window starting at j spans at most 2 blocks, its max is the suffix of the first and prefix of the second
+    start = pad_before - before
+    result = np.maximum(suffix_max[..., start:start + length],
+                        prefix_max[..., start + window_size - 1:start + window_size - 1 + length])
+    return np.moveaxis(result, -1, axis)
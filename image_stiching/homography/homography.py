@@ -1,9 +1,10 @@
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
 from image_stiching.corner import Corner
-from image_stiching.pair import Pair
+from image_stiching.homography.ransac import SAMPLE_SIZE, vectorized_ransac
+from image_stiching.pair import Pair, PairSet, get_pair_points
 import imageIO.readwrite as IORW
 import random
 from itertools import combinations, product
@@ -21,8 +22,12 @@ def fit_transform_homography(pairs: List[Pair],
                              ransac_iteration: Optional[int] = 20000,
                              ransac_threshold: Optional[float] = 1.0,
                              source_left_image_path: Optional[str] = None,
-                             source_right_image_path: Optional[str] = None) \
-        -> np.ndarray:
+                             source_right_image_path: Optional[str] = None,
+                             ransac_confidence: Optional[float] = None,
+                             tile_size: Optional[int] = None,
+                             write_tile: Optional[Callable[[int, int, np.ndarray], None]] = None,
+                             auto_canvas: Optional[bool] = True) \
+        -> Optional[np.ndarray]:
     """
     Fit the homography using RANSAC and transform the image
     Return the combined image after the transformation
@@ -38,17 +43,486 @@ def fit_transform_homography(pairs: List[Pair],
         path to the left image
     source_right_image_path: Optional[str]
         path to the right image
+    ransac_confidence: Optional[float]
+        target confidence of the RANSAC algorithm, e.g. 0.999. If given, RANSAC stops as soon as the confidence is
+        reached and ransac_iteration is only the maximum number of iterations
+    tile_size: Optional[int]
+        if given, the image is warped tile by tile with tiles of tile_size x tile_size, see tiled_warp_and_blend
+    write_tile: Optional[Callable[[int, int, np.ndarray], None]]
+        if given, the finished tiles are streamed to write_tile instead of a canvas in memory, and nothing is returned
+    auto_canvas: Optional[bool]
+        if True, the canvas is sized to fit both images, see compute_canvas_bounds, otherwise the canvas is twice
+        the width of the left image with the right image cut off at its border
     Returns
     -------
-    np.ndarray
-        combined image after the transformation
+    Optional[np.ndarray]
+        combined image after the transformation, a np.memmap backed by a temporary file if only tile_size is
+        given, None if the tiles are streamed to write_tile
     """
-    result = ransac(pairs, ransac_iteration, ransac_threshold)
+    result = vectorized_ransac(pairs, ransac_iteration, ransac_threshold, confidence=ransac_confidence)
     h = compute_homography(result)
 
-    # read source images
-    rgb_left_image = IORW.readRGBImageAndConvertToNdArray(source_left_image_path)
-    rgb_right_image = IORW.readRGBImageAndConvertToNdArray(source_right_image_path)
+    return transform_with_homography(h,
+                                     source_left_image_path=source_left_image_path,
+                                     source_right_image_path=source_right_image_path,
+                                     tile_size=tile_size,
+                                     write_tile=write_tile,
+                                     auto_canvas=auto_canvas)
+
+
+def transform_with_homography(h: np.ndarray,
+                              source_left_image_path: Optional[str] = None,
+                              source_right_image_path: Optional[str] = None,
+                              tile_size: Optional[int] = None,
+                              write_tile: Optional[Callable[[int, int, np.ndarray], None]] = None,
+                              auto_canvas: Optional[bool] = True) \
+        -> Optional[np.ndarray]:
+    """
+    Transform the source images with a known homography, e.g. one estimated coarse to fine
+    Return the combined image after the transformation
+    Parameters
+    ----------
+    h: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    source_left_image_path: Optional[str]
+        path to the left image
+    source_right_image_path: Optional[str]
+        path to the right image
+    tile_size: Optional[int]
+        if given, the image is warped tile by tile with tiles of tile_size x tile_size, see tiled_warp_and_blend
+    write_tile: Optional[Callable[[int, int, np.ndarray], None]]
+        if given, the finished tiles are streamed to write_tile instead of a canvas in memory, and nothing is returned
+    auto_canvas: Optional[bool]
+        if True, the canvas is sized to fit both images, see compute_canvas_bounds
+    Returns
+    -------
+    Optional[np.ndarray]
+        combined image after the transformation, a np.memmap backed by a temporary file if only tile_size is
+        given, None if the tiles are streamed to write_tile
+    """
+    tiled = tile_size is not None or write_tile is not None
+
+    # read source images, the tiled warp decodes them row by row into file backed memmaps so that every tile only
+    # pages in the source regions it reads
+    if tiled:
+        rgb_left_image = IORW.readRGBImageToMemmap(source_left_image_path)
+        rgb_right_image = IORW.readRGBImageToMemmap(source_right_image_path)
+    else:
+        rgb_left_image = IORW.readRGBImageAndConvertToNdArray(source_left_image_path)
+        rgb_right_image = IORW.readRGBImageAndConvertToNdArray(source_right_image_path)
+
+    image_height, image_width = rgb_left_image.shape[:2]
+    canvas_shape, canvas_offset = (image_height, image_width * 2), (0, 0)
+    if auto_canvas:
+        canvas_shape, canvas_offset = compute_canvas_bounds(h, rgb_left_image.shape[:2], rgb_right_image.shape[:2])
+
+    if not tiled:
+        return warp_and_blend(h, rgb_left_image, rgb_right_image, canvas_shape, canvas_offset)
+
+    # without a tile writer, the tiles are copied into a file backed canvas rather than one in memory
+    warped_image = None
+    if write_tile is None:
+        warped_image = IORW.createMemmapArray(canvas_shape + (3,), np.uint8)
+        write_tile = canvas_tile_writer(warped_image)
+
+    tiled_warp_and_blend(h, rgb_left_image, rgb_right_image, write_tile, tile_size=tile_size or 512,
+                         canvas_shape=canvas_shape, canvas_offset=canvas_offset)
+    return warped_image
+
+
+# Blend threshold, if the left pixel is brighter than the right pixel by more than the threshold in any channel,
+# the right pixel is taken instead of the average
+BLEND_THRESHOLD = 50
+
+
+# Largest canvas, as a multiple of the total area of the images. A homography that projects an image over a larger
+# canvas is near degenerate, e.g. a bad RANSAC fit, and the canvas would not fit in memory.
+MAX_CANVAS_AREA_RATIO = 16
+
+
+def compute_projected_bounds(homographies: Dict[int, np.ndarray], shapes: Dict[int, Tuple[int, int]],
+                             max_area_ratio: Optional[float] = MAX_CANVAS_AREA_RATIO) \
+        -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    Compute the smallest canvas containing every image projected into the reference frame
+    An image that crosses the line at infinity of the reference frame, i.e. that is partly behind the camera, is
+    not bounded in the reference frame, it is left out of the bounds and cut at the canvas border.
+    Parameters
+    ----------
+    homographies: Dict[int, np.ndarray]
+        homography mapping the reference frame coordinate to the image coordinate of every image, the identity for
+        the reference image
+    shapes: Dict[int, Tuple[int, int]]
+        height and width of every image
+    max_area_ratio: Optional[float]
+        largest area of the canvas as a multiple of the total area of the images, None for no limit
+    Returns
+    -------
+    Tuple[Tuple[int, int], Tuple[int, int]]
+        height and width of the canvas, and the y, x offset of the reference frame origin within the canvas
+    Raises
+    ------
+    ValueError
+        if no image is bounded in the reference frame, or the canvas exceeds max_area_ratio
+    """
+    mapped_x, mapped_y = [], []
+    for image, h in homographies.items():
+        height, width = shapes[image]
+        corners = np.array([[0, width - 1, 0, width - 1], [0, 0, height - 1, height - 1], [1, 1, 1, 1]],
+                           dtype=np.float64)
+        p_prime = np.linalg.inv(h) @ corners
+
+        # the sign of a homography is arbitrary, the corners are in front of the camera if they all have the same sign
+        if not (np.all(p_prime[-1] > 0) or np.all(p_prime[-1] < 0)):
+            print('[INFO] image %d is not bounded in the reference frame, it is cut at the canvas border' % image)
+            continue
+        mapped_x.append(p_prime[0] / p_prime[-1])
+        mapped_y.append(p_prime[1] / p_prime[-1])
+
+    if not mapped_x:
+        raise ValueError("No image is bounded in the reference frame")
+
+    mapped_x, mapped_y = np.concatenate(mapped_x), np.concatenate(mapped_y)
+    min_x, max_x = np.floor(mapped_x.min()), np.ceil(mapped_x.max())
+    min_y, max_y = np.floor(mapped_y.min()), np.ceil(mapped_y.max())
+
+    # checked in floating point, before the bounds are converted to int
+    canvas_height, canvas_width = max_y - min_y + 1, max_x - min_x + 1
+    image_area = sum(shapes[image][0] * shapes[image][1] for image in homographies)
+    if max_area_ratio is not None and canvas_height * canvas_width > max_area_ratio * image_area:
+        raise ValueError(f"The canvas of {canvas_height:.0f} x {canvas_width:.0f} pixels is more than "
+                         f"{max_area_ratio} times the area of the images, the homography is likely degenerate")
+
+    return (int(canvas_height), int(canvas_width)), (-int(min_y), -int(min_x))
+
+
+def compute_canvas_bounds(homography: np.ndarray, left_shape: Tuple[int, int], right_shape: Tuple[int, int],
+                          max_area_ratio: Optional[float] = MAX_CANVAS_AREA_RATIO) \
+        -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    Compute the smallest canvas containing the left image and the right image projected into the left image frame,
+    see compute_projected_bounds
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    left_shape: Tuple[int, int]
+        height and width of the left image
+    right_shape: Tuple[int, int]
+        height and width of the right image
+    max_area_ratio: Optional[float]
+        largest area of the canvas as a multiple of the total area of both images, None for no limit
+    Returns
+    -------
+    Tuple[Tuple[int, int], Tuple[int, int]]
+        height and width of the canvas, and the y, x offset of the left image origin within the canvas.
+        If the right image is not bounded in the left image frame, the canvas is the left image.
+    Raises
+    ------
+    ValueError
+        if the canvas exceeds max_area_ratio
+    """
+    return compute_projected_bounds({0: np.eye(3), 1: homography}, {0: left_shape, 1: right_shape},
+                                    max_area_ratio=max_area_ratio)
+
+
+def warp_and_blend(homography: np.ndarray,
+                   rgb_left_image: np.ndarray,
+                   rgb_right_image: np.ndarray,
+                   canvas_shape: Optional[Tuple[int, int]] = None,
+                   canvas_offset: Optional[Tuple[int, int]] = (0, 0)) -> np.ndarray:
+    """
+    Warp the right image onto a canvas and blend it with the left image
+    Vectorized version of bruteforce_warp_and_blend, the coordinate grid of the canvas is projected with one matrix
+    multiplication and all three channels of the right image are sampled with gather operations.
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    rgb_left_image: np.ndarray
+        (H, W, 3) left image
+    rgb_right_image: np.ndarray
+        right image
+    canvas_shape: Optional[Tuple[int, int]]
+        height and width of the canvas, if none are supplied the canvas is twice the width of the left image
+    canvas_offset: Optional[Tuple[int, int]]
+        y, x of the left image origin within the canvas
+    Returns
+    -------
+    np.ndarray
+        (canvas height, canvas width, 3) combined image after the transformation
+    """
+    image_height, image_width = rgb_left_image.shape[:2]
+    canvas_height, canvas_width = canvas_shape or (image_height, image_width * 2)
+    return warp_and_blend_tile(homography, rgb_left_image, rgb_right_image,
+                               tile_bounds=(0, canvas_height, 0, canvas_width),
+                               right_origin=(0, 0),
+                               right_shape=rgb_right_image.shape[:2],
+                               left_shape=(image_height, image_width),
+                               canvas_offset=canvas_offset)
+
+
+@measure_elapsed_time
+def tiled_warp_and_blend(homography: np.ndarray,
+                         rgb_left_image: np.ndarray,
+                         rgb_right_image: np.ndarray,
+                         write_tile: Callable[[int, int, np.ndarray], None],
+                         tile_size: Optional[int] = 512,
+                         canvas_shape: Optional[Tuple[int, int]] = None,
+                         canvas_offset: Optional[Tuple[int, int]] = (0, 0)) -> None:
+    """
+    Tiled version of warp_and_blend with a memory usage bounded by the tile size.
+    The canvas is computed tile by tile in row major order, each tile only reads the region of the left image it
+    covers and the region of the right image its inverse projected bounding box needs, and is handed to write_tile
+    once it is finished. The source images can be any array supporting slicing, e.g. np.memmap, so that only the
+    required regions are loaded in memory.
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    rgb_left_image: np.ndarray
+        (H, W, 3) left image
+    rgb_right_image: np.ndarray
+        right image
+    write_tile: Callable[[int, int, np.ndarray], None]
+        called with the canvas y, x of the top left corner of every finished tile and the (h, w, 3) tile
+    tile_size: Optional[int]
+        height and width of the tiles
+    canvas_shape: Optional[Tuple[int, int]]
+        height and width of the canvas, if none are supplied the canvas is twice the width of the left image
+    canvas_offset: Optional[Tuple[int, int]]
+        y, x of the left image origin within the canvas
+    """
+    image_height, image_width = rgb_left_image.shape[:2]
+    canvas_height, canvas_width = canvas_shape or (image_height, image_width * 2)
+    offset_y, offset_x = canvas_offset
+    right_shape = rgb_right_image.shape[:2]
+
+    for y0 in range(0, canvas_height, tile_size):
+        for x0 in range(0, canvas_width, tile_size):
+            y1, x1 = min(y0 + tile_size, canvas_height), min(x0 + tile_size, canvas_width)
+            ry0, ry1, rx0, rx1 = compute_source_bounds(homography,
+                                                       (y0 - offset_y, y1 - offset_y, x0 - offset_x, x1 - offset_x),
+                                                       right_shape)
+
+            # region of the left image under the tile, possibly empty
+            ly0, ly1 = np.clip([y0 - offset_y, y1 - offset_y], 0, image_height)
+            lx0, lx1 = np.clip([x0 - offset_x, x1 - offset_x], 0, image_width)
+
+            tile = warp_and_blend_tile(homography,
+                                       np.asarray(rgb_left_image[ly0:ly1, lx0:lx1]),
+                                       np.asarray(rgb_right_image[ry0:ry1, rx0:rx1]),
+                                       tile_bounds=(y0, y1, x0, x1),
+                                       right_origin=(ry0, rx0),
+                                       right_shape=right_shape,
+                                       left_shape=(image_height, image_width),
+                                       canvas_offset=canvas_offset)
+            write_tile(y0, x0, tile)
+
+
+def canvas_tile_writer(canvas: np.ndarray) -> Callable[[int, int, np.ndarray], None]:
+    """
+    Create a tile writer for tiled_warp_and_blend that copies every tile into a canvas
+    Parameters
+    ----------
+    canvas: np.ndarray
+        (canvas height, canvas width, 3) canvas, e.g. an ndarray or a np.memmap backed by a file
+    Returns
+    -------
+    Callable[[int, int, np.ndarray], None]
+        the tile writer
+    """
+    def write_tile(y: int, x: int, tile: np.ndarray) -> None:
+        canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+
+    return write_tile
+
+
+def compute_source_bounds(homography: np.ndarray, tile_bounds: Tuple[int, int, int, int],
+                          source_shape: Tuple[int, int]) -> Tuple[int, int, int, int]:
+    """
+    Compute the region of the source image needed to interpolate every pixel of a tile
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the tile coordinate to the source image coordinate
+    tile_bounds: Tuple[int, int, int, int]
+        y0, y1, x0, x1 of the tile, the end bounds are exclusive
+    source_shape: Tuple[int, int]
+        height and width of the source image
+    Returns
+    -------
+    Tuple[int, int, int, int]
+        y0, y1, x0, x1 of the region in the source image, the end bounds are exclusive
+    """
+    y0, y1, x0, x1 = tile_bounds
+    source_height, source_width = source_shape
+    corners = np.array([[x0, x1 - 1, x0, x1 - 1], [y0, y0, y1 - 1, y1 - 1], [1, 1, 1, 1]], dtype=np.float64)
+    p_prime = homography @ corners
+
+    # the tile crosses the line at infinity of the homography, its image is unbounded
+    if not (np.all(p_prime[-1] > 0) or np.all(p_prime[-1] < 0)):
+        return 0, source_height, 0, source_width
+
+    # bounding box of the projected corners, with a margin for the bilinear neighbour and rounding
+    mapped_x, mapped_y = p_prime[0] / p_prime[-1], p_prime[1] / p_prime[-1]
+    bounds_x = np.clip([np.floor(mapped_x.min()) - 1, np.floor(mapped_x.max()) + 3], 0, source_width).astype(int)
+    bounds_y = np.clip([np.floor(mapped_y.min()) - 1, np.floor(mapped_y.max()) + 3], 0, source_height).astype(int)
+    return bounds_y[0], bounds_y[1], bounds_x[0], bounds_x[1]
+
+
+def warp_and_blend_tile(homography: np.ndarray,
+                        rgb_left_tile: np.ndarray,
+                        rgb_right_region: np.ndarray,
+                        tile_bounds: Tuple[int, int, int, int],
+                        right_origin: Tuple[int, int],
+                        right_shape: Tuple[int, int],
+                        left_shape: Tuple[int, int],
+                        canvas_offset: Optional[Tuple[int, int]] = (0, 0)) -> np.ndarray:
+    """
+    Compute one tile of the canvas of warp_and_blend
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    rgb_left_tile: np.ndarray
+        region of the left image under the tile, possibly empty
+    rgb_right_region: np.ndarray
+        region of the right image needed by the tile, see compute_source_bounds
+    tile_bounds: Tuple[int, int, int, int]
+        y0, y1, x0, x1 of the tile in the canvas, the end bounds are exclusive
+    right_origin: Tuple[int, int]
+        y, x of the top left corner of rgb_right_region in the right image
+    right_shape: Tuple[int, int]
+        height and width of the full right image
+    left_shape: Tuple[int, int]
+        height and width of the full left image
+    canvas_offset: Optional[Tuple[int, int]]
+        y, x of the left image origin within the canvas
+    Returns
+    -------
+    np.ndarray
+        (y1 - y0, x1 - x0, 3) tile of the combined image
+    """
+    y0, y1, x0, x1 = tile_bounds
+    offset_y, offset_x = canvas_offset
+    image_height, image_width = left_shape
+    ys, xs = np.mgrid[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x]
+
+    mapped_x, mapped_y = compute_map_points(xs, ys, homography)
+    mapped_within = (0 <= mapped_x) & (mapped_x < image_width) & (0 <= mapped_y) & (mapped_y < image_height)
+    right_pixels, interpolated = interpolation_pixels(mapped_x, mapped_y, rgb_right_region,
+                                                      origin=right_origin, image_shape=right_shape)
+    right_pixels = np.where(mapped_within[..., None], right_pixels, 0)
+
+    # outside the left image, only take the right image
+    warped_tile = right_pixels.astype(np.uint8)
+
+    # over the left image, take the left pixel, unless both images overlap
+    left_rows = slice(*np.clip([offset_y - y0, offset_y + image_height - y0], 0, y1 - y0))
+    left_columns = slice(*np.clip([offset_x - x0, offset_x + image_width - x0], 0, x1 - x0))
+    left_pixels = rgb_left_tile.astype(np.float64)
+    overlap = (mapped_within & interpolated)[left_rows, left_columns, None]
+    right_pixels = right_pixels[left_rows, left_columns]
+    take_right = np.any(left_pixels - right_pixels > BLEND_THRESHOLD, axis=-1, keepdims=True)
+    blended = np.where(take_right, right_pixels, (right_pixels + left_pixels) / 2)
+    warped_tile[left_rows, left_columns] = np.where(overlap, blended, left_pixels)
+
+    return warped_tile
+
+
+def compute_map_points(x: np.ndarray, y: np.ndarray, homography: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the map point of every coordinate, vectorized version of compute_map_point
+    Parameters
+    ----------
+    x: np.ndarray
+        x coordinates
+    y: np.ndarray
+        y coordinates, of the same shape as x
+    homography: np.ndarray
+        homography matrix
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        the x and y coordinates of the map points
+    """
+    points = np.stack([x.ravel(), y.ravel(), np.ones(x.size)]).astype(np.float64)
+    p_prime = homography @ points
+    scale = 1 / p_prime[-1]
+    return (scale * p_prime[0]).reshape(x.shape), (scale * p_prime[1]).reshape(x.shape)
+
+
+def interpolation_pixels(x: np.ndarray, y: np.ndarray, rgb_source_image: np.ndarray,
+                         origin: Optional[Tuple[int, int]] = (0, 0),
+                         image_shape: Optional[Tuple[int, int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bilinear interpolation of all channels of the source image, vectorized version of interpolation_pixel
+    Parameters
+    ----------
+    x: np.ndarray
+        x coordinates in the source image
+    y: np.ndarray
+        y coordinates in the source image, of the same shape as x
+    rgb_source_image: np.ndarray
+        (H, W, C) source image, or a region of it starting at origin
+    origin: Optional[Tuple[int, int]]
+        y, x of the top left corner of rgb_source_image within the full source image
+    image_shape: Optional[Tuple[int, int]]
+        height and width of the full source image, if none are supplied the shape of rgb_source_image is used
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (..., C) interpolated values, 0 outside the source image, and a boolean mask of the coordinates
+        inside the source image
+    """
+    image_height, image_width = rgb_source_image.shape[:2] if image_shape is None else image_shape
+    inside = (x >= 0) & (y >= 0) & (x <= image_width - 1) & (y <= image_height - 1)
+    if rgb_source_image.size == 0:
+        return np.zeros(x.shape + rgb_source_image.shape[2:]), inside & False
+
+    # clamp the coordinates outside the image so the gather stays in bounds, they are masked out afterwards
+    x = np.where(inside, x, 0)
+    y = np.where(inside, y, 0)
+    x0 = x.astype(np.int64)
+    y0 = y.astype(np.int64)
+    x1 = np.minimum(x0 + 1, image_width - 1)
+    y1 = np.minimum(y0 + 1, image_height - 1)
+    a = (x - x0)[..., None]
+    b = (y - y0)[..., None]
+
+    # index within the region
+    region_height, region_width = rgb_source_image.shape[:2]
+    x0, x1 = [np.clip(i - origin[1], 0, region_width - 1) for i in (x0, x1)]
+    y0, y1 = [np.clip(i - origin[0], 0, region_height - 1) for i in (y0, y1)]
+
+    interpolated_value = 0.0
+    interpolated_value += (1.0 - a) * (1.0 - b) * rgb_source_image[y0, x0]
+    interpolated_value += a * b * rgb_source_image[y1, x1]
+    interpolated_value += (1.0 - a) * b * rgb_source_image[y1, x0]
+    interpolated_value += a * (1.0 - b) * rgb_source_image[y0, x1]
+
+    return np.where(inside[..., None], interpolated_value, 0), inside
+
+
+def bruteforce_warp_and_blend(h: np.ndarray, rgb_left_image: np.ndarray, rgb_right_image: np.ndarray) \
+        -> np.ndarray:
+    """
+    Warp the right image onto a canvas twice the width of the left image and blend it with the left image,
+    one pixel at a time. Reference implementation of warp_and_blend.
+    Parameters
+    ----------
+    h: np.ndarray
+        homography matrix mapping the canvas (left image) coordinate to the right image coordinate
+    rgb_left_image: np.ndarray
+        (H, W, 3) left image
+    rgb_right_image: np.ndarray
+        right image
+    Returns
+    -------
+    np.ndarray
+        (H, 2W, 3) combined image after the transformation
+    """
     image_width, image_height = len(rgb_left_image[0]), len(rgb_left_image)
 
     # create new canvas
@@ -70,7 +544,7 @@ def fit_transform_homography(pairs: List[Pair],
                     warped_image[y][x] = rgb_left_image[y][x]
                     continue
 
-                threshold = 50
+                threshold = BLEND_THRESHOLD
                 if r_left - r > threshold or g_left - g > threshold or b_left - b > threshold:
                     warped_image[y][x] = [r, g, b]
                 else:
@@ -83,10 +557,11 @@ def fit_transform_homography(pairs: List[Pair],
             if within(mapped_point, image_height, image_width):
                 # take right pixel
                 r, g, b = interpolation_pixel(mapped_point[0], mapped_point[1], rgb_right_image)
-                warped_image[y][x] = [r, g, b]
 
                 if r == -1:
                     warped_image[y][x] = [0, 0, 0]
+                else:
+                    warped_image[y][x] = [r, g, b]
 
     return warped_image
 
@@ -144,19 +619,29 @@ def compute_homography(pairs: List[Pair]) -> np.ndarray:
     Parameters
     ----------
     pairs: List[Pair]
-        list of pairs of points
+        list of pairs of points, or a PairSet
     Returns
     -------
     np.ndarray
         homography matrix
+    Raises
+    ------
+    ValueError
+        if there are fewer than 4 pairs
     """
-    matrix = []
-    for pair in pairs:
-        x1, y1, x2, y2 = pair.corner1.x, pair.corner1.y, pair.corner2.x, pair.corner2.y
-        matrix.append([0, 0, 0, x1, y1, 1, -y2 * x1, -y2 * y1, -y2])
-        matrix.append([x1, y1, 1, 0, 0, 0, -x2 * x1, -x2 * y1, -x2])
+    if len(pairs) < SAMPLE_SIZE:
+        raise ValueError(f"At least {SAMPLE_SIZE} pairs are required to compute a homography, got {len(pairs)}")
+
+    (x1, y1), (x2, y2) = (points.T for points in get_pair_points(pairs))
+    zeros, ones = np.zeros(len(x1)), np.ones(len(x1))
+
+    # two rows per pair, interleaved
+    matrix = np.stack([
+        np.stack([zeros, zeros, zeros, x1, y1, ones, -y2 * x1, -y2 * y1, -y2], axis=1),
+        np.stack([x1, y1, ones, zeros, zeros, zeros, -x2 * x1, -x2 * y1, -x2], axis=1),
+    ], axis=1).reshape(-1, 9)
 
-    [_, _, vt] = np.linalg.svd(np.array(matrix))
+    [_, _, vt] = np.linalg.svd(matrix)
     vt = vt[-1].reshape(3, 3)
     # Normalization
     homography = (1 / vt[-1, -1]) * vt
@@ -170,7 +655,7 @@ def ransac(pairs: List[Pair], iteration: int, threshold: float) -> List[Pair]:
     Parameters
     ----------
     pairs: List[Pair]
-        list of pairs of points
+        list of pairs of points, or a PairSet
     iteration: int
         number of iterations
     threshold: float
@@ -178,7 +663,7 @@ def ransac(pairs: List[Pair], iteration: int, threshold: float) -> List[Pair]:
     Returns
     -------
     List[Pair]
-        list of pairs of points that are inliers
+        list of pairs of points that are inliers, a PairSet if pairs is one
     """
     result = []
     while iteration > 0:
@@ -226,29 +711,27 @@ def compute_inliers(homography: np.ndarray, pairs: List[Pair], threshold: float)
     homography: np.ndarray
         homography matrix
     pairs: List[Pair]
-        list of pairs of points
+        list of pairs of points, or a PairSet
     threshold: float
         threshold for inliers
     Returns
     -------
     List[Pair]
-        list of pairs of points that are inliers
+        list of pairs of points that are inliers, a PairSet if pairs is one
     """
-    inliers = []
-    for pair in pairs:
-        p1 = np.array([pair.corner1.x, pair.corner1.y, 1])
-        p2 = np.array([pair.corner2.x, pair.corner2.y, 1])
-        p2_prime = np.dot(homography, p1)
+    left_points, right_points = get_pair_points(pairs)
+    p2_prime = np.column_stack([left_points, np.ones(len(left_points))]) @ homography.T
 
-        # normalization
-        p2_prime = (1 / p2_prime[-1]) * p2_prime
+    # normalization
+    p2_prime = (1 / p2_prime[:, -1:]) * p2_prime
 
-        # compute distance between 2 points
-        distance = np.sqrt((p2_prime[0] - p2[0]) ** 2 + (p2_prime[1] - p2[1]) ** 2)
+    # compute distance between 2 points
+    distance = np.sqrt((p2_prime[:, 0] - right_points[:, 0]) ** 2 + (p2_prime[:, 1] - right_points[:, 1]) ** 2)
 
-        if distance < threshold:
-            inliers.append(pair)
-    return inliers
+    inliers = distance < threshold
+    if isinstance(pairs, PairSet):
+        return pairs[inliers]
+    return [pair for pair, inlier in zip(pairs, inliers) if inlier]
 
 
 def points_are_collinear(corners: Tuple[Corner, Corner, Corner]) -> bool:
@@ -0,0 +1,306 @@
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from image_stiching.pair import Pair, PairSet, get_pair_points
+from image_stiching.performance_evaulation.timer import measure_elapsed_time
+
+"""
+Vectorized RANSAC for the homography fitting.
+The minimal samples of a batch are drawn as index arrays, and the homographies of the batch are solved and scored
+against every pair at once.
+"""
+
+# Number of pairs in a minimal sample of a homography
+SAMPLE_SIZE = 4
+
+# Index of the 3 points of every triangle within a minimal sample
+SAMPLE_TRIANGLES = np.array([[0, 1, 2], [0, 1, 3], [0, 2, 3], [1, 2, 3]])
+
+
+@measure_elapsed_time
+def vectorized_ransac(pairs: List[Pair],
+                      iteration: int,
+                      threshold: float,
+                      batch_size: Optional[int] = 1000,
+                      seed: Optional[int] = None,
+                      confidence: Optional[float] = None,
+                      return_report: Optional[bool] = False) -> Union[List[Pair], Tuple[List[Pair], dict]]:
+    """
+    RANSAC algorithm, vectorized version of homography.ransac
+    With a confidence, the number of iterations is adapted to the best inlier ratio found so far: RANSAC stops once
+    the probability of having drawn at least one all-inlier sample reaches the confidence, and iteration is only
+    used as a hard cap.
+    Parameters
+    ----------
+    pairs: List[Pair]
+        list of pairs of points, or a PairSet
+    iteration: int
+        number of non degenerate hypotheses to evaluate, or the maximum number if confidence is given
+    threshold: float
+        threshold for inliers
+    batch_size: Optional[int]
+        number of hypotheses solved and scored at once, bound the memory to batch_size x len(pairs) distances
+    seed: Optional[int]
+        seed of the random generator, for reproducible results
+    confidence: Optional[float]
+        target probability of finding an all-inlier sample, e.g. 0.999, if none are supplied iteration
+        hypotheses are always evaluated
+    return_report: Optional[bool]
+        also return a dict with the number of iterations used, the inlier ratio and the achieved confidence
+    Returns
+    -------
+    List[Pair]
+        list of pairs of points that are inliers of the hypothesis with the most inliers, a PairSet if pairs is one
+    Raises
+    ------
+    ValueError
+        if there are fewer than 4 pairs, or no hypothesis has at least 4 inliers, e.g. all the samples are
+        degenerate, so that no homography can be computed from the result
+    """
+    if len(pairs) < SAMPLE_SIZE:
+        raise ValueError(f"At least {SAMPLE_SIZE} pairs are required to compute a homography, got {len(pairs)}")
+
+    left_points, right_points = get_pair_points(pairs)
+    rng = np.random.default_rng(seed)
+
+    best_inliers = np.zeros(len(pairs), dtype=bool)
+    n_iteration = 0
+    while n_iteration < iteration:
+        # the samples are drawn batch by batch, so an early stop also saves the sampling of the later batches
+        n_requested = min(batch_size, iteration - n_iteration)
+        batch = draw_minimal_samples(left_points, right_points, n_requested, rng)
+        if len(batch) == 0:
+            break
+
+        homographies = solve_homographies(left_points[batch], right_points[batch])
+        inliers = compute_inlier_mask(homographies, left_points, right_points, threshold)
+        counts = inliers.sum(axis=1)
+
+        # the batch is scored at once, but hypotheses after the one where the adaptive criterion is met
+        # are discarded so the result is the same as evaluating them one at a time
+        if confidence is not None:
+            running_best = np.maximum(np.maximum.accumulate(counts), best_inliers.sum())
+            required = compute_required_iteration(running_best / len(pairs), confidence)
+            done = np.flatnonzero(n_iteration + np.arange(1, len(batch) + 1) >= required)
+            if len(done) > 0:
+                counts = counts[:done[0] + 1]
+
+        # the first hypothesis with strictly more inliers wins, as in homography.ransac
+        best = np.argmax(counts)
+        if counts[best] > best_inliers.sum():
+            best_inliers = inliers[best]
+        n_iteration += len(counts)
+
+        # stop once the confidence is reached, or when the non degenerate samples run out
+        if len(counts) < n_requested:
+            break
+
+    if best_inliers.sum() < SAMPLE_SIZE:
+        raise ValueError(f"No hypothesis with at least {SAMPLE_SIZE} inliers was found among {len(pairs)} pairs "
+                         f"after {n_iteration} iterations, the pairs may be degenerate")
+
+    if isinstance(pairs, PairSet):
+        result = pairs[best_inliers]
+    else:
+        result = [pairs[i] for i in np.flatnonzero(best_inliers)]
+    inlier_ratio = len(result) / len(pairs)
+    report = {
+        "iterations": n_iteration,
+        "inlier_ratio": inlier_ratio,
+        "confidence": compute_confidence(inlier_ratio, n_iteration),
+    }
+    if return_report:
+        return result, report
+    return result
+
+
+def format_ransac_report(report: dict) -> str:
+    """
+    Format the report of vectorized_ransac as a line of the pipeline output
+    Parameters
+    ----------
+    report: dict
+        report of vectorized_ransac, see return_report
+    Returns
+    -------
+    str
+        the number of iterations, the inlier ratio and the confidence
+    """
+    return '[INFO] RANSAC iterations: %d, inlier ratio: %.4f, confidence: %.6f' \
+        % (report["iterations"], report["inlier_ratio"], report["confidence"])
+
+
+def compute_required_iteration(inlier_ratio: Union[float, np.ndarray], confidence: float) \
+        -> Union[float, np.ndarray]:
+    """
+    Compute the number of iterations needed to draw at least one all-inlier sample with the given confidence
+    Parameters
+    ----------
+    inlier_ratio: Union[float, np.ndarray]
+        ratio of inliers among all pairs
+    confidence: float
+        target probability of drawing at least one all-inlier sample
+    Returns
+    -------
+    Union[float, np.ndarray]
+        required number of iterations, inf if there is no inlier
+    """
+    p_good_sample = np.asarray(inlier_ratio, dtype=np.float64) ** SAMPLE_SIZE
+    with np.errstate(divide="ignore", invalid="ignore"):
+        required = np.where(p_good_sample >= 1, 1,
+                            np.ceil(np.log(1 - confidence) / np.log(1 - p_good_sample)))
+    return np.where(p_good_sample > 0, required, np.inf)
+
+
+def compute_confidence(inlier_ratio: float, n_iteration: int) -> float:
+    """
+    Compute the probability of having drawn at least one all-inlier sample
+    Parameters
+    ----------
+    inlier_ratio: float
+        ratio of inliers among all pairs
+    n_iteration: int
+        number of samples drawn
+    Returns
+    -------
+    float
+        probability of at least one all-inlier sample
+    """
+    return 1 - (1 - inlier_ratio ** SAMPLE_SIZE) ** n_iteration
+
+
+def draw_minimal_samples(left_points: np.ndarray, right_points: np.ndarray, n_sample: int,
+                         rng: np.random.Generator, max_round: Optional[int] = 100) -> np.ndarray:
+    """
+    Draw random minimal samples of 4 distinct pairs, rejecting samples with 3 collinear points in either image.
+    Parameters
+    ----------
+    left_points: np.ndarray
+        (N, 2) coordinates of the corners in the first image
+    right_points: np.ndarray
+        (N, 2) coordinates of the corners in the second image
+    n_sample: int
+        number of non degenerate samples to draw
+    rng: np.random.Generator
+        random generator used for sampling
+    max_round: Optional[int]
+        maximum number of rounds of drawing, so that a set of degenerate points does not loop forever
+    Returns
+    -------
+    np.ndarray
+        (n_sample, 4) array of pair indices, fewer rows if max_round is reached
+    """
+    n_pair = len(left_points)
+    if n_pair < SAMPLE_SIZE:
+        raise ValueError(f"At least {SAMPLE_SIZE} pairs are required to compute a homography, got {n_pair}")
+
+    samples = []
+    n_accepted = 0
+    for _ in range(max_round):
+        if n_accepted >= n_sample:
+            break
+
+        # draw with replacement and reject samples with repeated pairs
+        candidates = rng.integers(0, n_pair, size=(2 * (n_sample - n_accepted), SAMPLE_SIZE))
+        candidates.sort(axis=1)
+        candidates = candidates[np.all(candidates[:, 1:] != candidates[:, :-1], axis=1)]
+
+        candidates = candidates[~(has_collinear_points(left_points[candidates])
+                                  | has_collinear_points(right_points[candidates]))]
+        samples.append(candidates[:n_sample - n_accepted])
+        n_accepted += len(samples[-1])
+
+    return np.concatenate(samples) if samples else np.empty((0, SAMPLE_SIZE), dtype=np.int64)
+
+
+def has_collinear_points(points: np.ndarray, tolerance: Optional[float] = 1e-5) -> np.ndarray:
+    """
+    Check if any 3 points of each sample are collinear
+    Parameters
+    ----------
+    points: np.ndarray
+        (B, 4, 2) coordinates of the points of every sample
+    tolerance: Optional[float]
+        samples with a triangle area below the tolerance are degenerate
+    Returns
+    -------
+    np.ndarray
+        (B,) boolean array, True if the sample contains collinear points
+    """
+    p1, p2, p3 = [points[:, SAMPLE_TRIANGLES[:, i]] for i in range(3)]
+    area_of_triangle = 0.5 * (p1[..., 0] * (p2[..., 1] - p3[..., 1])
+                              + p2[..., 0] * (p3[..., 1] - p1[..., 1])
+                              + p3[..., 0] * (p1[..., 1] - p2[..., 1]))
+    return np.any(np.abs(area_of_triangle) < tolerance, axis=1)
+
+
+def solve_homographies(left_points: np.ndarray, right_points: np.ndarray) -> np.ndarray:
+    """
+    Solve the homography of every sample, batched version of homography.compute_homography
+    Parameters
+    ----------
+    left_points: np.ndarray
+        (B, K, 2) coordinates in the first image
+    right_points: np.ndarray
+        (B, K, 2) coordinates in the second image
+    Returns
+    -------
+    np.ndarray
+        (B, 3, 3) homography matrices mapping the first image to the second image
+    """
+    n_batch, n_point, _ = left_points.shape
+    x1, y1 = left_points[..., 0], left_points[..., 1]
+    x2, y2 = right_points[..., 0], right_points[..., 1]
+    zeros, ones = np.zeros_like(x1), np.ones_like(x1)
+
+    matrix = np.empty((n_batch, n_point, 2, 9))
+    matrix[:, :, 0] = np.stack([zeros, zeros, zeros, x1, y1, ones, -y2 * x1, -y2 * y1, -y2], axis=-1)
+    matrix[:, :, 1] = np.stack([x1, y1, ones, zeros, zeros, zeros, -x2 * x1, -x2 * y1, -x2], axis=-1)
+
+    matrix = matrix.reshape(n_batch, 2 * n_point, 9)
+
+    # a minimal sample is an exactly determined 8x8 system once h33 is fixed to 1, which is much cheaper to
+    # solve than the SVD, fall back to the SVD if any system of the batch is singular
+    if n_point == SAMPLE_SIZE:
+        try:
+            h = np.linalg.solve(matrix[:, :, :8], -matrix[:, :, 8:])
+            return np.concatenate([h[:, :, 0], np.ones((n_batch, 1))], axis=1).reshape(n_batch, 3, 3)
+        except np.linalg.LinAlgError:
+            pass
+
+    [_, _, vt] = np.linalg.svd(matrix)
+    vt = vt[:, -1].reshape(n_batch, 3, 3)
+    # Normalization
+    return vt / vt[:, -1:, -1:]
+
+
+def compute_inlier_mask(homographies: np.ndarray, left_points: np.ndarray, right_points: np.ndarray,
+                        threshold: float) -> np.ndarray:
+    """
+    Compute the inliers of every homography, batched version of homography.compute_inliers
+    Parameters
+    ----------
+    homographies: np.ndarray
+        (B, 3, 3) homography matrices
+    left_points: np.ndarray
+        (N, 2) coordinates of the corners in the first image
+    right_points: np.ndarray
+        (N, 2) coordinates of the corners in the second image
+    threshold: float
+        threshold for inliers
+    Returns
+    -------
+    np.ndarray
+        (B, N) boolean array, True if the pair is an inlier of the homography
+    """
+    homogeneous = np.hstack([left_points, np.ones((len(left_points), 1))])
+    projected = homographies @ homogeneous.T
+
+    # normalization
+    with np.errstate(divide="ignore", invalid="ignore"):
+        projected = projected[:, :2] / projected[:, 2:]
+
+    # compute distance between 2 points
+    distance = np.hypot(projected[:, 0] - right_points[:, 0], projected[:, 1] - right_points[:, 1])
+    return distance < threshold
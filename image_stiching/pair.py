@@ -1,7 +1,10 @@
 import math
-from typing import List, Type, Optional
+from collections.abc import Sequence
+from typing import List, Type, Optional, Tuple
 
-from image_stiching.corner import Corner
+import numpy as np
+
+from image_stiching.corner import Corner, CornerSet
 
 """
 Data structure to store 2 Corner objects.
@@ -16,8 +19,6 @@ class Pair:
     corner1: Type[Corner]
     corner2: Type[Corner]
     ncc: float
-    gradient: float
-    distance: float
 
     def __init__(self, corner1: Type[Corner], corner2: Type[Corner], ncc: float):
         """Class Constructor
@@ -33,8 +34,14 @@ class Pair:
         self.corner1 = corner1
         self.corner2 = corner2
         self.ncc: float = ncc
-        self.gradient: float = self.cal_gradient()
-        self.distance: float = self.cal_distance()
+
+    @property
+    def gradient(self) -> float:
+        return self.cal_gradient()
+
+    @property
+    def distance(self) -> float:
+        return self.cal_distance()
 
     def __lt__(self, other):
         return self.ncc < other.ncc
@@ -67,3 +74,143 @@ class Pair:
         """
         return math.sqrt(
             (self.corner1.x - self.corner2.x) ** 2 + (self.corner1.y - self.corner2.y) ** 2)
+
+
+class PairSet(Sequence):
+    """Class PairSet
+        Columnar set of pairs: the index of the first corner of every pair in a first CornerSet, the index of the
+        second corner in a second CornerSet, and the normalized cross correlation of every pair.
+        Distances and gradients are computed for all pairs at once as array expressions.
+        Indexing with an integer returns a Pair view of the pair, created when first accessed and kept so that the
+        same object is returned on every access, so a PairSet can be used wherever a list of Pair is.
+        Indexing with a slice, an index array or a boolean mask returns a new PairSet over the same CornerSets.
+    """
+    corners1: CornerSet = None
+    corners2: CornerSet = None
+    index1: np.ndarray = None
+    index2: np.ndarray = None
+    ncc: np.ndarray = None
+
+    def __init__(self, corners1: CornerSet, corners2: CornerSet, index1: np.ndarray, index2: np.ndarray,
+                 ncc: np.ndarray):
+        """Class Constructor
+        Parameters
+        ----------
+        corners1: CornerSet
+            Corners of the first image.
+        corners2: CornerSet
+            Corners of the second image.
+        index1: np.ndarray
+            (N,) index in corners1 of the first corner of every pair.
+        index2: np.ndarray
+            (N,) index in corners2 of the second corner of every pair.
+        ncc: np.ndarray
+            (N,) normalized cross correlation of every pair.
+        """
+        self.corners1 = corners1
+        self.corners2 = corners2
+        self.index1 = np.ascontiguousarray(index1, dtype=np.int64).reshape(-1)
+        self.index2 = np.ascontiguousarray(index2, dtype=np.int64).reshape(-1)
+        self.ncc = np.ascontiguousarray(ncc, dtype=np.float64).reshape(-1)
+        if not len(self.index1) == len(self.index2) == len(self.ncc):
+            raise ValueError(f"index1, index2 and ncc must have the same length, got {len(self.index1)}, "
+                             f"{len(self.index2)} and {len(self.ncc)}")
+        self._materialized: List[Optional[Pair]] = [None] * len(self.ncc)
+
+    @classmethod
+    def from_pairs(cls, pairs: List[Pair]) -> "PairSet":
+        """
+        Create a PairSet from a list of Pair, every pair gets its own corner in both CornerSets
+        """
+        if isinstance(pairs, PairSet):
+            return pairs
+
+        pairs = list(pairs)
+        index = np.arange(len(pairs))
+        return cls(CornerSet.from_corners([pair.corner1 for pair in pairs]),
+                   CornerSet.from_corners([pair.corner2 for pair in pairs]),
+                   index, index, [pair.ncc for pair in pairs])
+
+    @property
+    def points1(self) -> np.ndarray:
+        """
+        (N, 2) x, y coordinate of the first corner of every pair
+        """
+        return np.stack([self.corners1.x[self.index1], self.corners1.y[self.index1]], axis=1).astype(np.float64)
+
+    @property
+    def points2(self) -> np.ndarray:
+        """
+        (N, 2) x, y coordinate of the second corner of every pair
+        """
+        return np.stack([self.corners2.x[self.index2], self.corners2.y[self.index2]], axis=1).astype(np.float64)
+
+    @property
+    def distances(self) -> np.ndarray:
+        """
+        (N,) distance of every pair, see Pair.cal_distance
+        """
+        dx = self.corners1.x[self.index1] - self.corners2.x[self.index2]
+        dy = self.corners1.y[self.index1] - self.corners2.y[self.index2]
+        return np.sqrt(dx ** 2 + dy ** 2)
+
+    def compute_gradients(self, width_offset: Optional[int] = 0) -> np.ndarray:
+        """
+        Calculate the gradient of every pair, see Pair.cal_gradient
+        Parameters
+        ----------
+        width_offset: int
+            Offset of the gradient.
+        Returns
+        -------
+        np.ndarray
+            (N,) gradient of every pair
+        """
+        dx = self.corners1.x[self.index1] - self.corners2.x[self.index2] + width_offset
+        dy = self.corners1.y[self.index1] - self.corners2.y[self.index2]
+        return dy / np.where(dx == 0, 1, dx)
+
+    def __len__(self) -> int:
+        return len(self.ncc)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            pair = self._materialized[index]
+            if pair is None:
+                pair = Pair(self.corners1[self.index1[index]], self.corners2[self.index2[index]],
+                            self.ncc[index].item())
+                self._materialized[index] = pair
+            return pair
+
+        if isinstance(index, slice):
+            index = np.arange(len(self))[index]
+        index = np.asarray(index)
+        return PairSet(self.corners1, self.corners2, self.index1[index], self.index2[index], self.ncc[index])
+
+    def __getstate__(self):
+        # the Pair views are not pickled, they are created again when accessed
+        state = self.__dict__.copy()
+        state["_materialized"] = [None] * len(self)
+        return state
+
+    def __repr__(self):
+        return str(list(self))
+
+
+def get_pair_points(pairs: List[Pair]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the coordinates of the corners of the pairs
+    Parameters
+    ----------
+    pairs: List[Pair]
+        list of pairs of points, or a PairSet
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        (N, 2) arrays of the x, y coordinates of the first and second corner of every pair
+    """
+    if isinstance(pairs, PairSet):
+        return pairs.points1, pairs.points2
+    left_points = np.array([(pair.corner1.x, pair.corner1.y) for pair in pairs], dtype=np.float64).reshape(-1, 2)
+    right_points = np.array([(pair.corner2.x, pair.corner2.y) for pair in pairs], dtype=np.float64).reshape(-1, 2)
+    return left_points, right_points
@@ -0,0 +1,358 @@
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import imageIO.readwrite as IORW
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import compare_all_ncc_batched
+from image_stiching.homography.homography import MAX_CANVAS_AREA_RATIO, compute_homography, \
+    compute_projected_bounds, compute_source_bounds, compute_map_points, interpolation_pixels
+from image_stiching.homography.ransac import vectorized_ransac, SAMPLE_SIZE
+from image_stiching.parallel.executor import parallel_detect_and_describe
+from image_stiching.performance_evaulation.timer import measure_elapsed_time
+
+"""
+Multi image panorama.
+The corners and feature descriptors of every frame are computed once, every candidate pair of frames is matched,
+and the pairs with enough RANSAC inliers form a match graph weighted by the inlier count. The frame with the most
+inliers is the reference, the homography of every other frame is composed along a maximum spanning tree of the
+graph, and all frames are warped into a single canvas in one pass.
+@Author: Neville Loh
+"""
+
+# Edge of the match graph, (i, j) with i < j, to the homography mapping frame i to frame j and its inlier count
+MatchGraph = Dict[Tuple[int, int], Tuple[np.ndarray, int]]
+
+
+@measure_elapsed_time
+def stitch_panorama(source_paths: List[str],
+                    n_corner: Optional[int] = 1000,
+                    alpha: Optional[float] = 0.04,
+                    gaussian_window_size: Optional[int] = 7,
+                    feature_descriptor_patch_size: Optional[int] = 15,
+                    feature_descriptor_threshold: Optional[float] = 0.9,
+                    ransac_iteration: Optional[int] = 20000,
+                    ransac_threshold: Optional[float] = 1,
+                    ransac_confidence: Optional[float] = 0.999,
+                    min_inliers: Optional[int] = 20,
+                    candidate_pairs: Optional[List[Tuple[int, int]]] = None,
+                    tile_size: Optional[int] = 512,
+                    n_workers: Optional[int] = 1) -> np.ndarray:
+    """
+    Stitch any number of overlapping frames into one panorama
+    Every image is read once, frames that are not connected to the reference frame are left out.
+    Parameters
+    ----------
+    source_paths: List[str]
+        paths to the png images of the frames
+    n_corner: Optional[int]
+        number of corners to detect in every frame
+    alpha: Optional[float]
+        alpha value for the Harris corner detector
+    gaussian_window_size: Optional[int]
+        size of the gaussian window for the Harris corner detector
+    feature_descriptor_patch_size: Optional[int]
+        size of the patch for the feature descriptor
+    feature_descriptor_threshold: Optional[float]
+        threshold ratio for the best match and the second-best match
+    ransac_iteration: Optional[int]
+        maximum number of RANSAC iterations of every pair of frames
+    ransac_threshold: Optional[float]
+        inlier distance threshold of RANSAC
+    ransac_confidence: Optional[float]
+        target confidence of RANSAC, see vectorized_ransac
+    min_inliers: Optional[int]
+        minimum number of inliers for a pair of frames to be an edge of the match graph
+    candidate_pairs: Optional[List[Tuple[int, int]]]
+        pairs of frame indices to match, e.g. only neighbouring frames of a rig, if none are supplied every pair
+        is matched
+    tile_size: Optional[int]
+        height and width of the tiles of the canvas
+    n_workers: Optional[int]
+        number of worker processes detecting and describing the corners of the frames, see compute_image_features
+    Returns
+    -------
+    np.ndarray
+        (canvas height, canvas width, 3) panorama
+    """
+    rgb_images = [IORW.readRGBImageToNdArray(path)[2] for path in source_paths]
+    px_arrays = [IORW.convertRGBNdArrayToGreyscale(image) for image in rgb_images]
+
+    features = compute_image_features(px_arrays, n_corner=n_corner, alpha=alpha,
+                                      gaussian_window_size=gaussian_window_size,
+                                      feature_descriptor_patch_size=feature_descriptor_patch_size,
+                                      n_workers=n_workers)
+    graph = build_match_graph(features, threshold=feature_descriptor_threshold, ransac_iteration=ransac_iteration,
+                              ransac_threshold=ransac_threshold, ransac_confidence=ransac_confidence,
+                              min_inliers=min_inliers, candidate_pairs=candidate_pairs)
+
+    reference = select_reference_frame(len(source_paths), graph)
+    parents = compute_spanning_tree(len(source_paths), graph, reference)
+    homographies = compose_homographies(graph, parents, reference)
+    print('[INFO] reference frame: %d, frames in the panorama: %d of %d'
+          % (reference, len(homographies), len(source_paths)))
+
+    shapes = {i: rgb_images[i].shape[:2] for i in homographies}
+    canvas_shape, canvas_offset = compute_panorama_bounds(homographies, shapes)
+    return warp_panorama(homographies, rgb_images, canvas_shape, canvas_offset, tile_size=tile_size)
+
+
+@measure_elapsed_time
+def compute_image_features(px_arrays: List[np.ndarray],
+                           n_corner: Optional[int] = 1000,
+                           alpha: Optional[float] = 0.04,
+                           gaussian_window_size: Optional[int] = 7,
+                           feature_descriptor_patch_size: Optional[int] = 15,
+                           n_workers: Optional[int] = 1) -> List[CornerSet]:
+    """
+    Detect the corners of every frame and compute their feature descriptors, once per frame
+    The frames are processed on a pool of n_workers processes, see parallel_detect_and_describe.
+    Parameters
+    ----------
+    px_arrays: List[np.ndarray]
+        greyscale pixel array of every frame
+    n_corner: Optional[int]
+        number of corners to detect in every frame
+    alpha: Optional[float]
+        alpha value for the Harris corner detector
+    gaussian_window_size: Optional[int]
+        size of the gaussian window for the Harris corner detector
+    feature_descriptor_patch_size: Optional[int]
+        size of the patch for the feature descriptor
+    n_workers: Optional[int]
+        number of worker processes, 1 to process the frames sequentially, None for the number of processors
+    Returns
+    -------
+    List[CornerSet]
+        corners with their feature descriptors of every frame
+    """
+    kwargs = dict(n_corner=n_corner, alpha=alpha, gaussian_window_size=gaussian_window_size,
+                  feature_descriptor_patch_size=feature_descriptor_patch_size)
+    return parallel_detect_and_describe(px_arrays, [kwargs] * len(px_arrays), n_workers=n_workers)
+
+
+@measure_elapsed_time
+def build_match_graph(features: List[CornerSet],
+                      threshold: Optional[float] = 0.9,
+                      ransac_iteration: Optional[int] = 20000,
+                      ransac_threshold: Optional[float] = 1,
+                      ransac_confidence: Optional[float] = 0.999,
+                      min_inliers: Optional[int] = 20,
+                      candidate_pairs: Optional[List[Tuple[int, int]]] = None) -> MatchGraph:
+    """
+    Match every candidate pair of frames and keep the pairs with enough RANSAC inliers
+    Parameters
+    ----------
+    features: List[CornerSet]
+        corners with their feature descriptors of every frame, see compute_image_features
+    threshold: Optional[float]
+        threshold ratio for the best match and the second-best match
+    ransac_iteration: Optional[int]
+        maximum number of RANSAC iterations
+    ransac_threshold: Optional[float]
+        inlier distance threshold of RANSAC
+    ransac_confidence: Optional[float]
+        target confidence of RANSAC
+    min_inliers: Optional[int]
+        minimum number of inliers for a pair of frames to be an edge
+    candidate_pairs: Optional[List[Tuple[int, int]]]
+        pairs of frame indices to match, if none are supplied every pair is matched
+    Returns
+    -------
+    MatchGraph
+        the homography from frame i to frame j and the inlier count of every edge (i, j), i < j
+    """
+    if candidate_pairs is None:
+        candidate_pairs = combinations(range(len(features)), 2)
+
+    graph = {}
+    for i, j in sorted({(min(i, j), max(i, j)) for i, j in candidate_pairs if i != j}):
+        pairs = compare_all_ncc_batched(features[i], features[j], threshold)
+        if len(pairs) < max(SAMPLE_SIZE, min_inliers):
+            continue
+
+        try:
+            inliers = vectorized_ransac(pairs, ransac_iteration, ransac_threshold, confidence=ransac_confidence)
+        except ValueError as error:
+            print('[INFO] frames %d - %d: %d pairs, no homography: %s' % (i, j, len(pairs), error))
+            continue
+        print('[INFO] frames %d - %d: %d pairs, %d inliers' % (i, j, len(pairs), len(inliers)))
+        if len(inliers) >= max(SAMPLE_SIZE, min_inliers):
+            graph[(i, j)] = (compute_homography(inliers), len(inliers))
+
+    return graph
+
+
+def select_reference_frame(n_image: int, graph: MatchGraph) -> int:
+    """
+    Select the frame with the most inliers with all other frames as the reference frame of the panorama
+    Parameters
+    ----------
+    n_image: int
+        number of frames
+    graph: MatchGraph
+        match graph of the frames
+    Returns
+    -------
+    int
+        index of the reference frame
+    """
+    weights = np.zeros(n_image, dtype=np.int64)
+    for (i, j), (_, n_inliers) in graph.items():
+        weights[i] += n_inliers
+        weights[j] += n_inliers
+    return int(np.argmax(weights))
+
+
+def compute_spanning_tree(n_image: int, graph: MatchGraph, reference: int) -> Dict[int, Optional[int]]:
+    """
+    Compute the maximum spanning tree of the match graph rooted at the reference frame, with Prim's algorithm,
+    so that every frame is attached through the pairs with the most inliers
+    Parameters
+    ----------
+    n_image: int
+        number of frames
+    graph: MatchGraph
+        match graph of the frames
+    reference: int
+        index of the reference frame, the root of the tree
+    Returns
+    -------
+    Dict[int, Optional[int]]
+        parent of every frame connected to the reference frame, None for the reference frame
+    """
+    weights = np.zeros((n_image, n_image), dtype=np.int64)
+    for (i, j), (_, n_inliers) in graph.items():
+        weights[i, j] = weights[j, i] = n_inliers
+
+    parents = {reference: None}
+    best_weight = weights[reference].copy()
+    best_parent = np.full(n_image, reference)
+    while True:
+        best_weight[list(parents)] = 0
+        frame = int(np.argmax(best_weight))
+        if best_weight[frame] == 0:
+            return parents
+
+        parents[frame] = int(best_parent[frame])
+        closer = weights[frame] > best_weight
+        best_weight[closer] = weights[frame, closer]
+        best_parent[closer] = frame
+
+
+def compose_homographies(graph: MatchGraph, parents: Dict[int, Optional[int]], reference: int) \
+        -> Dict[int, np.ndarray]:
+    """
+    Compose the homographies along the spanning tree
+    Parameters
+    ----------
+    graph: MatchGraph
+        match graph of the frames
+    parents: Dict[int, Optional[int]]
+        parent of every frame in the spanning tree, see compute_spanning_tree
+    reference: int
+        index of the reference frame
+    Returns
+    -------
+    Dict[int, np.ndarray]
+        homography mapping the reference frame coordinate to the frame coordinate, for every frame of the tree
+    """
+    homographies = {reference: np.eye(3)}
+
+    def get_homography(frame: int) -> np.ndarray:
+        if frame not in homographies:
+            parent = parents[frame]
+            if (parent, frame) in graph:
+                step = graph[(parent, frame)][0]
+            else:
+                step = np.linalg.inv(graph[(frame, parent)][0])
+            h = step @ get_homography(parent)
+            homographies[frame] = h / h[-1, -1]
+        return homographies[frame]
+
+    for frame in parents:
+        get_homography(frame)
+    return homographies
+
+
+def compute_panorama_bounds(homographies: Dict[int, np.ndarray], shapes: Dict[int, Tuple[int, int]],
+                            max_area_ratio: Optional[float] = MAX_CANVAS_AREA_RATIO) \
+        -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """
+    Compute the smallest canvas containing every frame projected into the reference frame, multi frame version of
+    compute_canvas_bounds, see compute_projected_bounds
+    Parameters
+    ----------
+    homographies: Dict[int, np.ndarray]
+        homography mapping the reference frame coordinate to the frame coordinate of every frame
+    shapes: Dict[int, Tuple[int, int]]
+        height and width of every frame
+    max_area_ratio: Optional[float]
+        largest area of the canvas as a multiple of the total area of the frames, None for no limit
+    Returns
+    -------
+    Tuple[Tuple[int, int], Tuple[int, int]]
+        height and width of the canvas, and the y, x offset of the reference frame origin within the canvas
+    Raises
+    ------
+    ValueError
+        if the canvas exceeds max_area_ratio
+    """
+    return compute_projected_bounds(homographies, shapes, max_area_ratio=max_area_ratio)
+
+
+@measure_elapsed_time
+def warp_panorama(homographies: Dict[int, np.ndarray],
+                  rgb_images: List[np.ndarray],
+                  canvas_shape: Tuple[int, int],
+                  canvas_offset: Tuple[int, int],
+                  tile_size: Optional[int] = 512) -> np.ndarray:
+    """
+    Warp every frame into one canvas in a single pass over the canvas
+    Each tile of the canvas samples every frame that overlaps it, and the pixel is the average of the frames that
+    cover it.
+    Parameters
+    ----------
+    homographies: Dict[int, np.ndarray]
+        homography mapping the reference frame coordinate to the frame coordinate of every frame
+    rgb_images: List[np.ndarray]
+        (H, W, 3) image of every frame
+    canvas_shape: Tuple[int, int]
+        height and width of the canvas
+    canvas_offset: Tuple[int, int]
+        y, x of the reference frame origin within the canvas
+    tile_size: Optional[int]
+        height and width of the tiles
+    Returns
+    -------
+    np.ndarray
+        (canvas height, canvas width, 3) panorama
+    """
+    canvas_height, canvas_width = canvas_shape
+    offset_y, offset_x = canvas_offset
+    canvas = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
+
+    for y0 in range(0, canvas_height, tile_size):
+        for x0 in range(0, canvas_width, tile_size):
+            y1, x1 = min(y0 + tile_size, canvas_height), min(x0 + tile_size, canvas_width)
+            ys, xs = np.mgrid[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x]
+            total = np.zeros((y1 - y0, x1 - x0, 3))
+            count = np.zeros((y1 - y0, x1 - x0, 1))
+
+            for frame, h in homographies.items():
+                image = rgb_images[frame]
+                fy0, fy1, fx0, fx1 = compute_source_bounds(h, (y0 - offset_y, y1 - offset_y,
+                                                               x0 - offset_x, x1 - offset_x), image.shape[:2])
+                if fy0 >= fy1 or fx0 >= fx1:
+                    continue
+
+                mapped_x, mapped_y = compute_map_points(xs, ys, h)
+                pixels, inside = interpolation_pixels(mapped_x, mapped_y, np.asarray(image[fy0:fy1, fx0:fx1]),
+                                                      origin=(fy0, fx0), image_shape=image.shape[:2])
+                total += pixels
+                count += inside[..., None]
+
+            canvas[y0:y1, x0:x1] = total / np.maximum(count, 1)
+
+    return canvas
@@ -0,0 +1,202 @@
+from collections import namedtuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import compute_feature_descriptor
+from image_stiching.harris_conrner_detection.harris import compute_harris_corner
+from image_stiching.performance_evaulation.timer import measure_elapsed_time
+
+"""
+Parallel executor of the per image stages of the pipeline.
+Each image is copied once into a shared memory block, and the worker processes of the pool map the block instead of
+receiving a pickled copy of the image. Only the results, e.g. the corners and their feature descriptors, are pickled
+back to the caller. The pool is started once per number of workers and reused by every call, unless the caller
+supplies its own executor.
+@Author: Neville Loh
+"""
+
+# Reference to an array in shared memory, enough for a worker process to map it
+SharedArray = namedtuple("SharedArray", "name shape dtype")
+
+# Process pools reused across calls, by number of workers
+_process_pools: Dict[Optional[int], ProcessPoolExecutor] = {}
+
+
+def get_process_pool(n_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Get the process pool of n_workers workers, started on the first call and reused by the next ones
+    Parameters
+    ----------
+    n_workers: Optional[int]
+        number of worker processes, if none are supplied the number of processors is used
+    Returns
+    -------
+    ProcessPoolExecutor
+        the process pool, shut down by shutdown_process_pools or when the interpreter exits
+    """
+    pool = _process_pools.get(n_workers)
+    # a pool whose worker died can not be used anymore, it is replaced
+    if pool is None or getattr(pool, "_broken", False):
+        pool = _process_pools[n_workers] = ProcessPoolExecutor(max_workers=n_workers)
+    return pool
+
+
+def shutdown_process_pools() -> None:
+    """
+    Shut down the process pools of get_process_pool and wait for their workers to exit
+    """
+    while _process_pools:
+        _, pool = _process_pools.popitem()
+        pool.shutdown(wait=True)
+
+
+def share_array(array: np.ndarray) -> Tuple[SharedMemory, SharedArray]:
+    """
+    Copy an array into a new shared memory block
+    Parameters
+    ----------
+    array: np.ndarray
+        array to share
+    Returns
+    -------
+    Tuple[SharedMemory, SharedArray]
+        the shared memory block, to be closed and unlinked by the caller once the workers are done, and the
+        reference to pass to the workers
+    """
+    array = np.asarray(array)
+    block = SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, SharedArray(block.name, array.shape, array.dtype.str)
+
+
+def call_with_shared_array(function: Callable[..., Any], shared: SharedArray, kwargs: dict) -> Any:
+    """
+    Map a shared array and call function with it, run by the worker processes
+    Parameters
+    ----------
+    function: Callable[..., Any]
+        module level function taking the array as first argument, its result must not reference the array
+    shared: SharedArray
+        reference to the array
+    kwargs: dict
+        keyword arguments of function
+    Returns
+    -------
+    Any
+        the result of function
+    """
+    block = SharedMemory(name=shared.name)
+    try:
+        return function(np.ndarray(shared.shape, dtype=np.dtype(shared.dtype), buffer=block.buf), **kwargs)
+    finally:
+        block.close()
+
+
+def map_images_in_pool(function: Callable[..., Any],
+                       px_arrays: List[np.ndarray],
+                       kwargs_list: Optional[List[dict]] = None,
+                       n_workers: Optional[int] = None,
+                       executor: Optional[Executor] = None) -> List[Any]:
+    """
+    Call function(px_array, **kwargs) for every image on a process pool, with the images in shared memory
+    The results are in the order of px_arrays, and are the same as calling function sequentially. With one worker
+    or one image, function is called sequentially in the calling process, unless an executor is supplied.
+    Parameters
+    ----------
+    function: Callable[..., Any]
+        module level function taking the image as first argument, so that the worker processes can import it
+    px_arrays: List[np.ndarray]
+        images
+    kwargs_list: Optional[List[dict]]
+        keyword arguments of every call, if none are supplied function is called with the image only
+    n_workers: Optional[int]
+        number of worker processes of the reused pool, see get_process_pool, if none are supplied the number of
+        processors is used
+    executor: Optional[Executor]
+        executor to submit the calls to instead of the reused pool, it is left running
+    Returns
+    -------
+    List[Any]
+        the result of every call
+    """
+    if kwargs_list is None:
+        kwargs_list = [{}] * len(px_arrays)
+
+    if executor is None and (n_workers == 1 or len(px_arrays) <= 1):
+        return [function(np.asarray(px_array), **kwargs) for px_array, kwargs in zip(px_arrays, kwargs_list)]
+
+    blocks = []
+    try:
+        shared_arrays = []
+        for px_array in px_arrays:
+            block, shared = share_array(np.asarray(px_array))
+            blocks.append(block)
+            shared_arrays.append(shared)
+
+        if executor is None:
+            executor = get_process_pool(n_workers)
+        futures = [executor.submit(call_with_shared_array, function, shared, kwargs)
+                   for shared, kwargs in zip(shared_arrays, kwargs_list)]
+        return [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def detect_and_describe(px_array: np.ndarray,
+                        n_corner: Optional[int] = 1000,
+                        alpha: Optional[float] = 0.04,
+                        gaussian_window_size: Optional[int] = 7,
+                        feature_descriptor_patch_size: Optional[int] = 15) -> CornerSet:
+    """
+    Detect the Harris corners of an image and compute their feature descriptors
+    Parameters
+    ----------
+    px_array: np.ndarray
+        greyscale image
+    n_corner: Optional[int]
+        number of corners to detect
+    alpha: Optional[float]
+        alpha value for the Harris corner detector
+    gaussian_window_size: Optional[int]
+        size of the gaussian window for the Harris corner detector
+    feature_descriptor_patch_size: Optional[int]
+        size of the patch for the feature descriptor
+    Returns
+    -------
+    CornerSet
+        corners with their feature descriptors, corners too close to the border are removed
+    """
+    corners = compute_harris_corner(px_array, n_corner=n_corner, alpha=alpha,
+                                    gaussian_window_size=gaussian_window_size)
+    return compute_feature_descriptor(corners, px_array, feature_descriptor_patch_size)
+
+
+@measure_elapsed_time
+def parallel_detect_and_describe(px_arrays: List[np.ndarray],
+                                 kwargs_list: Optional[List[dict]] = None,
+                                 n_workers: Optional[int] = None,
+                                 executor: Optional[Executor] = None) -> List[CornerSet]:
+    """
+    Detect and describe the corners of every image on a process pool, see detect_and_describe
+    Parameters
+    ----------
+    px_arrays: List[np.ndarray]
+        greyscale images
+    kwargs_list: Optional[List[dict]]
+        keyword arguments of detect_and_describe for every image, if none are supplied the defaults are used
+    n_workers: Optional[int]
+        number of worker processes of the reused pool, if none are supplied the number of processors is used
+    executor: Optional[Executor]
+        executor to submit the images to instead of the reused pool, see map_images_in_pool
+    Returns
+    -------
+    List[CornerSet]
+        corners with their feature descriptors of every image
+    """
+    return map_images_in_pool(detect_and_describe, px_arrays, kwargs_list, n_workers, executor=executor)
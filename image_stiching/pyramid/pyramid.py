@@ -0,0 +1,227 @@
+from time import time
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+import imageProcessing.convolve2D as IPConv2D
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import match_corner_by_ncc, reject_outlier_pairs
+from image_stiching.harris_conrner_detection.harris import compute_harris_corner
+from image_stiching.harris_conrner_detection.harris_util import get_gaussian_kernel
+from image_stiching.homography.homography import compute_homography
+from image_stiching.homography.ransac import vectorized_ransac, SAMPLE_SIZE
+from image_stiching.performance_evaulation.timer import measure_elapsed_time
+
+"""
+Gaussian image pyramid and coarse to fine homography estimation.
+The homography is estimated with the full pipeline at the coarsest level of the pyramid, and refined at every finer
+level from the correspondences of the level above: their left corners are propagated, and the location of each one
+in the right image is searched densely around the location predicted by the coarser homography. Corners are only
+detected at the coarsest level.
+@Author: Neville Loh
+"""
+
+ImageArray = np.ndarray
+
+# Gaussian kernel applied before every down sampling
+PYRAMID_KERNEL_SIZE = 5
+PYRAMID_SIGMA = 1
+
+# No level is built with an image side smaller than this, too few corners survive the border of the descriptors
+PYRAMID_MIN_SIZE = 64
+
+# Confidence of the adaptive RANSAC of the refinement levels, where most guided matches are inliers
+REFINE_RANSAC_CONFIDENCE = 0.999
+
+
+def build_gaussian_pyramid(px_array: ImageArray, n_level: int, min_size: Optional[int] = PYRAMID_MIN_SIZE) \
+        -> List[ImageArray]:
+    """
+    Build a Gaussian pyramid, every level is the previous level smoothed and down sampled by 2
+    Pixel (x, y) of level l is pixel (x * 2^l, y * 2^l) of level 0.
+    Parameters
+    ----------
+    px_array: ImageArray
+        greyscale image, level 0 of the pyramid
+    n_level: int
+        maximum number of levels, including level 0
+    min_size: Optional[int]
+        levels with a side smaller than min_size are not built
+    Returns
+    -------
+    List[ImageArray]
+        the levels of the pyramid, from the finest to the coarsest
+    """
+    kernel = get_gaussian_kernel(PYRAMID_KERNEL_SIZE, sigma=PYRAMID_SIGMA)
+    pyramid = [np.asarray(px_array, dtype=np.float64)]
+    while len(pyramid) < n_level and min(pyramid[-1].shape) // 2 >= min_size:
+        smoothed = IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(pyramid[-1], kernel)
+        pyramid.append(smoothed[::2, ::2])
+    return pyramid
+
+
+def propagate_corners(corners: CornerSet) -> CornerSet:
+    """
+    Get corners of a level in the coordinates of the next finer level
+    Parameters
+    ----------
+    corners: CornerSet
+        corners of the level
+    Returns
+    -------
+    CornerSet
+        the corners at twice their coordinates, without feature descriptors
+    """
+    return CornerSet(2 * corners.x, 2 * corners.y, corners.corner_response)
+
+
+def scale_homography(homography: np.ndarray, scale: float) -> np.ndarray:
+    """
+    Express a homography in the coordinates of an image scaled by scale, e.g. 2 to go one pyramid level finer
+    Parameters
+    ----------
+    homography: np.ndarray
+        homography matrix mapping the left image coordinate to the right image coordinate
+    scale: float
+        scale of the coordinates
+    Returns
+    -------
+    np.ndarray
+        the homography matrix in the scaled coordinates
+    """
+    s = np.diag([scale, scale, 1.0])
+    s_inverse = np.diag([1.0 / scale, 1.0 / scale, 1.0])
+    h = s @ homography @ s_inverse
+    return h / h[-1, -1]
+
+
+@measure_elapsed_time
+def estimate_homography_coarse_to_fine(left_px_array: ImageArray,
+                                       right_px_array: ImageArray,
+                                       n_level: Optional[int] = 3,
+                                       finest_level: Optional[int] = 0,
+                                       n_corner: Optional[int] = 1000,
+                                       alpha: Optional[float] = 0.04,
+                                       gaussian_window_size: Optional[int] = 7,
+                                       feature_descriptor_patch_size: Optional[int] = 15,
+                                       feature_descriptor_threshold: Optional[float] = 0.9,
+                                       enable_outlier_rejection: Optional[bool] = True,
+                                       outlier_rejection_m: Optional[float] = 1,
+                                       ransac_iteration: Optional[int] = 20000,
+                                       ransac_threshold: Optional[float] = 1,
+                                       ransac_confidence: Optional[float] = None,
+                                       search_radius: Optional[float] = 8,
+                                       return_report: Optional[bool] = False) \
+        -> Union[np.ndarray, Tuple[np.ndarray, List[dict]]]:
+    """
+    Estimate the homography on a Gaussian pyramid, coarse to fine
+    Corners are detected and matched exhaustively at the coarsest level only. At every finer level, down to
+    finest_level, the left corners of the correspondences of the level above are propagated, see
+    propagate_corners, the homography of the level above predicts where each one is in the right image, and
+    its descriptor is scored against every location within search_radius of the prediction, see
+    match_corner_by_dense_ncc. Nothing is detected over the finer levels, the cost of a refinement level grows with
+    the number of correspondences rather than with the image.
+    Parameters
+    ----------
+    left_px_array: ImageArray
+        The greyscale pixel array of the left image.
+    right_px_array: ImageArray
+        The greyscale pixel array of the right image.
+    n_level: Optional[int]
+        The maximum number of pyramid levels, fewer are used for small images, see build_gaussian_pyramid.
+    finest_level: Optional[int]
+        The finest level that is refined, the homography is scaled from there to the full resolution.
+    n_corner: Optional[int]
+        The number of corners to detect at the coarsest level.
+    alpha: Optional[float]
+        The alpha value for the Harris corner detector.
+    gaussian_window_size: Optional[int]
+        The size of the gaussian window for the Harris corner detector.
+    feature_descriptor_patch_size: Optional[int]
+        The size of the patch for the feature descriptor.
+    feature_descriptor_threshold: Optional[float]
+        The threshold ratio for the best match and the second-best match, at the coarsest level.
+    enable_outlier_rejection: Optional[bool]
+        Whether to reject outlier pairs at the coarsest level.
+    outlier_rejection_m: Optional[float]
+        The standard deviation for the outlier rejection to include.
+    ransac_iteration: Optional[int]
+        The number of RANSAC iterations, the maximum number at the refinement levels.
+    ransac_threshold: Optional[float]
+        The inlier distance threshold of RANSAC, in pixel of each level.
+    ransac_confidence: Optional[float]
+        The target confidence of RANSAC, REFINE_RANSAC_CONFIDENCE is used at the refinement levels if none is given.
+    search_radius: Optional[float]
+        The distance in pixel of each level along x and y between the searched locations and the prediction.
+    return_report: Optional[bool]
+        Also return a report per level, with the level, the image shape, the number of pairs, the number of
+        inliers and the elapsed time in seconds.
+    Returns
+    -------
+    Union[np.ndarray, Tuple[np.ndarray, List[dict]]]
+        homography matrix mapping the full resolution left image coordinate to the right image coordinate
+    """
+    left_pyramid = build_gaussian_pyramid(left_px_array, n_level)
+    right_pyramid = build_gaussian_pyramid(right_px_array, n_level)
+    coarsest_level = min(len(left_pyramid), len(right_pyramid)) - 1
+    finest_level = min(finest_level, coarsest_level)
+
+    h = None
+    report = []
+    for level in range(coarsest_level, finest_level - 1, -1):
+        ts = time()
+        left_image, right_image = left_pyramid[level], right_pyramid[level]
+
+        if h is None:
+            # coarsest level, detection and exhaustive matching
+            left_corners = compute_harris_corner(left_image, n_corner=n_corner, alpha=alpha,
+                                                 gaussian_window_size=gaussian_window_size)
+            right_corners = compute_harris_corner(right_image, n_corner=n_corner, alpha=alpha,
+                                                  gaussian_window_size=gaussian_window_size)
+            pairs = match_corner_by_ncc((left_image, left_corners), (right_image, right_corners),
+                                        feature_descriptor_patch_size=feature_descriptor_patch_size,
+                                        threshold=feature_descriptor_threshold)
+            if enable_outlier_rejection:
+                pairs = reject_outlier_pairs(pairs, width_offset=left_image.shape[1], m=outlier_rejection_m)
+            confidence = ransac_confidence
+        else:
+            # refinement level, the correspondences of the coarser level are searched around their prediction
+            h = scale_homography(h, 2)
+            left_corners = propagate_corners(left_corners)
+            pairs = match_corner_by_ncc((left_image, left_corners), (right_image, None),
+                                        feature_descriptor_patch_size=feature_descriptor_patch_size,
+                                        homography=h,
+                                        search_radius=search_radius,
+                                        dense_search=True)
+            confidence = ransac_confidence or REFINE_RANSAC_CONFIDENCE
+
+        inliers = []
+        if len(pairs) >= SAMPLE_SIZE:
+            try:
+                inliers = vectorized_ransac(pairs, ransac_iteration, ransac_threshold, confidence=confidence)
+            except ValueError:
+                inliers = []
+
+        # the left corners of the correspondences are propagated to the next level, or all the left corners of this
+        # level if it has too few correspondences
+        if len(pairs) >= SAMPLE_SIZE:
+            left_corners = pairs.corners1[pairs.index1]
+
+        if len(inliers) >= SAMPLE_SIZE:
+            h = compute_homography(inliers)
+        elif h is None:
+            raise ValueError(f"Not enough matches to estimate a homography at pyramid level {level}, "
+                             f"got {len(inliers)} inliers")
+        else:
+            print(f"[INFO] pyramid level {level}: not enough matches to refine, keeping the coarser homography")
+
+        elapsed = time() - ts
+        report.append({"level": level, "shape": left_image.shape, "pairs": len(pairs), "inliers": len(inliers),
+                       "elapsed": elapsed})
+        print('[INFO] pyramid level %d %-12s pairs: %5d  inliers: %5d  Elapsed time: %2.4f sec'
+              % (level, "%dx%d" % left_image.shape[::-1], len(pairs), len(inliers), elapsed))
+
+    h = scale_homography(h, 2 ** finest_level)
+    if return_report:
+        return h, report
+    return h
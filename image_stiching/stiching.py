@@ -1,14 +1,22 @@
-from typing import List, Optional
-import os
+from typing import Dict, List, Optional, Tuple
 
-from image_stiching.feature_descriptor.feature_descriptor import match_corner_by_ncc, reject_outlier_pairs
-from image_stiching.harris_conrner_detection.harris import compute_harris_corner
-from image_stiching.homography.homography import fit_transform_homography
+import numpy as np
+
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import match_corner_by_ncc, reject_outlier_pairs, \
+    match_described_corners, compute_feature_descriptor
+from image_stiching.harris_conrner_detection.harris import compute_harris_corner, compute_harris_response, \
+    select_corners_from_response, plot_corners
+from image_stiching.homography.homography import transform_with_homography, compute_homography
+from image_stiching.homography.ransac import format_ransac_report, vectorized_ransac
+from image_stiching.pair import PairSet
 from image_stiching.performance_evaulation.timer import measure_elapsed_time
+from image_stiching.parallel.executor import parallel_detect_and_describe
+from image_stiching.pyramid.pyramid import estimate_homography_coarse_to_fine
+from image_stiching.util.stage_cache import StageCache, hash_array
+from imageIO.readwrite import writeNdArrayToPNG
 from matplotlib import pyplot as plt
 
-from image_stiching.util.save_object import load_object_at_location, save_object_at_location, get_file_name_from_path
-
 
 @measure_elapsed_time
 def stitch(
@@ -27,8 +35,15 @@ def stitch(
         right_source_path: Optional[str] = None,
         ransac_iteration_input: Optional[int] = 20000,
         ransac_threshold_input: Optional[float] = 1,
+        ransac_confidence_input: Optional[float] = None,
         cache_result: Optional[bool] = True,
         save_output_as_file: Optional[bool] = False,
+        pyramid_levels: Optional[int] = 1,
+        pyramid_search_radius: Optional[float] = 8,
+        matching_translation: Optional[Tuple[float, float]] = None,
+        matching_search_radius: Optional[float] = 20,
+        n_workers: Optional[int] = None,
+        cache: Optional[StageCache] = None,
 ) -> None:
     """
     Stitch two images together.
@@ -57,6 +72,34 @@ def stitch(
         The standard deviation for the outlier rejection to include, default is 1.
     plot_result: Optional[bool]
         Whether to plot the result, default is False.
+    ransac_iteration_input: Optional[int]
+        The number of RANSAC iterations, or the maximum number if ransac_confidence_input is given, default is 20000.
+    ransac_threshold_input: Optional[float]
+        The inlier distance threshold of RANSAC, default is 1.
+    ransac_confidence_input: Optional[float]
+        The target confidence of RANSAC, e.g. 0.999. If given, RANSAC stops once it is reached, default is None.
+    cache_result: Optional[bool]
+        Whether to cache the result of every stage, keyed by the content of the images and the parameters of the
+        stage, see StageCache, default is True.
+    save_output_as_file: Optional[bool]
+        Whether to save the result as output.png, default is False.
+    pyramid_levels: Optional[int]
+        The number of Gaussian pyramid levels. If more than 1, the homography is estimated at the coarsest level
+        and refined level by level with a dense search around the propagated correspondences, see
+        estimate_homography_coarse_to_fine, and the pairs are not cached, default is 1.
+    pyramid_search_radius: Optional[float]
+        The radius in pixel of the guided search at the refinement levels, default is 8.
+    matching_translation: Optional[Tuple[float, float]]
+        A coarse x, y offset of the right image. If given, each left corner is only matched with the right corners
+        within matching_search_radius of its predicted location, default is None.
+    matching_search_radius: Optional[float]
+        The radius in pixel of the guided matching, default is 20.
+    n_workers: Optional[int]
+        If given, the corners of both images are detected and described in parallel on a pool of n_workers
+        processes, with the same result, default is None. With the cache, only the images whose descriptors are not
+        cached are sent to the pool. Not used when plot_harris_corner is True or pyramid_levels is more than 1.
+    cache: Optional[StageCache]
+        The cache of the stages, default is a StageCache in ./cache/stages if cache_result is True.
 
     returns:
     --------
@@ -65,6 +108,19 @@ def stitch(
     """
 
     def compute_pairs():
+        if n_workers is not None and not plot_harris_corner:
+            left_corners, right_corners = parallel_detect_and_describe(
+                [np.asarray(left_px_array), np.asarray(right_px_array)],
+                [dict(n_corner=n_corner, alpha=alpha, gaussian_window_size=gaussian_window_size,
+                      feature_descriptor_patch_size=feature_descriptor_patch_size),
+                 dict(n_corner=1000, alpha=0.04, gaussian_window_size=7,
+                      feature_descriptor_patch_size=feature_descriptor_patch_size)],
+                n_workers=n_workers)
+            return match_described_corners(left_corners, right_corners,
+                                           threshold=feature_descriptor_threshold,
+                                           translation=matching_translation,
+                                           search_radius=matching_search_radius)
+
         left_corners = compute_harris_corner(left_px_array,
                                              n_corner=n_corner,
                                              alpha=alpha,
@@ -81,54 +137,287 @@ def stitch(
         return match_corner_by_ncc((left_px_array, left_corners),
                                    (right_px_array, right_corners),
                                    feature_descriptor_patch_size=feature_descriptor_patch_size,
-                                   threshold=feature_descriptor_threshold)
-
-    if cache_result:
-        try:
-            pairs = load_object_at_location(
-                os.path.join(
-                    ".",
-                    "cache",
-                    f"%s_%s_cache.pkl" % (
-                        get_file_name_from_path(left_source_path),
-                        get_file_name_from_path(right_source_path)
-                    )
-                )
-            )
-        except FileNotFoundError:
-
-            # compute the harris corner
-            pairs = compute_pairs()
-
-            # Save the result
-            save_object_at_location(
-                os.path.join(
-                    ".",
-                    "cache",
-                    f"%s_%s_cache.pkl" % (
-                        get_file_name_from_path(left_source_path),
-                        get_file_name_from_path(right_source_path)
-                    )
-                ),
-                pairs
-            )
+                                   threshold=feature_descriptor_threshold,
+                                   translation=matching_translation,
+                                   search_radius=matching_search_radius)
 
-    else:
+    if pyramid_levels > 1:
+        h = estimate_homography_coarse_to_fine(np.asarray(left_px_array), np.asarray(right_px_array),
+                                               n_level=pyramid_levels,
+                                               n_corner=n_corner,
+                                               alpha=alpha,
+                                               gaussian_window_size=gaussian_window_size,
+                                               feature_descriptor_patch_size=feature_descriptor_patch_size,
+                                               feature_descriptor_threshold=feature_descriptor_threshold,
+                                               enable_outlier_rejection=enable_outlier_rejection,
+                                               outlier_rejection_m=outlier_rejection_m,
+                                               ransac_iteration=ransac_iteration_input,
+                                               ransac_threshold=ransac_threshold_input,
+                                               ransac_confidence=ransac_confidence_input,
+                                               search_radius=pyramid_search_radius)
+        image = transform_with_homography(h,
+                                          source_left_image_path=left_source_path,
+                                          source_right_image_path=right_source_path)
+        show_and_save_result(image, save_output_as_file)
+        return
+
+    if cache is None and cache_result:
+        cache = StageCache()
+
+    if cache is None:
         pairs = compute_pairs()
 
-    # remove the outliers
-    if enable_outlier_rejection:
-        pairs = reject_outlier_pairs(pairs, width_offset=len(left_px_array[0]), m=outlier_rejection_m)
+        # remove the outliers
+        if enable_outlier_rejection:
+            pairs = reject_outlier_pairs(pairs, width_offset=len(left_px_array[0]), m=outlier_rejection_m)
+
+        # compute homography
+        inliers, report = vectorized_ransac(pairs, ransac_iteration_input, ransac_threshold_input,
+                                            confidence=ransac_confidence_input, return_report=True)
+        print(format_ransac_report(report))
+        image = transform_with_homography(compute_homography(inliers),
+                                          source_left_image_path=left_source_path,
+                                          source_right_image_path=right_source_path)
+        show_and_save_result(image, save_output_as_file)
+        return
+
+    # every stage is loaded from the cache or computed, keyed by the content of the images and the parameters
+    left_px_array, right_px_array = np.asarray(left_px_array), np.asarray(right_px_array)
+    left_kwargs = dict(n_corner=n_corner, alpha=alpha, gaussian_window_size=gaussian_window_size,
+                       feature_descriptor_patch_size=feature_descriptor_patch_size)
+    right_kwargs = dict(n_corner=1000, alpha=0.04, gaussian_window_size=7,
+                        feature_descriptor_patch_size=feature_descriptor_patch_size)
+    if n_workers is not None and not plot_harris_corner:
+        (left_key, left_corners), (right_key, right_corners) = compute_described_corners_cached_in_pool(
+            cache, [left_px_array, right_px_array], [left_kwargs, right_kwargs], n_workers=n_workers)
+    else:
+        left_key, left_corners = compute_described_corners_cached(cache, left_px_array, **left_kwargs,
+                                                                  plot_image=plot_harris_corner)
+        right_key, right_corners = compute_described_corners_cached(cache, right_px_array, **right_kwargs)
+    matches_key, pairs = compute_pairs_cached(cache, (left_key, left_corners), (right_key, right_corners),
+                                              threshold=feature_descriptor_threshold,
+                                              translation=matching_translation,
+                                              search_radius=matching_search_radius)
+
+    def compute_h():
+        # remove the outliers
+        inliers = pairs
+        if enable_outlier_rejection:
+            inliers = reject_outlier_pairs(pairs, width_offset=left_px_array.shape[1], m=outlier_rejection_m)
 
-    # compute homography
-    image = fit_transform_homography(list(pairs),
-                                     source_left_image_path=left_source_path,
-                                     source_right_image_path=right_source_path,
-                                     ransac_iteration=ransac_iteration_input,
-                                     ransac_threshold=ransac_threshold_input)
+        inliers, report = vectorized_ransac(inliers, ransac_iteration_input, ransac_threshold_input,
+                                            confidence=ransac_confidence_input, return_report=True)
+        print(format_ransac_report(report))
+        return {"homography": compute_homography(inliers)}
 
+    _, result = cache.get_or_compute("homography", [matches_key],
+                                     dict(enable_outlier_rejection=enable_outlier_rejection,
+                                          outlier_rejection_m=outlier_rejection_m,
+                                          width_offset=left_px_array.shape[1],
+                                          ransac_iteration=ransac_iteration_input,
+                                          ransac_threshold=ransac_threshold_input,
+                                          ransac_confidence=ransac_confidence_input),
+                                     compute_h)
+    cache.report()
+
+    image = transform_with_homography(result["homography"],
+                                      source_left_image_path=left_source_path,
+                                      source_right_image_path=right_source_path)
+    show_and_save_result(image, save_output_as_file)
+
+
+def show_and_save_result(image: np.ndarray, save_output_as_file: Optional[bool] = False) -> None:
+    """
+    Show the stitched image, and save it as output.png
+
+    parameters:
+    -----------
+    image: np.ndarray
+        The stitched image.
+    save_output_as_file: Optional[bool]
+        Whether to save the image as output.png, default is False.
+    """
     plt.imshow(image)
     plt.show()
 
     if save_output_as_file:
-        plt.imsave("output.png", image)
\ No newline at end of file
+        writeNdArrayToPNG("output.png", image)
+
+
+def get_descriptors_key(image_key: str,
+                        n_corner: Optional[int] = 1000,
+                        alpha: Optional[float] = 0.04,
+                        gaussian_window_size: Optional[int] = 7,
+                        feature_descriptor_patch_size: Optional[int] = 15) -> str:
+    """
+    Compute the key of the descriptors stage of an image without computing the upstream stages, the same key as
+    compute_described_corners_cached.
+
+    parameters:
+    -----------
+    image_key: str
+        The content hash of the greyscale pixel array of the image, see hash_array.
+    n_corner: Optional[int]
+        The number of corners to detect, default is 1000.
+    alpha: Optional[float]
+        The alpha value for the Harris corner detector, default is 0.04.
+    gaussian_window_size: Optional[int]
+        The size of the gaussian window for the Harris corner detector, default is 7.
+    feature_descriptor_patch_size: Optional[int]
+        The size of the patch for the feature descriptor, default is 15.
+
+    returns:
+    --------
+    str
+        The key of the descriptors stage.
+    """
+    response_key = StageCache.make_key("harris_response", [image_key],
+                                       dict(alpha=alpha, gaussian_window_size=gaussian_window_size))
+    corners_key = StageCache.make_key("corners", [response_key], dict(n_corner=n_corner))
+    return StageCache.make_key("descriptors", [corners_key, image_key],
+                               dict(feature_descriptor_patch_size=feature_descriptor_patch_size))
+
+
+def compute_described_corners_cached_in_pool(cache: StageCache,
+                                             px_arrays: List[np.ndarray],
+                                             kwargs_list: List[dict],
+                                             n_workers: Optional[int] = None) -> List[Tuple[str, CornerSet]]:
+    """
+    Detect the Harris corners of several images and compute their feature descriptors, see
+    compute_described_corners_cached. The descriptors are loaded from the cache if possible, and the images without
+    cached descriptors are detected and described together on a process pool, see parallel_detect_and_describe.
+    The Harris response and the corners of those images are not stored, only their descriptors.
+
+    parameters:
+    -----------
+    cache: StageCache
+        The cache of the stages.
+    px_arrays: List[np.ndarray]
+        The greyscale pixel array of every image.
+    kwargs_list: List[dict]
+        The n_corner, alpha, gaussian_window_size and feature_descriptor_patch_size of every image.
+    n_workers: Optional[int]
+        The number of worker processes, default is the number of processors.
+
+    returns:
+    --------
+    List[Tuple[str, CornerSet]]
+        The key of the descriptors stage, and the corners with their feature descriptors, of every image.
+    """
+    keys = [get_descriptors_key(hash_array(px_array), **kwargs) for px_array, kwargs in zip(px_arrays, kwargs_list)]
+
+    def compute_descriptors(missing: List[int]) -> List[Dict[str, np.ndarray]]:
+        described = parallel_detect_and_describe([px_arrays[i] for i in missing], [kwargs_list[i] for i in missing],
+                                                 n_workers=n_workers)
+        return [{"corners": corners.to_records(), "descriptors": corners.feature_descriptors}
+                for corners in described]
+
+    entries = cache.get_or_compute_all("descriptors", keys, compute_descriptors)
+    return [(key, CornerSet.from_records(entry["corners"], entry["descriptors"],
+                                         (kwargs["feature_descriptor_patch_size"],) * 2))
+            for key, entry, kwargs in zip(keys, entries, kwargs_list)]
+
+
+def compute_described_corners_cached(cache: StageCache,
+                                     px_array: np.ndarray,
+                                     n_corner: Optional[int] = 1000,
+                                     alpha: Optional[float] = 0.04,
+                                     gaussian_window_size: Optional[int] = 7,
+                                     feature_descriptor_patch_size: Optional[int] = 15,
+                                     plot_image: Optional[bool] = False) -> Tuple[str, CornerSet]:
+    """
+    Detect the Harris corners of an image and compute their feature descriptors, every stage being loaded from the
+    cache if possible: the Harris response, the n strongest corners and their feature descriptors.
+
+    parameters:
+    -----------
+    cache: StageCache
+        The cache of the stages.
+    px_array: np.ndarray
+        The greyscale pixel array of the image.
+    n_corner: Optional[int]
+        The number of corners to detect, default is 1000.
+    alpha: Optional[float]
+        The alpha value for the Harris corner detector, default is 0.04.
+    gaussian_window_size: Optional[int]
+        The size of the gaussian window for the Harris corner detector, default is 7.
+    feature_descriptor_patch_size: Optional[int]
+        The size of the patch for the feature descriptor, default is 15.
+    plot_image: Optional[bool]
+        Whether to plot the detected corners, default is False.
+
+    returns:
+    --------
+    Tuple[str, CornerSet]
+        The key of the descriptors stage, and the corners with their feature descriptors.
+    """
+    image_key = hash_array(px_array)
+    response_key, response = cache.get_or_compute(
+        "harris_response", [image_key], dict(alpha=alpha, gaussian_window_size=gaussian_window_size),
+        lambda: {"response": compute_harris_response(px_array, alpha, gaussian_window_size)})
+
+    corners_key, corners = cache.get_or_compute(
+        "corners", [response_key], dict(n_corner=n_corner),
+        lambda: {"corners": select_corners_from_response(response["response"], n_corner)})
+    if plot_image:
+        plot_corners(px_array, CornerSet.from_records(corners["corners"]))
+
+    def compute_descriptors():
+        described = compute_feature_descriptor(CornerSet.from_records(corners["corners"]), px_array,
+                                               feature_descriptor_patch_size)
+        return {"corners": described.to_records(), "descriptors": described.feature_descriptors}
+
+    descriptors_key, described = cache.get_or_compute(
+        "descriptors", [corners_key, image_key], dict(feature_descriptor_patch_size=feature_descriptor_patch_size),
+        compute_descriptors)
+
+    return descriptors_key, CornerSet.from_records(described["corners"], described["descriptors"],
+                                                   (feature_descriptor_patch_size, feature_descriptor_patch_size))
+
+
+def compute_pairs_cached(cache: StageCache,
+                         left_data: Tuple[str, CornerSet],
+                         right_data: Tuple[str, CornerSet],
+                         threshold: Optional[float] = 0.9,
+                         translation: Optional[Tuple[float, float]] = None,
+                         search_radius: Optional[float] = 20) -> Tuple[str, PairSet]:
+    """
+    Match described corners, see match_described_corners, the matches being loaded from the cache if possible.
+    The matches are stored as the index arrays and the ncc of the PairSet.
+
+    parameters:
+    -----------
+    cache: StageCache
+        The cache of the stages.
+    left_data: Tuple[str, CornerSet]
+        The key of the descriptors stage and the described corners of the left image.
+    right_data: Tuple[str, CornerSet]
+        The key of the descriptors stage and the described corners of the right image.
+    threshold: Optional[float]
+        The threshold ratio for the best match and the second-best match, default is 0.9.
+    translation: Optional[Tuple[float, float]]
+        A coarse x, y offset of the right image for the guided matching, default is None.
+    search_radius: Optional[float]
+        The radius in pixel of the guided matching, default is 20.
+
+    returns:
+    --------
+    Tuple[str, PairSet]
+        The key of the matches stage, and the pairs of matched corners.
+    """
+    left_key, left_corners = left_data
+    right_key, right_corners = right_data
+
+    def compute_matches() -> Dict[str, np.ndarray]:
+        pairs = match_described_corners(left_corners, right_corners, threshold=threshold,
+                                        translation=translation, search_radius=search_radius)
+        return {"left_index": pairs.index1, "right_index": pairs.index2, "ncc": pairs.ncc}
+
+    matches_key, matches = cache.get_or_compute(
+        "matches", [left_key, right_key],
+        dict(threshold=threshold, translation=None if translation is None else list(translation),
+             search_radius=search_radius),
+        compute_matches)
+
+    return matches_key, PairSet(left_corners, right_corners, matches["left_index"], matches["right_index"],
+                                matches["ncc"])
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+"""
+Content addressed on disk cache of the stages of the pipeline.
+An entry is keyed by the hash of the stage name, the code version of the stage, the parameters of the stage and the
+keys of its inputs. An input is either the content hash of some data, e.g. an image, or the key of the entry of an
+upstream stage, so a change anywhere upstream changes the key of every downstream stage.
+Entries are stored as a set of named arrays in an uncompressed .npz file, no python object is pickled.
+@Author: Neville Loh
+"""
+
+# Code version of every stage, to be bumped whenever a change in a stage changes its result
+STAGE_VERSIONS = {
+    "greyscale": 1,
+    "harris_response": 1,
+    "corners": 2,
+    "descriptors": 4,
+    "matches": 1,
+    "homography": 1,
+}
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(".", "cache", "stages")
+DEFAULT_CACHE_MAX_BYTES = 512 * 2 ** 20
+
+
+def hash_bytes(data: bytes) -> str:
+    """
+    Content hash of some bytes
+    Parameters
+    ----------
+    data: bytes
+        the data
+    Returns
+    -------
+    str
+        hex digest of the data
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_array(array: np.ndarray) -> str:
+    """
+    Content hash of an array, including its shape and dtype
+    Parameters
+    ----------
+    array: np.ndarray
+        the array
+    Returns
+    -------
+    str
+        hex digest of the array
+    """
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+def hash_file(path: str) -> str:
+    """
+    Content hash of a file, independent of its name
+    Parameters
+    ----------
+    path: str
+        path to the file
+    Returns
+    -------
+    str
+        hex digest of the content of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Class StageCache
+        On disk cache of the results of the stages of the pipeline, bounded in size with least recently used eviction.
+        The last access time of an entry is the modification time of its file, so the order survives across runs.
+    """
+    directory: Optional[str] = None
+    max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+
+    def __init__(self, directory: Optional[str] = DEFAULT_CACHE_DIRECTORY,
+                 max_bytes: Optional[int] = DEFAULT_CACHE_MAX_BYTES):
+        """Class Constructor
+        Parameters
+        ----------
+        directory: Optional[str]
+            directory of the entries, if None nothing is stored and every stage is computed
+        max_bytes: Optional[int]
+            maximum total size of the entries, the least recently used entries are evicted beyond it
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(stage: str, input_keys: List[str], params: Optional[dict] = None) -> str:
+        """
+        Compute the key of an entry
+        Parameters
+        ----------
+        stage: str
+            name of the stage, one of STAGE_VERSIONS
+        input_keys: List[str]
+            content hash or upstream key of every input of the stage
+        params: Optional[dict]
+            parameters of the stage, that must be json serializable
+        Returns
+        -------
+        str
+            the key
+        """
+        description = json.dumps({"stage": stage, "version": STAGE_VERSIONS[stage], "inputs": input_keys,
+                                  "params": params or {}}, sort_keys=True)
+        return hash_bytes(description.encode())
+
+    def get_path(self, stage: str, key: str) -> str:
+        return os.path.join(self.directory, f"{stage}-{key}.npz")
+
+    def get(self, stage: str, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Load an entry, and mark it as the most recently used
+        Parameters
+        ----------
+        stage: str
+            name of the stage
+        key: str
+            key of the entry
+        Returns
+        -------
+        Optional[Dict[str, np.ndarray]]
+            the arrays of the entry, None if there is no such entry
+        """
+        if self.directory is None:
+            return None
+        path = self.get_path(stage, key)
+        try:
+            # opened here rather than by np.load, which leaves the file open if the entry is truncated
+            with open(path, "rb") as file, np.load(file, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # missing, or not a complete entry, e.g. truncated by a full disk
+            return None
+        os.utime(path)
+        return arrays
+
+    def put(self, stage: str, key: str, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Store an entry, then evict the least recently used entries beyond max_bytes
+        Parameters
+        ----------
+        stage: str
+            name of the stage
+        key: str
+            key of the entry
+        arrays: Dict[str, np.ndarray]
+            the arrays of the entry
+        """
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path(stage, key)
+
+        # written under a temporary name first, so a concurrent or later reader never sees a partial entry
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used entries until the total size is at most max_bytes
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            self.evictions += 1
+
+    def get_or_compute(self, stage: str, input_keys: List[str], params: Optional[dict],
+                       compute: Callable[[], Dict[str, np.ndarray]]) -> Tuple[str, Dict[str, np.ndarray]]:
+        """
+        Load the entry of a stage, or compute and store it
+        Parameters
+        ----------
+        stage: str
+            name of the stage, one of STAGE_VERSIONS
+        input_keys: List[str]
+            content hash or upstream key of every input of the stage
+        params: Optional[dict]
+            parameters of the stage, that must be json serializable
+        compute: Callable[[], Dict[str, np.ndarray]]
+            compute the arrays of the entry on a miss
+        Returns
+        -------
+        Tuple[str, Dict[str, np.ndarray]]
+            the key of the entry, to be used as input key of the downstream stages, and its arrays
+        """
+        key = self.make_key(stage, input_keys, params)
+        arrays = self.get(stage, key)
+        if arrays is not None:
+            self.hits[stage] = self.hits.get(stage, 0) + 1
+            return key, arrays
+
+        self.misses[stage] = self.misses.get(stage, 0) + 1
+        arrays = compute()
+        self.put(stage, key, arrays)
+        return key, arrays
+
+    def get_or_compute_all(self, stage: str, keys: List[str],
+                           compute: Callable[[List[int]], List[Dict[str, np.ndarray]]]) \
+            -> List[Dict[str, np.ndarray]]:
+        """
+        Load the entries of a stage, and compute and store the missing ones with a single call, e.g. to compute them
+        in parallel
+        Parameters
+        ----------
+        stage: str
+            name of the stage, one of STAGE_VERSIONS
+        keys: List[str]
+            key of every entry, see make_key
+        compute: Callable[[List[int]], List[Dict[str, np.ndarray]]]
+            compute the arrays of the entries at the given positions of keys, in the same order
+        Returns
+        -------
+        List[Dict[str, np.ndarray]]
+            the arrays of every entry
+        """
+        entries = [self.get(stage, key) for key in keys]
+        missing = [i for i, arrays in enumerate(entries) if arrays is None]
+        if len(missing) < len(keys):
+            self.hits[stage] = self.hits.get(stage, 0) + len(keys) - len(missing)
+        if not missing:
+            return entries
+
+        self.misses[stage] = self.misses.get(stage, 0) + len(missing)
+        for i, arrays in zip(missing, compute(missing)):
+            self.put(stage, keys[i], arrays)
+            entries[i] = arrays
+        return entries
+
+    def report(self) -> None:
+        """
+        Print the hits and misses of every stage
+        """
+        for stage in STAGE_VERSIONS:
+            if stage in self.hits or stage in self.misses:
+                print('[INFO] cache %-16s hits: %3d  misses: %3d'
+                      % (stage, self.hits.get(stage, 0), self.misses.get(stage, 0)))
+        if self.evictions:
+            print('[INFO] cache evictions: %d' % self.evictions)
@@ -1,6 +1,8 @@
 import sys
 import argparse
 import os
+
+import numpy as np
 from matplotlib import pyplot
 
 import solem.distancedistributions
@@ -15,6 +17,7 @@ from image_stiching.homography.homography import fit_transform_homography
 from image_stiching.performance_evaulation.timer import measure_elapsed_time
 from image_stiching.stiching import stitch
 from image_stiching.util.save_object import save_object_at_location, load_object_at_location
+from image_stiching.util.stage_cache import StageCache, hash_file
 
 CHECKER_BOARD = "./images/cornerTest/checkerboard.png"
 MOUNTAIN_LEFT = "./images/panoramaStitching/tongariro_left_01.png"
@@ -49,7 +52,14 @@ def pixelArrayToSingleList(pixelArray):
 
 
 @measure_elapsed_time
-def filenameToSmoothedAndScaledpxArray(filename):
+def filenameToSmoothedAndScaledpxArray(filename, cache=None):
+    # load the greyscale image from the cache, keyed by the content of the file, as 8 bit intensities
+    if cache is not None:
+        _, arrays = cache.get_or_compute(
+            "greyscale", [hash_file(filename)], None,
+            lambda: {"px_array": np.asarray(filenameToSmoothedAndScaledpxArray(filename), dtype=np.uint8)})
+        return arrays["px_array"].tolist()
+
     (image_width, image_height, px_array_original) = IORW.readRGBImageAndConvertToGreyscalePixelArray(filename)
     px_array_smoothed = IPSmooth.computeGaussianAveraging3x3(px_array_original, image_width, image_height)
 
@@ -178,8 +188,9 @@ def main():
         args = vars(parser.parse_args())
 
         # Compute and plot Harris Corner with optional or default values
-        img = filenameToSmoothedAndScaledpxArray(args['input1'])
-        img2 = filenameToSmoothedAndScaledpxArray(args['input2'])
+        cache = StageCache()
+        img = filenameToSmoothedAndScaledpxArray(args['input1'], cache=cache)
+        img2 = filenameToSmoothedAndScaledpxArray(args['input2'], cache=cache)
         stitch(
             left_px_array=img,
             right_px_array=img2,
@@ -194,6 +205,7 @@ def main():
             plot_result=True,
             left_source_path=args['input1'],
             right_source_path=args['input2'],
+            cache=cache,
         )
 
 
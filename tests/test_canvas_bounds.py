@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from image_stiching.homography.homography import MAX_CANVAS_AREA_RATIO, compute_canvas_bounds
+from image_stiching.panorama.panorama import compute_panorama_bounds
+
+TRANSLATION = np.array([[1.0, 0.0, 150.0], [0.0, 1.0, -20.0], [0.0, 0.0, 1.0]])
+
+
+def test_translation_bounds():
+    # the right image origin is at x=-150, y=20 in the left image frame
+    shape, offset = compute_canvas_bounds(TRANSLATION, (100, 200), (100, 200))
+    assert shape == (120, 350)
+    assert offset == (0, 150)
+
+
+def test_sign_of_the_homography_does_not_matter():
+    assert compute_canvas_bounds(-TRANSLATION, (100, 200), (100, 200)) == \
+        compute_canvas_bounds(TRANSLATION, (100, 200), (100, 200))
+
+
+def test_image_behind_the_camera_is_cut_at_the_canvas_border():
+    # the line at infinity of the left image frame crosses the right image
+    homography = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.01, 0.0, -1.0]])
+    assert compute_canvas_bounds(homography, (100, 200), (100, 200)) == ((100, 200), (0, 0))
+
+
+def test_degenerate_homography_exceeds_the_canvas_cap():
+    # the right image is stretched a thousand times in the left image frame
+    homography = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1e3]])
+    with pytest.raises(ValueError, match="times the area of the images"):
+        compute_canvas_bounds(homography, (100, 200), (100, 200))
+
+    shape, _ = compute_canvas_bounds(homography, (100, 200), (100, 200), max_area_ratio=None)
+    assert shape[0] * shape[1] > MAX_CANVAS_AREA_RATIO * 2 * 100 * 200
+
+
+@pytest.mark.parametrize("homography", [
+    TRANSLATION,
+    -TRANSLATION,
+    np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.01, 0.0, -1.0]]),
+    np.array([[1.2, 0.05, -80.0], [0.02, 1.1, 10.0], [4e-4, -1e-4, 1.0]]),
+])
+def test_panorama_bounds_are_the_two_image_bounds(homography):
+    expected = compute_canvas_bounds(homography, (100, 200), (100, 200))
+    assert compute_panorama_bounds({0: np.eye(3), 1: homography}, {0: (100, 200), 1: (100, 200)}) == expected
+
+
+def test_panorama_bounds_exceeding_the_canvas_cap():
+    homographies = {0: np.eye(3), 1: TRANSLATION, 2: np.diag([1.0, 1.0, 1e3])}
+    shapes = {0: (100, 200), 1: (100, 200), 2: (100, 200)}
+    with pytest.raises(ValueError, match="times the area of the images"):
+        compute_panorama_bounds(homographies, shapes)
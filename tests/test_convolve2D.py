@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import imageProcessing.convolve2D as IPConv2D
+import imageProcessing.pixelops as IPPixelOps
+import imageProcessing.smoothing as IPSmooth
+from image_stiching.harris_conrner_detection.harris_util import get_gaussian_kernel
+
+KERNELS = [
+    ([1.0], []),
+    ([0.27901, 0.44198, 0.27901], []),
+    ([-1, 0, 1], [1, 2, 1]),
+    (get_gaussian_kernel(5, sigma=1), []),
+    (get_gaussian_kernel(7, sigma=1), []),
+    (get_gaussian_kernel(15, sigma=2), get_gaussian_kernel(9, sigma=1.5)),
+]
+
+
+def random_image(height, width, dtype, seed=0):
+    return (np.random.default_rng(seed).random((height, width)) * 255).astype(dtype)
+
+
+def reference(pixels, kernel_x, kernel_y):
+    height, width = pixels.shape
+    return np.array(IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroReference(
+        pixels.tolist(), width, height, kernel_x, kernel_y))
+
+
+@pytest.mark.parametrize("kernel_x, kernel_y", KERNELS)
+def test_float64_is_identical_to_reference(kernel_x, kernel_y):
+    pixels = random_image(23, 31, np.float64)
+    result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixels, kernel_x, kernel_y)
+
+    assert result.dtype == np.float64
+    assert np.array_equal(result, reference(pixels, kernel_x, kernel_y))
+
+
+@pytest.mark.parametrize("kernel_x, kernel_y", KERNELS)
+def test_float32_keeps_dtype_and_matches_reference(kernel_x, kernel_y):
+    pixels = random_image(23, 31, np.float32)
+    result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixels, kernel_x, kernel_y)
+
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, reference(pixels, kernel_x, kernel_y), rtol=1e-5, atol=1e-3)
+
+
+@pytest.mark.parametrize("height, width", [(1, 1), (2, 9), (9, 2), (6, 6)])
+def test_image_smaller_than_kernel_has_zero_border(height, width):
+    pixels = random_image(height, width, np.float64)
+    kernel = get_gaussian_kernel(7, sigma=1)
+    result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixels, kernel)
+
+    assert result.shape == (height, width)
+    assert np.array_equal(result, reference(pixels, kernel, []))
+
+
+def test_integer_lists_are_computed_in_float64():
+    pixels = random_image(12, 10, np.uint8)
+    kernel = [0.27901, 0.44198, 0.27901]
+    result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZeroNdArray(pixels.tolist(), kernel)
+
+    assert result.dtype == np.float64
+    assert np.array_equal(result, reference(pixels, kernel, []))
+
+
+def test_engines_return_types():
+    pixels = random_image(8, 9, np.float64).tolist()
+    kernel = [0.27901, 0.44198, 0.27901]
+
+    numpy_result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZero(pixels, 9, 8, kernel,
+                                                                            engine=IPConv2D.ENGINE_NUMPY)
+    python_result = IPConv2D.computeSeparableConvolution2DOddNTapBorderZero(pixels, 9, 8, kernel,
+                                                                             engine=IPConv2D.ENGINE_PYTHON)
+    assert isinstance(numpy_result, np.ndarray)
+    assert isinstance(python_result, list)
+    assert np.array_equal(numpy_result, np.array(python_result))
+
+    with pytest.raises(ValueError):
+        IPConv2D.computeSeparableConvolution2DOddNTapBorderZero(pixels, 9, 8, kernel, engine="fortran")
+
+
+def test_smoothing_and_scaling_callers_agree_across_engines():
+    # the callers read the result by [y][x] only, so an ndarray result must give the same 8 bit image
+    pixels = random_image(17, 21, np.uint8).tolist()
+    results = []
+    for engine in IPConv2D.CONVOLUTION_ENGINES:
+        previous_engine = IPConv2D.default_engine
+        IPConv2D.setDefaultConvolutionEngine(engine)
+        try:
+            smoothed = IPSmooth.computeGaussianAveraging3x3(pixels, 21, 17)
+            results.append(IPPixelOps.scaleTo0And255AndQuantize(smoothed, 21, 17))
+        finally:
+            IPConv2D.setDefaultConvolutionEngine(previous_engine)
+
+    assert results[0] == results[1]
@@ -0,0 +1,120 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from image_stiching.corner import (CORNER_DTYPE, Corner, CornerSet, get_all_corner_from_response, get_corner_points,
+                                   get_n_strongest_corner_from_response)
+
+
+@pytest.fixture
+def corners():
+    rng = np.random.default_rng(0)
+    return CornerSet(rng.integers(0, 100, 12), rng.integers(0, 80, 12), rng.random(12),
+                     rng.random((12, 9)).astype(np.float32), (3, 3))
+
+
+def as_tuples(corners):
+    return [(corner.x, corner.y, corner.corner_response) for corner in corners]
+
+
+def test_integer_index_returns_the_same_corner(corners):
+    for i in (0, 5, 11, -1, np.int64(3)):
+        corner = corners[i]
+        assert isinstance(corner, Corner)
+        assert (corner.x, corner.y, corner.corner_response) == (corners.x[i], corners.y[i], corners.corner_response[i])
+        assert type(corner.x) is int and type(corner.y) is int and type(corner.corner_response) is float
+        assert np.array_equal(corner.feature_descriptor, corners.feature_descriptors[i].reshape(3, 3))
+        assert corners[i] is corner
+
+    with pytest.raises(IndexError):
+        corners[12]
+
+
+@pytest.mark.parametrize("index", [slice(2, 9), slice(None, None, -2), slice(20, 30), np.array([4, 1, 4]),
+                                   np.arange(12) % 3 == 0])
+def test_slices_index_arrays_and_masks_return_a_corner_set(corners, index):
+    subset = corners[index]
+    expected = np.arange(12)[index]
+
+    assert isinstance(subset, CornerSet)
+    assert len(subset) == len(expected)
+    assert np.array_equal(subset.x, corners.x[expected])
+    assert np.array_equal(subset.y, corners.y[expected])
+    assert np.array_equal(subset.corner_response, corners.corner_response[expected])
+    assert np.array_equal(subset.feature_descriptors, corners.feature_descriptors[expected])
+    # an empty set keeps the length of the descriptors
+    assert subset.feature_descriptors.shape == (len(expected), 9)
+    assert subset.descriptor_shape == (3, 3)
+    assert as_tuples(subset) == [as_tuples(corners)[i] for i in expected]
+
+
+def test_len_and_iteration(corners):
+    assert len(corners) == 12
+    assert len(list(corners)) == 12
+    assert len(CornerSet(np.zeros(0), np.zeros(0), np.zeros(0))) == 0
+    assert len(corners[corners.corner_response > 2]) == 0
+    with pytest.raises(ValueError):
+        CornerSet(np.zeros(3), np.zeros(3), np.zeros(2))
+
+
+def test_round_trip_through_corners(corners):
+    # a list of Corner, as built before CornerSet, and back
+    corner_list = [Corner((corner.y, corner.x), corner.corner_response) for corner in corners]
+    for corner, descriptor in zip(corner_list, corners.feature_descriptors):
+        corner.feature_descriptor = descriptor.reshape(3, 3)
+
+    rebuilt = CornerSet.from_corners(corner_list)
+    assert as_tuples(rebuilt) == as_tuples(corner_list) == as_tuples(corners)
+    assert np.array_equal(rebuilt.feature_descriptors, corners.feature_descriptors)
+    assert rebuilt.descriptor_shape == (3, 3)
+    assert CornerSet.from_corners(corners) is corners
+
+    # without a descriptor on every corner, none are kept
+    corner_list[3].feature_descriptor = None
+    assert CornerSet.from_corners(corner_list).feature_descriptors is None
+
+
+def test_round_trip_through_records(corners):
+    records = corners.to_records()
+    assert records.dtype == CORNER_DTYPE
+    rebuilt = CornerSet.from_records(records, corners.feature_descriptors, corners.descriptor_shape)
+    assert as_tuples(rebuilt) == as_tuples(corners)
+    assert np.array_equal(rebuilt.feature_descriptors, corners.feature_descriptors)
+
+
+def test_pickled_corner_set_is_identical(corners):
+    corners[2]
+    unpickled = pickle.loads(pickle.dumps(corners))
+    assert as_tuples(unpickled) == as_tuples(corners)
+    assert np.array_equal(unpickled.feature_descriptors, corners.feature_descriptors)
+
+
+def test_strongest_corners_are_the_heap_order():
+    # a response with ties and suppressed pixels
+    response = np.random.default_rng(1).integers(0, 6, size=(15, 20)).astype(np.float64)
+    heap = get_all_corner_from_response(response)
+    expected = [corner for corner in sorted(heap) if corner.corner_response != 0][:40]
+
+    corners = CornerSet.from_records(get_n_strongest_corner_from_response(response, 40))
+    assert [corner.corner_response for corner in corners] == [corner.corner_response for corner in expected]
+    assert all(response[corner.y, corner.x] == corner.corner_response for corner in corners)
+    # ties are in raster order
+    assert np.all(np.diff(corners.corner_response) <= 0)
+    for value in np.unique(corners.corner_response):
+        same = corners[corners.corner_response == value]
+        assert np.all(np.diff(same.y * 20 + same.x) > 0)
+
+
+def test_sort_by_response_is_stable():
+    corners = CornerSet(np.arange(5), np.zeros(5), [1.0, 3.0, 1.0, 2.0, 3.0])
+    assert np.array_equal(corners.sort_by_response().x, [1, 4, 3, 0, 2])
+
+
+def test_corner_points_from_a_set_and_a_list(corners):
+    points = get_corner_points(corners)
+    assert points.shape == (12, 2) and points.dtype == np.float64
+    assert np.array_equal(points, np.stack([corners.x, corners.y], axis=1))
+    assert np.array_equal(get_corner_points(list(corners)), points)
+    assert get_corner_points([]).shape == (0, 2)
+    assert get_corner_points(corners[:0]).shape == (0, 2)
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import (compute_dense_ncc, compute_feature_descriptor,
+                                                                   refine_corner_locations, smooth_feature_image)
+
+PATCH_SIZE = 15
+SEARCH_RADIUS = 20
+
+
+@pytest.fixture(scope="module")
+def image():
+    # (height 100, width 120) texture, every window has a single sharp ncc peak
+    return np.random.default_rng(0).random((100, 120)) * 255
+
+
+def describe(image, points):
+    points = np.asarray(points)
+    corners = compute_feature_descriptor(CornerSet(points[:, 0], points[:, 1], np.ones(len(points))), image,
+                                         PATCH_SIZE)
+    assert len(corners) == len(points)
+    return corners
+
+
+def bruteforce_search(image, corners, predicted_points):
+    # best window of the whole image ncc surface within the search range of every prediction
+    smoothed = smooth_feature_image(image)
+    half = PATCH_SIZE // 2
+    best_points, best_ncc = [], []
+    for descriptor, (x, y) in zip(corners.feature_descriptors, np.round(predicted_points).astype(int)):
+        surface = compute_dense_ncc(descriptor.reshape(PATCH_SIZE, PATCH_SIZE), smoothed)
+        ys, xs = np.meshgrid(np.arange(surface.shape[0]) + half, np.arange(surface.shape[1]) + half, indexing="ij")
+        surface[(np.abs(xs - x) > SEARCH_RADIUS) | (np.abs(ys - y) > SEARCH_RADIUS)] = -np.inf
+        peak_y, peak_x = np.unravel_index(np.argmax(surface), surface.shape)
+        best_points.append((peak_x + half, peak_y + half))
+        best_ncc.append(surface[peak_y, peak_x])
+    return np.array(best_points), np.array(best_ncc)
+
+
+# true location and predicted location, beyond every border of the image and at the largest predicted distance
+BORDER_CASES = {
+    "left": ([7, 40], [-13, 40]),
+    "left_within_radius": ([7, 40], [-10, 40]),
+    "right": ([112, 60], [130, 60]),
+    "top": ([60, 7], [60, -13]),
+    "bottom": ([50, 92], [50, 110]),
+    "top_left": ([7, 7], [-12, -12]),
+    "bottom_right": ([112, 92], [127, 105]),
+}
+
+
+@pytest.mark.parametrize("case", BORDER_CASES)
+def test_finds_the_true_location_from_a_prediction_beyond_the_border(image, case):
+    true_point, predicted_point = BORDER_CASES[case]
+    points, ncc = refine_corner_locations(describe(image, [true_point]), image, np.array([predicted_point]),
+                                          SEARCH_RADIUS)
+
+    np.testing.assert_allclose(points[0], true_point, atol=0.5)
+    assert ncc[0] > 0.99
+
+
+def test_identical_to_bruteforce_search_near_every_border(image):
+    rng = np.random.default_rng(1)
+    # corners along the borders with predictions up to the search radius away, inside and outside the image
+    true_points = np.stack([rng.integers(7, 113, size=200), rng.integers(7, 93, size=200)], axis=1)
+    true_points[:100, 0] = np.where(np.arange(100) % 2, rng.integers(7, 22, size=100), rng.integers(98, 113, size=100))
+    true_points[100:, 1] = np.where(np.arange(100) % 2, rng.integers(7, 22, size=100), rng.integers(78, 93, size=100))
+    predicted_points = true_points + rng.integers(-SEARCH_RADIUS, SEARCH_RADIUS + 1, size=(200, 2))
+    corners = describe(image, true_points)
+
+    points, ncc = refine_corner_locations(corners, image, predicted_points, SEARCH_RADIUS, block_size=37)
+    expected_points, expected_ncc = bruteforce_search(image, corners, predicted_points)
+
+    assert np.all(np.abs(points - expected_points) <= 0.5)
+    assert np.all(ncc >= expected_ncc - 1e-9)
+    assert np.all(predicted_points.min(axis=0) < 0) and np.all(predicted_points.max(axis=0) >= [120, 100])
+
+
+def test_prediction_without_any_window_inside_the_image(image):
+    corners = describe(image, [[60, 50], [60, 50]])
+    points, ncc = refine_corner_locations(corners, image, np.array([[60, -19], [np.nan, 50]]), SEARCH_RADIUS)
+
+    assert np.all(np.isnan(points))
+    assert np.all(ncc == -np.inf)
+
+
+def test_image_smaller_than_the_search_region(image):
+    small = image[:30, :25]
+    points, ncc = refine_corner_locations(describe(small, [[12, 20]]), small, np.array([[5, 5]]), SEARCH_RADIUS)
+
+    np.testing.assert_allclose(points[0], [12, 20], atol=0.5)
+    assert ncc[0] > 0.99
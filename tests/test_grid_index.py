@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from image_stiching.feature_descriptor.grid_index import GridIndex
+
+CELL_SIZE = 10
+
+
+def bruteforce_within(points, centre, radius):
+    distance = np.hypot(points[:, 0] - centre[0], points[:, 1] - centre[1])
+    return np.flatnonzero(distance <= radius)
+
+
+def border_points():
+    # every point of a lattice on the cell borders and half way between them, some of them negative
+    xs, ys = np.meshgrid(np.arange(-20, 41, 5), np.arange(-10, 31, 5))
+    return np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float64)
+
+
+def assert_same_as_bruteforce(grid, points, centres, radius):
+    candidates = grid.candidates_within(centres, radius)
+    assert candidates.shape[0] == len(centres)
+    for centre, row in zip(centres, candidates):
+        expected = bruteforce_within(points, centre, radius)
+        assert np.array_equal(row[row < len(points)], expected)
+        # the padding is after the points within the radius
+        assert np.all(row[len(expected):] == len(points))
+        assert np.array_equal(grid.query(centre, radius), expected)
+
+
+@pytest.mark.parametrize("radius", [CELL_SIZE, 5, 7.5, 14.2, 25])
+def test_points_on_the_cell_borders_are_found_as_bruteforce(radius):
+    points = border_points()
+    grid = GridIndex(points, cell_size=CELL_SIZE)
+    # centres on the cell borders and corners, and between them, at exactly radius from some of the points
+    centres = np.concatenate([border_points(), border_points() + 2.5, [[0, 0], [10, 10], [-0.0, 9.999999]]])
+    assert_same_as_bruteforce(grid, points, centres, radius)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_points_are_found_as_bruteforce(seed):
+    rng = np.random.default_rng(seed)
+    points = rng.random((300, 2)) * 200 - 50
+    # integer points land on the cell borders
+    points[::3] = np.round(points[::3] / CELL_SIZE) * CELL_SIZE
+    grid = GridIndex(points, cell_size=CELL_SIZE)
+    centres = rng.random((100, 2)) * 260 - 80
+    assert_same_as_bruteforce(grid, points, centres, radius=CELL_SIZE * rng.uniform(0.5, 2))
+
+
+def test_lone_candidate():
+    points = np.array([[0, 0], [30, 30], [60, 0]], dtype=np.float64)
+    grid = GridIndex(points, cell_size=CELL_SIZE)
+
+    candidates = grid.candidates_within(np.array([[30, 40], [100, 100]]), CELL_SIZE)
+    assert candidates.shape == (2, 1)
+    assert np.array_equal(candidates[:, 0], [1, len(points)])
+    assert np.array_equal(grid.query((30, 40), CELL_SIZE), [1])
+    assert len(grid.query((30, 40.001), CELL_SIZE)) == 0
+
+
+def test_duplicate_points_are_all_candidates():
+    points = np.array([[5, 5], [5, 5], [10, 10], [5, 5]], dtype=np.float64)
+    grid = GridIndex(points, cell_size=CELL_SIZE)
+    assert np.array_equal(grid.query((5, 5), 1), [0, 1, 3])
+
+
+def test_centres_that_are_not_finite_have_no_candidate():
+    points = border_points()
+    grid = GridIndex(points, cell_size=CELL_SIZE)
+    candidates = grid.candidates_within(np.array([[np.nan, 0], [0, np.inf], [0, 0]]), CELL_SIZE)
+    assert np.all(candidates[:2] == len(points))
+    assert np.array_equal(candidates[2][candidates[2] < len(points)], bruteforce_within(points, (0, 0), CELL_SIZE))
+
+
+def test_empty_index():
+    grid = GridIndex(np.zeros((0, 2)), cell_size=CELL_SIZE)
+    assert grid.candidates_within(np.array([[0, 0], [5, 5]]), CELL_SIZE).shape == (2, 0)
+    assert len(grid.query((0, 0), CELL_SIZE)) == 0
+
+
+def test_cell_size_must_be_positive():
+    with pytest.raises(ValueError):
+        GridIndex(np.zeros((1, 2)), cell_size=0)
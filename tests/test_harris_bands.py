@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+from image_stiching.harris_conrner_detection.harris import (compute_harris_corner, compute_harris_response,
+                                                            compute_harris_response_in_bands, get_harris_halo)
+
+IMAGE = "./images/panoramaStitching/tongariro_left_01.png"
+
+
+@pytest.fixture(scope="module")
+def px_array():
+    _, _, px_array = IORW.readRGBImageAndConvertToGreyscalePixelArray(IMAGE)
+    # 157 rows, not a multiple of any of the band counts
+    return np.asarray(px_array, dtype=np.float64)[200:357, 300:500]
+
+
+@pytest.mark.parametrize("gaussian_window_size", [3, 5, 7])
+@pytest.mark.parametrize("n_bands", [2, 3, 4, 7, 16])
+def test_bands_are_identical_to_a_single_pass(px_array, gaussian_window_size, n_bands):
+    expected = compute_harris_response(px_array, 0.04, gaussian_window_size)
+    result = compute_harris_response_in_bands(px_array, 0.04, gaussian_window_size, n_bands=n_bands, n_workers=2)
+
+    assert px_array.shape[0] % n_bands != 0
+    assert result.shape == expected.shape
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("n_bands", [40, 52, 157, 400])
+def test_bands_shorter_than_the_halo_are_identical_to_a_single_pass(px_array, n_bands):
+    # bands of 1 to 4 rows against a halo of 5 rows, more bands than rows gives bands of one row
+    assert px_array.shape[0] // n_bands < get_harris_halo(7)
+    expected = compute_harris_response(px_array, 0.04, 7)
+    result = compute_harris_response_in_bands(px_array, 0.04, 7, n_bands=n_bands)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_image_shorter_than_the_halo(px_array):
+    small = px_array[:4]
+    expected = compute_harris_response(small, 0.04, 7)
+    np.testing.assert_array_equal(compute_harris_response_in_bands(small, 0.04, 7, n_bands=3), expected)
+
+
+def test_corners_from_bands_are_identical_to_a_single_pass(px_array):
+    expected = compute_harris_corner(px_array, n_corner=200, alpha=0.04, gaussian_window_size=7)
+    result = compute_harris_corner(px_array, n_corner=200, alpha=0.04, gaussian_window_size=7, n_bands=5)
+
+    assert np.array_equal(result.x, expected.x)
+    assert np.array_equal(result.y, expected.y)
+    assert np.array_equal(result.corner_response, expected.corner_response)
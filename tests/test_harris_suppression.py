@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+from image_stiching.harris_conrner_detection.harris import (SUPPRESSION_BRUTEFORCE, SUPPRESSION_MAX_FILTER,
+                                                            bruteforce_non_max_suppression, compute_harris_response,
+                                                            non_max_suppression, select_corners_from_response)
+
+IMAGE = "./images/panoramaStitching/tongariro_left_01.png"
+
+
+@pytest.fixture(scope="module")
+def real_response():
+    _, _, px_array = IORW.readRGBImageAndConvertToGreyscalePixelArray(IMAGE)
+    return compute_harris_response(np.asarray(px_array)[200:400, 300:550], alpha=0.04, gaussian_window_size=7)
+
+
+@pytest.mark.parametrize("window_size", [3, 5, 7])
+def test_identical_to_bruteforce_on_real_response(real_response, window_size):
+    expected = bruteforce_non_max_suppression(real_response.copy(), window_size=window_size)
+    assert np.array_equal(non_max_suppression(real_response, window_size=window_size), expected)
+
+
+def test_selected_corners_identical_to_bruteforce(real_response):
+    expected = select_corners_from_response(real_response, 200, suppression_mode=SUPPRESSION_BRUTEFORCE)
+    result = select_corners_from_response(real_response, 200, suppression_mode=SUPPRESSION_MAX_FILTER)
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("window_size", [3, 5])
+def test_identical_to_bruteforce_with_ties_and_negative_values(seed, window_size):
+    # small integer responses have plateaus, and negative values interact with the suppressed zeros
+    rng = np.random.default_rng(seed)
+    response = rng.integers(-3, 4, size=rng.integers(window_size, 16, size=2)).astype(np.float64)
+    expected = bruteforce_non_max_suppression(response.copy(), window_size=window_size)
+    assert np.array_equal(non_max_suppression(response, window_size=window_size), expected)
+
+
+@pytest.mark.parametrize("sign", [1, -1])
+def test_identical_to_bruteforce_on_ramps(sign):
+    # long chains of pixels that depend on the suppression of the previous one
+    response = sign * np.add.outer(np.arange(12), -np.arange(15)).astype(np.float64)
+    expected = bruteforce_non_max_suppression(response.copy())
+    assert np.array_equal(non_max_suppression(response), expected)
+
+
+def test_input_is_not_modified(real_response):
+    response = real_response.copy()
+    non_max_suppression(response)
+    assert np.array_equal(response, real_response)
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+import imageProcessing.integralimage as IPIntegral
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import compute_feature_descriptor, smooth_feature_image
+
+# (height, width) of the rectangles, from a single pixel to the whole image
+RECTANGLES = [(1, 1), (1, 7), (5, 1), (3, 3), (15, 15), (4, 9), (23, 31)]
+
+
+def random_image(height=23, width=31, seed=0):
+    # a large mean over a small spread, like a bright and faintly textured image
+    return 200 + np.random.default_rng(seed).random((height, width)) * 10
+
+
+def direct_statistics(pixels, top, left, height, width):
+    window = pixels[top:top + height, left:left + width]
+    return window.mean(), np.sum((window - window.mean()) ** 2)
+
+
+def edge_rectangles(image_height, image_width, height, width):
+    # every rectangle touching a border of the image, and one inside
+    bottom, right = image_height - height, image_width - width
+    return sorted({(0, 0), (0, right), (bottom, 0), (bottom, right), (0, right // 2), (bottom, right // 2),
+                   (bottom // 2, 0), (bottom // 2, right), (bottom // 2, right // 2)})
+
+
+@pytest.mark.parametrize("height, width", RECTANGLES)
+def test_rectangle_statistics_match_direct_statistics_at_the_edges(height, width):
+    pixels = random_image()
+    integral_images = IPIntegral.computeIntegralImages(pixels)
+
+    for top, left in edge_rectangles(*pixels.shape, height, width):
+        mean, energy = IPIntegral.computeRectangleMeanAndEnergy(integral_images, top, left, height, width)
+        expected_mean, expected_energy = direct_statistics(pixels, top, left, height, width)
+        np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+        np.testing.assert_allclose(energy, expected_energy, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("height, width", RECTANGLES)
+def test_all_rectangle_statistics_match_direct_statistics(height, width):
+    pixels = random_image()
+    mean, energy = IPIntegral.computeAllRectangleMeanAndEnergy(IPIntegral.computeIntegralImages(pixels), height,
+                                                               width)
+    windows = sliding_window_view(pixels, (height, width))
+    expected_mean = windows.mean(axis=(-2, -1))
+    expected_energy = np.sum((windows - expected_mean[..., None, None]) ** 2, axis=(-2, -1))
+
+    assert mean.shape == expected_mean.shape
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+    np.testing.assert_allclose(energy, expected_energy, rtol=1e-9, atol=1e-9)
+
+
+def test_stack_statistics_match_every_image():
+    stack = np.stack([random_image(seed=seed) for seed in range(3)])
+    mean, energy = IPIntegral.computeAllRectangleMeanAndEnergy(IPIntegral.computeIntegralImages(stack), 5, 4)
+    for i, pixels in enumerate(stack):
+        expected = IPIntegral.computeAllRectangleMeanAndEnergy(IPIntegral.computeIntegralImages(pixels), 5, 4)
+        np.testing.assert_allclose(mean[i], expected[0], rtol=1e-12)
+        np.testing.assert_allclose(energy[i], expected[1], rtol=1e-9, atol=1e-9)
+
+
+def test_flat_rectangles_have_zero_energy():
+    pixels = random_image()
+    pixels[:, :12] = 1000.3
+    mean, energy = IPIntegral.computeAllRectangleMeanAndEnergy(IPIntegral.computeIntegralImages(pixels), 5, 5)
+    assert np.all(energy[:, :8] == 0)
+    assert np.all(energy[:, 12:] > 0)
+    np.testing.assert_allclose(mean[:, :8], 1000.3, rtol=1e-12)
+
+
+@pytest.mark.parametrize("flat_value", [0.0, 0.1, 1000.3])
+def test_descriptors_from_tables_match_direct_descriptors(flat_value):
+    # a flat half, whose patches must be flat on both paths, and a textured half
+    image = random_image(40, 60)
+    image[:, :30] = flat_value
+    patch_size = 7
+    ys, xs = np.meshgrid(np.arange(3, 37), np.arange(3, 57), indexing="ij")
+    corners = CornerSet(xs.ravel(), ys.ravel(), np.ones(xs.size))
+
+    direct = compute_feature_descriptor(corners[:10], image, patch_size, dtype=np.float64)
+    tables = compute_feature_descriptor(corners[:10], image, patch_size, dtype=np.float64,
+                                        integral_images=IPIntegral.computeIntegralImages(smooth_feature_image(image)))
+    np.testing.assert_allclose(tables.feature_descriptors, direct.feature_descriptors, atol=1e-9)
+
+    # all the corners, enough to cover the image INTEGRAL_IMAGE_MIN_COVERAGE times, take the table path
+    direct = np.concatenate([compute_feature_descriptor(corners[i:i + 10], image, patch_size,
+                                                        dtype=np.float64).feature_descriptors
+                             for i in range(0, len(corners), 10)])
+    tables = compute_feature_descriptor(corners, image, patch_size, dtype=np.float64).feature_descriptors
+    np.testing.assert_allclose(tables, direct, atol=1e-9)
+    assert np.array_equal(np.all(tables == 0, axis=1), np.all(direct == 0, axis=1))
+    assert np.any(np.all(tables == 0, axis=1))
+
+
+@pytest.mark.parametrize("spike", [1e-3, 3e-3, 1e-2, 1.0])
+def test_faint_patch_is_flat_on_both_paths_or_on_neither(spike):
+    # a bright flat image with a single faint spike, the patches around it have an energy close to the tolerance,
+    # with a spike of 3e-3 it is between the tolerances the two paths used to have
+    image = np.full((30, 30), 1000.0)
+    image[15, 15] += spike
+    corners = CornerSet(np.array([15, 16, 20]), np.array([15, 14, 20]), np.ones(3))
+    patch_size = 7
+
+    direct = compute_feature_descriptor(corners, image, patch_size, dtype=np.float64).feature_descriptors
+    tables = compute_feature_descriptor(corners, image, patch_size, dtype=np.float64,
+                                        integral_images=IPIntegral.computeIntegralImages(
+                                            smooth_feature_image(image))).feature_descriptors
+    assert np.array_equal(np.all(tables == 0, axis=1), np.all(direct == 0, axis=1))
+    # the energy from the tables is accurate relative to the energy of the image, dominated by the zero border
+    np.testing.assert_allclose(tables, direct, rtol=1e-3, atol=1e-6)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from image_stiching.corner import CornerSet
+from image_stiching.feature_descriptor.feature_descriptor import (LONE_CANDIDATE_MIN_NCC, compare_all_ncc,
+                                                                   compare_all_ncc_batched, compare_ncc_within_radius)
+
+
+def make_corners(n, seed, values=(-1.0, -0.5, 0.0, 0.5, 1.0)):
+    # descriptors of a few dyadic values, their products are exact in any summation order and many scores are tied
+    rng = np.random.default_rng(seed)
+    descriptors = rng.choice(values, size=(n, 9))
+    points = rng.integers(0, 500, size=(n, 2))
+    return CornerSet(points[:, 0], points[:, 1], rng.random(n), descriptors, (3, 3))
+
+
+def pair_tuples(pairs):
+    return [(p.corner1.x, p.corner1.y, p.corner2.x, p.corner2.y, p.ncc) for p in pairs]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.95, 1.0])
+def test_batched_pairs_are_identical_to_bruteforce(seed, threshold):
+    corners1, corners2 = make_corners(40, seed), make_corners(30, seed + 100)
+    expected = compare_all_ncc(corners1, corners2, threshold)
+    result = compare_all_ncc_batched(corners1, corners2, threshold, block_size=7)
+
+    assert pair_tuples(result) == pair_tuples(expected)
+    # the threshold rejects some of the matches
+    assert len(result) < len(corners1) or threshold == 1.0
+
+
+def test_tied_best_match_is_the_first_corner():
+    # every corner of the second image has the same descriptor, the ratio is 1
+    corners1 = make_corners(5, 0)
+    corners2 = CornerSet(np.arange(4), np.zeros(4), np.ones(4), np.tile(corners1.feature_descriptors[0], (4, 1)),
+                         (3, 3))
+    expected = compare_all_ncc(corners1, corners2, 1.0)
+    result = compare_all_ncc_batched(corners1, corners2, 1.0)
+
+    assert pair_tuples(result) == pair_tuples(expected)
+    assert all(pair.corner2.x == 0 for pair in result)
+    assert len(compare_all_ncc_batched(corners1, corners2, 0.99)) == len(compare_all_ncc(corners1, corners2, 0.99)) == 0
+
+
+def descriptor_with_ncc(descriptor, ncc, seed=0):
+    # unit descriptor at the given ncc (dot product) with a unit descriptor
+    orthogonal = np.random.default_rng(seed).standard_normal(descriptor.shape)
+    orthogonal -= orthogonal.dot(descriptor) * descriptor
+    orthogonal /= np.linalg.norm(orthogonal)
+    return ncc * descriptor + np.sqrt(1 - ncc ** 2) * orthogonal
+
+
+@pytest.mark.parametrize("ncc, is_matched", [(0.3, False), (LONE_CANDIDATE_MIN_NCC - 0.01, False),
+                                             (LONE_CANDIDATE_MIN_NCC + 0.01, True), (0.99, True)])
+def test_lone_candidate_needs_the_minimum_ncc(ncc, is_matched):
+    descriptor = np.random.default_rng(1).standard_normal(9)
+    descriptor /= np.linalg.norm(descriptor)
+    corners1 = CornerSet(np.array([50]), np.array([50]), np.ones(1), descriptor[None], (3, 3))
+    # the only corner within the radius of the prediction, the others are far away
+    corners2 = CornerSet(np.array([52, 200, 0]), np.array([49, 200, 300]), np.ones(3),
+                         np.stack([descriptor_with_ncc(descriptor, ncc), descriptor, descriptor]), (3, 3))
+
+    pairs = compare_ncc_within_radius(corners1, corners2, np.array([[50.0, 50.0]]), search_radius=10, threshold=0.9)
+    assert len(pairs) == int(is_matched)
+    if is_matched:
+        assert (pairs[0].corner2.x, pairs[0].corner2.y) == (52, 49)
+        np.testing.assert_allclose(pairs[0].ncc, ncc, rtol=1e-5)
+
+    # without a minimum any positive ncc of a lone candidate is matched
+    assert len(compare_ncc_within_radius(corners1, corners2, np.array([[50.0, 50.0]]), search_radius=10,
+                                         threshold=0.9, lone_candidate_min_ncc=0)) == 1
+
+
+def test_ratio_test_among_several_candidates_ignores_the_minimum():
+    descriptor = np.random.default_rng(2).standard_normal(9)
+    descriptor /= np.linalg.norm(descriptor)
+    corners1 = CornerSet(np.array([50]), np.array([50]), np.ones(1), descriptor[None], (3, 3))
+    corners2 = CornerSet(np.array([52, 45]), np.array([49, 55]), np.ones(2),
+                         np.stack([descriptor_with_ncc(descriptor, 0.5, seed=3),
+                                   descriptor_with_ncc(descriptor, 0.1, seed=4)]), (3, 3))
+
+    pairs = compare_ncc_within_radius(corners1, corners2, np.array([[50.0, 50.0]]), search_radius=10, threshold=0.9)
+    assert len(pairs) == 1
+    assert pairs[0].corner2.x == 52
@@ -0,0 +1,119 @@
+import math
+import pickle
+
+import numpy as np
+import pytest
+
+from image_stiching.corner import Corner, CornerSet
+from image_stiching.pair import Pair, PairSet, get_pair_points
+
+
+@pytest.fixture
+def pairs():
+    rng = np.random.default_rng(0)
+    corners1 = CornerSet(rng.integers(0, 50, 20), rng.integers(0, 50, 20), rng.random(20))
+    corners2 = CornerSet(rng.integers(0, 50, 15), rng.integers(0, 50, 15), rng.random(15))
+    # the first pairs have the same x, so a zero gradient denominator without offset
+    corners2.x[:3] = corners1.x[:3]
+    return PairSet(corners1, corners2, np.arange(10), [0, 1, 2, 5, 3, 14, 7, 7, 9, 0], rng.random(10))
+
+
+def eager_values(corner1, corner2):
+    # gradient and distance as Pair used to compute them in its constructor
+    try:
+        gradient = (corner1.y - corner2.y) / (corner1.x - corner2.x + 0)
+    except ZeroDivisionError:
+        gradient = (corner1.y - corner2.y) / 1
+    distance = math.sqrt((corner1.x - corner2.x) ** 2 + (corner1.y - corner2.y) ** 2)
+    return gradient, distance
+
+
+def as_tuples(pairs):
+    return [(p.corner1.x, p.corner1.y, p.corner2.x, p.corner2.y, p.ncc) for p in pairs]
+
+
+def test_integer_index_returns_the_same_pair(pairs):
+    for i in (0, 4, 9, -1, np.int64(7)):
+        pair = pairs[i]
+        assert isinstance(pair, Pair)
+        assert pair.corner1 is pairs.corners1[pairs.index1[i]]
+        assert pair.corner2 is pairs.corners2[pairs.index2[i]]
+        assert type(pair.ncc) is float and pair.ncc == pairs.ncc[i]
+        assert pairs[i] is pair
+
+    # two pairs with the same corner share its Corner view
+    assert pairs[6].corner2 is pairs[7].corner2
+    with pytest.raises(IndexError):
+        pairs[10]
+
+
+@pytest.mark.parametrize("index", [slice(1, 8), slice(None, None, -3), slice(12, 20), np.array([2, 2, 0]),
+                                   np.arange(10) % 2 == 1])
+def test_slices_index_arrays_and_masks_return_a_pair_set(pairs, index):
+    subset = pairs[index]
+    expected = np.arange(10)[index]
+
+    assert isinstance(subset, PairSet)
+    assert len(subset) == len(expected)
+    assert subset.corners1 is pairs.corners1 and subset.corners2 is pairs.corners2
+    assert np.array_equal(subset.ncc, pairs.ncc[expected])
+    assert as_tuples(subset) == [as_tuples(pairs)[i] for i in expected]
+    assert np.array_equal(subset.distances, pairs.distances[expected])
+    assert np.array_equal(subset.compute_gradients(7), pairs.compute_gradients(7)[expected])
+
+
+def test_len(pairs):
+    assert len(pairs) == 10
+    assert len(list(pairs)) == 10
+    assert len(pairs[pairs.ncc > 1]) == 0
+    with pytest.raises(ValueError):
+        PairSet(pairs.corners1, pairs.corners2, [0, 1], [0], [0.5, 0.5])
+
+
+def test_gradient_and_distance_match_the_eager_values(pairs):
+    for pair in pairs:
+        # a Pair of plain corners, as before PairSet
+        plain = Pair(Corner((pair.corner1.y, pair.corner1.x), pair.corner1.corner_response),
+                     Corner((pair.corner2.y, pair.corner2.x), pair.corner2.corner_response), pair.ncc)
+        gradient, distance = eager_values(plain.corner1, plain.corner2)
+        assert plain.gradient == pair.gradient == gradient
+        assert plain.distance == pair.distance == distance
+
+    expected = [eager_values(pair.corner1, pair.corner2) for pair in pairs]
+    assert pairs.compute_gradients().tolist() == [gradient for gradient, _ in expected]
+    assert pairs.distances.tolist() == [distance for _, distance in expected]
+
+
+@pytest.mark.parametrize("width_offset", [0, 1, 40, -5])
+def test_gradients_match_every_pair(pairs, width_offset):
+    # an offset cancelling the x difference of a pair gives the zero denominator rule as well
+    gradients = pairs.compute_gradients(width_offset)
+    assert gradients.tolist() == [pair.cal_gradient(width_offset) for pair in pairs]
+
+
+def test_round_trip_through_pairs(pairs):
+    rebuilt = PairSet.from_pairs(list(pairs))
+    assert as_tuples(rebuilt) == as_tuples(pairs)
+    assert np.array_equal(rebuilt.distances, pairs.distances)
+    assert np.array_equal(rebuilt.compute_gradients(3), pairs.compute_gradients(3))
+    assert PairSet.from_pairs(pairs) is pairs
+    assert len(PairSet.from_pairs([])) == 0
+
+
+def test_pickled_pair_set_is_identical(pairs):
+    pairs[3]
+    unpickled = pickle.loads(pickle.dumps(pairs))
+    assert as_tuples(unpickled) == as_tuples(pairs)
+
+
+def test_pair_points_from_a_set_and_a_list(pairs):
+    points1, points2 = get_pair_points(pairs)
+    assert points1.shape == points2.shape == (10, 2)
+    assert points1.dtype == points2.dtype == np.float64
+    assert np.array_equal(points1, [(p.corner1.x, p.corner1.y) for p in pairs])
+    assert np.array_equal(points2, [(p.corner2.x, p.corner2.y) for p in pairs])
+
+    list_points1, list_points2 = get_pair_points(list(pairs))
+    assert np.array_equal(list_points1, points1) and np.array_equal(list_points2, points2)
+    assert [points.shape for points in get_pair_points([])] == [(0, 2), (0, 2)]
+    assert [points.shape for points in get_pair_points(pairs[:0])] == [(0, 2), (0, 2)]
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+import image_stiching.parallel.executor as executor_module
+import image_stiching.stiching as stiching_module
+from image_stiching.parallel.executor import (detect_and_describe, get_process_pool, parallel_detect_and_describe,
+                                              shutdown_process_pools)
+from image_stiching.homography.ransac import vectorized_ransac
+from image_stiching.util.stage_cache import StageCache
+
+IMAGE = "./images/panoramaStitching/tongariro_left_01.png"
+KWARGS = dict(n_corner=200, alpha=0.04, gaussian_window_size=7, feature_descriptor_patch_size=15)
+
+
+@pytest.fixture(scope="module")
+def px_arrays():
+    _, _, px_array = IORW.readRGBImageAndConvertToGreyscalePixelArray(IMAGE)
+    px_array = np.asarray(px_array, dtype=np.float64)
+    # images of different shapes, the last one as float32
+    return [px_array[:200, :300], px_array[300:450, 500:900], px_array[100:400, 200:400].astype(np.float32)]
+
+
+@pytest.fixture(scope="module")
+def sequential_results(px_arrays):
+    return [detect_and_describe(px_array, **KWARGS) for px_array in px_arrays]
+
+
+@pytest.fixture(autouse=True, scope="module")
+def shutdown_pools():
+    yield
+    shutdown_process_pools()
+
+
+def assert_identical(results, expected):
+    assert len(results) == len(expected)
+    for corners, expected_corners in zip(results, expected):
+        assert np.array_equal(corners.x, expected_corners.x)
+        assert np.array_equal(corners.y, expected_corners.y)
+        assert np.array_equal(corners.corner_response, expected_corners.corner_response)
+        assert corners.feature_descriptors.dtype == expected_corners.feature_descriptors.dtype
+        assert np.array_equal(corners.feature_descriptors, expected_corners.feature_descriptors)
+        assert corners.descriptor_shape == expected_corners.descriptor_shape
+
+
+def test_process_pool_results_are_identical_to_sequential(px_arrays, sequential_results):
+    results = parallel_detect_and_describe(px_arrays, [KWARGS] * len(px_arrays), n_workers=2)
+    assert_identical(results, sequential_results)
+
+
+def test_single_worker_results_are_identical_to_sequential(px_arrays, sequential_results):
+    results = parallel_detect_and_describe(px_arrays, [KWARGS] * len(px_arrays), n_workers=1)
+    assert_identical(results, sequential_results)
+
+
+def test_process_pool_is_reused_across_calls(px_arrays, sequential_results):
+    pool = get_process_pool(2)
+    for _ in range(2):
+        results = parallel_detect_and_describe(px_arrays, [KWARGS] * len(px_arrays), n_workers=2)
+        assert_identical(results, sequential_results)
+        assert get_process_pool(2) is pool
+
+    shutdown_process_pools()
+    assert not executor_module._process_pools
+    assert get_process_pool(2) is not pool
+
+
+def test_injected_executor_is_used_and_left_running(px_arrays, sequential_results, monkeypatch):
+    def fail(n_workers=None):
+        raise AssertionError("the injected executor must be used")
+
+    monkeypatch.setattr(executor_module, "get_process_pool", fail)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = parallel_detect_and_describe(px_arrays, [KWARGS] * len(px_arrays), executor=executor)
+        assert_identical(results, sequential_results)
+        assert executor.submit(sum, [1, 2]).result() == 3
+
+
+def run_cached_stitch(monkeypatch, left, right, cache, **kwargs):
+    # the matches and the homography of stitch, with a seeded RANSAC and without warping or showing the result
+    pairs, homographies = [], []
+    compute_pairs_cached = stiching_module.compute_pairs_cached
+
+    def recording_compute_pairs_cached(*args, **pair_kwargs):
+        key, result = compute_pairs_cached(*args, **pair_kwargs)
+        pairs.append(result)
+        return key, result
+
+    monkeypatch.setattr(stiching_module, "compute_pairs_cached", recording_compute_pairs_cached)
+    monkeypatch.setattr(stiching_module, "vectorized_ransac",
+                        lambda *args, **ransac_kwargs: vectorized_ransac(*args, seed=0, **ransac_kwargs))
+    monkeypatch.setattr(stiching_module, "transform_with_homography", lambda h, **_: homographies.append(h))
+    monkeypatch.setattr(stiching_module, "show_and_save_result", lambda *args, **_: None)
+
+    stiching_module.stitch(left, right, n_corner=300, cache=cache, **kwargs)
+    assert len(pairs) == len(homographies) == 1
+    return pairs[0], homographies[0]
+
+
+def test_cached_stitch_with_workers_is_identical_to_sequential(monkeypatch, tmp_path):
+    _, _, px_array = IORW.readRGBImageAndConvertToGreyscalePixelArray(IMAGE)
+    px_array = np.asarray(px_array)
+    left, right = px_array[200:450, 300:650].tolist(), px_array[213:463, 323:673].tolist()
+
+    expected_pairs, expected_h = run_cached_stitch(monkeypatch, left, right, StageCache(str(tmp_path / "sequential")))
+
+    pooled_images = []
+
+    def counting_parallel_detect_and_describe(px_arrays, *args, **kwargs):
+        pooled_images.append(len(px_arrays))
+        return parallel_detect_and_describe(px_arrays, *args, **kwargs)
+
+    monkeypatch.setattr(stiching_module, "parallel_detect_and_describe", counting_parallel_detect_and_describe)
+    pool_cache = StageCache(str(tmp_path / "pool"))
+    # both images are described in the pool on the first run, and loaded from the cache on the second one
+    for hits in (0, 2):
+        pairs, h = run_cached_stitch(monkeypatch, left, right, pool_cache, n_workers=2)
+        assert pool_cache.hits.get("descriptors", 0) == hits
+        assert pooled_images == [2]
+
+        assert len(pairs) == len(expected_pairs) > 20
+        assert np.array_equal(pairs.index1, expected_pairs.index1)
+        assert np.array_equal(pairs.index2, expected_pairs.index2)
+        assert np.array_equal(pairs.ncc, expected_pairs.ncc)
+        assert np.array_equal(h, expected_h)
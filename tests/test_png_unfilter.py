@@ -0,0 +1,115 @@
+import io
+import math
+import zlib
+
+import numpy as np
+import pytest
+
+import imageIO.png as png
+
+# colour type and bit depth of the PngSuite basic images, basn0g01 to basn6a16
+FORMATS = [(0, 1), (0, 2), (0, 4), (0, 8), (0, 16), (2, 8), (2, 16), (3, 1), (3, 2), (3, 4), (3, 8), (4, 8),
+           (4, 16), (6, 8), (6, 16)]
+PLANES = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# a single filter type for every row like PngSuite f00 to f04, or every filter type in turn like f99
+FILTERS = [0, 1, 2, 3, 4, "mixed"]
+# whole Adam7 blocks like the PngSuite images, and partial blocks with passes of a single pixel row or column
+SIZES = [(32, 32), (37, 9)]
+
+VECTORIZED = {1: png.undo_filter_sub_vectorized, 2: png.undo_filter_up_vectorized,
+              3: png.undo_filter_average_strided, 4: png.undo_filter_paeth_strided}
+REFERENCE = {1: png.undo_filter_sub, 2: png.undo_filter_up, 3: png.undo_filter_average, 4: png.undo_filter_paeth}
+
+
+def paeth_predictor(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def filter_scanline(filter_type, filter_unit, line, previous):
+    # encoder side of the PNG filters, https://www.w3.org/TR/2003/REC-PNG-20031110/#9Filters
+    out = bytearray(len(line))
+    for i, x in enumerate(line):
+        a = line[i - filter_unit] if i >= filter_unit else 0
+        b = previous[i]
+        c = previous[i - filter_unit] if i >= filter_unit else 0
+        predictor = (0, a, b, (a + b) >> 1, paeth_predictor(a, b, c))[filter_type]
+        out[i] = (x - predictor) & 0xff
+    return out
+
+
+def refilter(data, width, height, planes, bitdepth, interlace, filters):
+    """Replace the filter type 0 scanlines written by png.Writer with scanlines filtered by `filters`."""
+    filter_unit = max(1, planes * bitdepth // 8)
+    passes = png.adam7 if interlace else [(0, 0, 1, 1)]
+    raw, out, row = zlib.decompress(data), bytearray(), 0
+    for xstart, ystart, xstep, ystep in passes:
+        if xstart >= width or ystart >= height:
+            continue
+        row_size = math.ceil(math.ceil((width - xstart) / xstep) * planes * bitdepth / 8)
+        previous = bytes(row_size)
+        for _ in range(ystart, height, ystep):
+            assert raw[0] == 0
+            line, raw = raw[1:row_size + 1], raw[row_size + 1:]
+            filter_type = row % 5 if filters == "mixed" else filters
+            out.append(filter_type)
+            out.extend(filter_scanline(filter_type, filter_unit, line, previous))
+            previous, row = line, row + 1
+    assert not raw
+    return zlib.compress(bytes(out))
+
+
+def make_fixture(colour_type, bitdepth, interlace, filters, size, seed=0):
+    width, height = size
+    planes = PLANES[colour_type]
+    pixels = np.random.default_rng(seed).integers(0, 2 ** bitdepth, size=(height, width * planes))
+    palette = [(i, 255 - i, (7 * i) & 0xff) for i in range(2 ** bitdepth)] if colour_type == 3 else None
+    writer = png.Writer(width, height, greyscale=colour_type in (0, 4), alpha=colour_type in (4, 6),
+                        bitdepth=bitdepth, palette=palette, interlace=interlace)
+    written = io.BytesIO()
+    writer.write(written, pixels.tolist())
+
+    chunks = list(png.Reader(bytes=written.getvalue()).chunks())
+    idat = b"".join(data for tag, data in chunks if tag == b"IDAT")
+    chunks = [chunk for chunk in chunks if chunk[0] != b"IDAT"]
+    chunks.insert(-1, (b"IDAT", refilter(idat, width, height, planes, bitdepth, interlace, filters)))
+    fixture = io.BytesIO()
+    png.write_chunks(fixture, chunks)
+    return fixture.getvalue(), pixels
+
+
+def decode(data):
+    _, _, rows, _ = png.Reader(bytes=data).read()
+    return np.array([list(row) for row in rows])
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("filters", FILTERS)
+@pytest.mark.parametrize("interlace", [False, True])
+@pytest.mark.parametrize("colour_type, bitdepth", FORMATS)
+def test_decoding_is_identical_with_and_without_numpy(monkeypatch, colour_type, bitdepth, interlace, filters,
+                                                      size):
+    data, pixels = make_fixture(colour_type, bitdepth, interlace, filters, size)
+    assert np.array_equal(decode(data), pixels)
+
+    monkeypatch.setattr(png, "numpy", None)
+    assert np.array_equal(decode(data), pixels)
+
+
+@pytest.mark.parametrize("filter_unit", [1, 2, 3, 4, 6, 8])
+@pytest.mark.parametrize("filter_type", [1, 2, 3, 4])
+def test_vectorized_unfilters_are_identical_to_reference(filter_type, filter_unit):
+    rng = np.random.default_rng(filter_type * 10 + filter_unit)
+    for n_pixel in [1, 2, 57]:
+        scanline = bytearray(rng.integers(0, 256, size=n_pixel * filter_unit, dtype=np.uint8).tobytes())
+        previous = bytearray(rng.integers(0, 256, size=n_pixel * filter_unit, dtype=np.uint8).tobytes())
+        expected, result = bytearray(scanline), bytearray(scanline)
+
+        REFERENCE[filter_type](filter_unit, scanline, previous, expected)
+        VECTORIZED[filter_type](filter_unit, scanline, previous, result)
+        assert result == expected
@@ -0,0 +1,65 @@
+import zlib
+
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+
+# (height, width) of the images, including a single pixel and a single row
+SHAPES = [(1, 1), (1, 17), (13, 1), (37, 29)]
+
+
+def random_image(shape, planes, seed=0):
+    # a smooth gradient with noise and a flat area, so every filter type wins on some rows
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    gradient = (np.arange(height)[:, None] * 3 + np.arange(width)[None, :] * 5)[..., None] + np.arange(planes) * 40
+    image = (gradient + rng.integers(0, 8, size=(height, width, planes))) % 256
+    image[height // 2:, :width // 3] = 200
+    image = image.astype(np.uint8)
+    return image[:, :, 0] if planes == 1 else image
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("planes", [1, 2, 3, 4])
+@pytest.mark.parametrize("chunk_limit", [1, 64, 2 ** 20])
+def test_written_image_is_read_back_unchanged(tmp_path, shape, planes, chunk_limit):
+    image = random_image(shape, planes)
+    filename = str(tmp_path / "image.png")
+    file_size = IORW.writeNdArrayToPNG(filename, image, chunk_limit=chunk_limit)
+
+    width, height, pixel_array = IORW.readPNGImageToNdArray(filename)
+    assert (width, height) == (shape[1], shape[0])
+    assert pixel_array.dtype == np.uint8
+    assert np.array_equal(pixel_array, image.reshape(shape[0], shape[1], planes))
+    assert file_size == (tmp_path / "image.png").stat().st_size
+
+
+@pytest.mark.parametrize("filter_types", [(IORW.PNG_FILTER_NONE,), (IORW.PNG_FILTER_SUB,), (IORW.PNG_FILTER_UP,),
+                                          (IORW.PNG_FILTER_PAETH,), IORW.PNG_ROW_FILTERS])
+@pytest.mark.parametrize("compression_strategy", [zlib.Z_DEFAULT_STRATEGY, zlib.Z_RLE])
+def test_every_filter_type_is_read_back_unchanged(tmp_path, filter_types, compression_strategy):
+    filename = str(tmp_path / "image.png")
+    for planes in (1, 3):
+        image = random_image((37, 29), planes, seed=planes)
+        IORW.writeNdArrayToPNG(filename, image, compression_strategy=compression_strategy, filter_types=filter_types,
+                               chunk_limit=256)
+        _, _, pixel_array = IORW.readPNGImageToNdArray(filename)
+        assert np.array_equal(pixel_array, image.reshape(37, 29, planes))
+
+
+def test_write_is_only_reported_when_verbose(tmp_path, capsys):
+    filename = str(tmp_path / "image.png")
+    IORW.writeNdArrayToPNG(filename, random_image((5, 5), 3))
+    assert capsys.readouterr().out == ""
+
+    file_size = IORW.writeNdArrayToPNG(filename, random_image((5, 5), 3), verbose=True)
+    assert "size={} bytes".format(file_size) in capsys.readouterr().out
+
+
+def test_rejects_arrays_that_are_not_uint8_images(tmp_path):
+    filename = str(tmp_path / "image.png")
+    with pytest.raises(ValueError):
+        IORW.writeNdArrayToPNG(filename, np.zeros((4, 4), dtype=np.float64))
+    with pytest.raises(ValueError):
+        IORW.writeNdArrayToPNG(filename, np.zeros((4, 4, 5), dtype=np.uint8))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+import image_stiching.pyramid.pyramid as pyramid_module
+from image_stiching.homography.homography import compute_map_points
+from image_stiching.pyramid.pyramid import estimate_homography_coarse_to_fine
+
+IMAGE = "./images/panoramaStitching/tongariro_left_01.png"
+
+# the right image is the left image moved by SHIFT, a left pixel (x, y) is at (x - 23, y - 13) in the right image
+SHIFT = (23, 13)
+
+
+@pytest.fixture(scope="module")
+def shifted_pair():
+    _, _, px_array = IORW.readRGBImageAndConvertToGreyscalePixelArray(IMAGE)
+    px_array = np.asarray(px_array, dtype=np.float64)
+    dx, dy = SHIFT
+    return px_array[200:500, 300:700], px_array[200 + dy:500 + dy, 300 + dx:700 + dx]
+
+
+@pytest.mark.parametrize("n_level", [2, 3])
+def test_corners_are_only_detected_at_the_coarsest_level(monkeypatch, shifted_pair, n_level):
+    detected_shapes = []
+    compute_harris_corner = pyramid_module.compute_harris_corner
+
+    def counting_compute_harris_corner(px_array, *args, **kwargs):
+        detected_shapes.append(np.shape(px_array))
+        return compute_harris_corner(px_array, *args, **kwargs)
+
+    monkeypatch.setattr(pyramid_module, "compute_harris_corner", counting_compute_harris_corner)
+    left, right = shifted_pair
+    h, report = estimate_homography_coarse_to_fine(left, right, n_level=n_level, n_corner=300, return_report=True)
+
+    assert [level["level"] for level in report] == list(range(n_level - 1, -1, -1))
+    assert detected_shapes == [report[0]["shape"]] * 2
+
+    # the propagated correspondences are found again at the finest level, the shift is a whole number of pixels
+    assert report[-1]["inliers"] >= 0.9 * report[0]["inliers"]
+
+    ys, xs = np.mgrid[0:300:25, 0:400:25]
+    mapped_x, mapped_y = compute_map_points(xs.ravel(), ys.ravel(), h)
+    assert np.abs(mapped_x - (xs.ravel() - SHIFT[0])).max() < 0.5
+    assert np.abs(mapped_y - (ys.ravel() - SHIFT[1])).max() < 0.5
+
+
+def test_propagated_corners_are_at_twice_their_coordinates():
+    corners = pyramid_module.CornerSet(np.array([3, 10]), np.array([7, 0]), np.array([0.5, 2.0]))
+    propagated = pyramid_module.propagate_corners(corners)
+
+    assert np.array_equal(propagated.x, [6, 20])
+    assert np.array_equal(propagated.y, [14, 0])
+    assert np.array_equal(propagated.corner_response, corners.corner_response)
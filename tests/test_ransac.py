@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from image_stiching.corner import CornerSet
+from image_stiching.homography.homography import compute_homography
+from image_stiching.homography.ransac import format_ransac_report, vectorized_ransac
+from image_stiching.pair import PairSet
+
+HOMOGRAPHY = np.array([[1.05, 0.02, -30.0], [-0.01, 0.98, 12.0], [1e-5, -2e-5, 1.0]])
+
+
+def make_pairs(points1, points2):
+    points1, points2 = np.asarray(points1, dtype=np.float64), np.asarray(points2, dtype=np.float64)
+    n = len(points1)
+    corners1 = CornerSet(points1[:, 0], points1[:, 1], np.ones(n))
+    corners2 = CornerSet(points2[:, 0], points2[:, 1], np.ones(n))
+    return PairSet(corners1, corners2, np.arange(n), np.arange(n), np.ones(n))
+
+
+def project(points, homography):
+    projected = np.hstack([points, np.ones((len(points), 1))]) @ homography.T
+    return projected[:, :2] / projected[:, 2:]
+
+
+def make_scene(n_inlier, n_outlier, seed=0):
+    rng = np.random.default_rng(seed)
+    # the corners are at whole pixels, the inliers are within 0.71 pixel of the homography
+    points1 = np.round(rng.uniform(0, 500, size=(n_inlier + n_outlier, 2)))
+    points2 = np.round(project(points1, HOMOGRAPHY))
+    points2[n_inlier:] = np.round(rng.uniform(0, 500, size=(n_outlier, 2)))
+    return make_pairs(points1, points2)
+
+
+def test_recovers_the_homography_and_the_inliers():
+    pairs = make_scene(60, 40)
+    inliers = vectorized_ransac(pairs, 2000, 1.0, seed=0)
+
+    assert np.array_equal(np.sort(inliers.index1), np.arange(60))
+    grid = np.stack(np.meshgrid(np.arange(0, 500, 50), np.arange(0, 500, 50)), axis=-1).reshape(-1, 2)
+    assert np.abs(project(grid, compute_homography(inliers)) - project(grid, HOMOGRAPHY)).max() < 1
+
+
+@pytest.mark.parametrize("n_pair", [0, 1, 3])
+def test_too_few_pairs_raise(n_pair):
+    pairs = make_scene(n_pair, 0)
+    with pytest.raises(ValueError, match="At least 4 pairs"):
+        vectorized_ransac(pairs, 100, 1.0, seed=0)
+    with pytest.raises(ValueError, match="At least 4 pairs"):
+        compute_homography(pairs)
+
+
+def test_degenerate_pairs_raise():
+    # every sample of collinear points is rejected, so there is no hypothesis at all
+    points = np.stack([np.arange(8) * 10.0, np.arange(8) * 5.0], axis=1)
+    with pytest.raises(ValueError, match="degenerate"):
+        vectorized_ransac(make_pairs(points, points), 100, 1.0, seed=0)
+
+
+def test_adaptive_termination_only_draws_the_batches_it_scores(monkeypatch):
+    import image_stiching.homography.ransac as ransac_module
+
+    drawn = []
+    draw = ransac_module.draw_minimal_samples
+
+    def counting_draw(left_points, right_points, n_sample, rng, *args, **kwargs):
+        samples = draw(left_points, right_points, n_sample, rng, *args, **kwargs)
+        drawn.append(len(samples))
+        return samples
+
+    monkeypatch.setattr(ransac_module, "draw_minimal_samples", counting_draw)
+    inliers, report = vectorized_ransac(make_scene(90, 10), 100000, 1.0, batch_size=100, seed=0, confidence=0.99,
+                                        return_report=True)
+
+    assert report["confidence"] >= 0.99
+    assert report["iterations"] <= 100
+    assert drawn == [100]
+
+
+def test_without_confidence_every_iteration_is_evaluated():
+    _, report = vectorized_ransac(make_scene(30, 30), 250, 1.0, batch_size=100, seed=0, return_report=True)
+    assert report["iterations"] == 250
+
+
+def test_report_is_returned_and_not_printed(capsys):
+    _, report = vectorized_ransac(make_scene(60, 40), 500, 1.0, seed=0, return_report=True)
+    assert "RANSAC" not in capsys.readouterr().out
+    assert format_ransac_report(report).startswith("[INFO] RANSAC iterations: %d," % report["iterations"])
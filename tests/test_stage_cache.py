@@ -0,0 +1,180 @@
+import os
+
+import numpy as np
+import pytest
+
+import image_stiching.util.stage_cache as stage_cache_module
+from image_stiching.parallel.executor import shutdown_process_pools
+from image_stiching.stiching import (compute_described_corners_cached, compute_described_corners_cached_in_pool,
+                                     get_descriptors_key)
+from image_stiching.util.stage_cache import STAGE_VERSIONS, StageCache, hash_array
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return StageCache(str(tmp_path / "stages"))
+
+
+def entry_names(cache):
+    return sorted(os.listdir(cache.directory))
+
+
+def test_key_changes_with_the_input_arrays():
+    image = np.arange(12, dtype=np.int64).reshape(3, 4)
+    key = StageCache.make_key("harris_response", [hash_array(image)], dict(alpha=0.04))
+
+    changed = image.copy()
+    changed[1, 2] += 1
+    assert StageCache.make_key("harris_response", [hash_array(image.copy())], dict(alpha=0.04)) == key
+    assert StageCache.make_key("harris_response", [hash_array(changed)], dict(alpha=0.04)) != key
+    # the same bytes with another shape or dtype are another input
+    assert StageCache.make_key("harris_response", [hash_array(image.reshape(4, 3))], dict(alpha=0.04)) != key
+    assert StageCache.make_key("harris_response", [hash_array(image.view(np.float64))], dict(alpha=0.04)) != key
+
+
+def test_key_changes_with_the_parameters():
+    key = StageCache.make_key("corners", ["input"], dict(n_corner=1000, alpha=0.04))
+
+    assert StageCache.make_key("corners", ["input"], dict(alpha=0.04, n_corner=1000)) == key
+    assert StageCache.make_key("corners", ["input"], dict(n_corner=999, alpha=0.04)) != key
+    assert StageCache.make_key("corners", ["input"], dict(n_corner=1000)) != key
+    assert StageCache.make_key("corners", ["other input"], dict(n_corner=1000, alpha=0.04)) != key
+    assert StageCache.make_key("descriptors", ["input"], dict(n_corner=1000, alpha=0.04)) != key
+
+
+def test_key_changes_with_the_stage_version(monkeypatch):
+    key = StageCache.make_key("matches", ["input"], dict(threshold=0.9))
+    monkeypatch.setitem(STAGE_VERSIONS, "matches", STAGE_VERSIONS["matches"] + 1)
+    assert StageCache.make_key("matches", ["input"], dict(threshold=0.9)) != key
+
+
+def test_compute_is_only_called_on_a_miss(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"response": np.arange(6.0).reshape(2, 3), "count": np.array(3)}
+
+    key, computed = cache.get_or_compute("harris_response", ["image"], dict(alpha=0.04), compute)
+    assert len(calls) == 1
+
+    for _ in range(2):
+        hit_key, stored = cache.get_or_compute("harris_response", ["image"], dict(alpha=0.04), compute)
+        assert hit_key == key
+        assert len(calls) == 1
+        assert stored.keys() == computed.keys()
+        for name in computed:
+            assert stored[name].dtype == computed[name].dtype
+            assert np.array_equal(stored[name], computed[name])
+
+    cache.get_or_compute("harris_response", ["image"], dict(alpha=0.05), compute)
+    assert len(calls) == 2
+    assert cache.hits == {"harris_response": 2}
+    assert cache.misses == {"harris_response": 2}
+
+
+def test_no_directory_always_computes():
+    cache = StageCache(None)
+    calls = []
+    for _ in range(2):
+        cache.get_or_compute("homography", ["pairs"], None, lambda: calls.append(1) or {"homography": np.eye(3)})
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted_by_mtime(cache):
+    arrays = {"data": np.zeros(1000, dtype=np.uint8)}
+    for i, key in enumerate("abc"):
+        cache.put("matches", key, arrays)
+        path = cache.get_path("matches", key)
+        os.utime(path, (1000 + i, 1000 + i))
+    entry_size = os.path.getsize(cache.get_path("matches", "a"))
+
+    # reading a marks it as the most recently used, b is now the oldest
+    assert cache.get("matches", "a") is not None
+    cache.max_bytes = 3 * entry_size
+    cache.put("matches", "d", arrays)
+
+    assert entry_names(cache) == ["matches-a.npz", "matches-c.npz", "matches-d.npz"]
+    assert cache.evictions == 1
+
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert entry_names(cache) == ["matches-a.npz", "matches-d.npz"]
+    assert cache.evictions == 2
+
+
+def test_interrupted_put_leaves_no_entry(cache, monkeypatch):
+    cache.put("matches", "old", {"data": np.arange(10)})
+    save = np.savez
+
+    def interrupted_save(file, **arrays):
+        save(file, **arrays)
+        file.truncate(file.tell() // 2)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(stage_cache_module.np, "savez", interrupted_save)
+    for key in ("new", "old"):
+        with pytest.raises(KeyboardInterrupt):
+            cache.put("matches", key, {"data": np.arange(100000)})
+
+    # the new entry does not exist and the old one is unchanged, no partial file is left behind
+    assert cache.get("matches", "new") is None
+    assert np.array_equal(cache.get("matches", "old")["data"], np.arange(10))
+    assert entry_names(cache) == ["matches-old.npz"]
+
+
+def test_truncated_entry_is_a_miss(cache):
+    cache.put("matches", "key", {"data": np.arange(1000)})
+    path = cache.get_path("matches", "key")
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) // 2)
+
+    assert cache.get("matches", "key") is None
+
+
+def test_get_or_compute_all_only_computes_the_missing_entries(cache):
+    cache.put("descriptors", "b", {"data": np.array([2])})
+    computed = []
+
+    def compute(missing):
+        computed.append(missing)
+        return [{"data": np.array([i * 10])} for i in missing]
+
+    entries = cache.get_or_compute_all("descriptors", ["a", "b", "c"], compute)
+    assert computed == [[0, 2]]
+    assert [entry["data"][0] for entry in entries] == [0, 2, 20]
+
+    entries = cache.get_or_compute_all("descriptors", ["a", "b", "c"], compute)
+    assert computed == [[0, 2]]
+    assert [entry["data"][0] for entry in entries] == [0, 2, 20]
+    assert cache.hits == {"descriptors": 4}
+    assert cache.misses == {"descriptors": 2}
+
+
+def test_described_corners_in_pool_are_identical_to_sequential(tmp_path):
+    rng = np.random.default_rng(0)
+    px_arrays = [rng.integers(0, 256, size=(80, 90)), rng.integers(0, 256, size=(70, 60))]
+    kwargs_list = [dict(n_corner=50, alpha=0.04, gaussian_window_size=7, feature_descriptor_patch_size=15),
+                   dict(n_corner=80, alpha=0.05, gaussian_window_size=5, feature_descriptor_patch_size=11)]
+    expected = [compute_described_corners_cached(StageCache(str(tmp_path / "sequential")), px_array, **kwargs)
+                for px_array, kwargs in zip(px_arrays, kwargs_list)]
+
+    pool_cache = StageCache(str(tmp_path / "pool"))
+    try:
+        # the first image is cached, only the second one is sent to the pool, then both are cached
+        compute_described_corners_cached(pool_cache, px_arrays[0], **kwargs_list[0])
+        for _ in range(2):
+            results = compute_described_corners_cached_in_pool(pool_cache, px_arrays, kwargs_list, n_workers=2)
+            for (key, corners), (expected_key, expected_corners), px_array, kwargs \
+                    in zip(results, expected, px_arrays, kwargs_list):
+                assert key == expected_key == get_descriptors_key(hash_array(px_array), **kwargs)
+                assert np.array_equal(corners.x, expected_corners.x)
+                assert np.array_equal(corners.y, expected_corners.y)
+                assert np.array_equal(corners.corner_response, expected_corners.corner_response)
+                assert np.array_equal(corners.feature_descriptors, expected_corners.feature_descriptors)
+                assert corners.descriptor_shape == expected_corners.descriptor_shape
+    finally:
+        shutdown_process_pools()
+
+    assert pool_cache.hits["descriptors"] == 3
+    assert pool_cache.misses["descriptors"] == 2
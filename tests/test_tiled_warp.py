@@ -0,0 +1,111 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import imageIO.readwrite as IORW
+import image_stiching.homography.homography as homography_module
+from image_stiching.homography.homography import bruteforce_warp_and_blend, transform_with_homography, warp_and_blend
+
+LEFT_IMAGE = "./images/panoramaStitching/tongariro_left_01.png"
+RIGHT_IMAGE = "./images/panoramaStitching/tongariro_right_01.png"
+
+# homography of the Tongariro pair, mapping the left image to the right image
+HOMOGRAPHY = np.array([[1.32706304e+00, -3.37888156e-02, -2.69139724e+02],
+                       [1.23397784e-01, 1.15211593e+00, -5.34907533e+01],
+                       [3.48794355e-04, -5.61831513e-05, 1.0]])
+
+
+def rotation_about(angle, x, y):
+    cos, sin = np.cos(angle), np.sin(angle)
+    return np.array([[cos, -sin, x - cos * x + sin * y], [sin, cos, y - sin * x - cos * y], [0.0, 0.0, 1.0]])
+
+
+# homographies mapping the left image coordinate to the right image coordinate, every one of them maps part of the
+# canvas outside the right image
+WARP_HOMOGRAPHIES = {
+    "translation": np.array([[1.0, 0.0, -23.5], [0.0, 1.0, 4.25], [0.0, 0.0, 1.0]]),
+    "rotation": rotation_about(0.3, 20, 15) @ np.array([[1.0, 0.0, -30.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]),
+    "perspective": np.array([[1.1, 0.05, -35.0], [0.03, 0.95, 2.0], [1.5e-3, -8e-4, 1.0]]),
+}
+
+
+@pytest.mark.parametrize("name", WARP_HOMOGRAPHIES)
+def test_warp_and_blend_is_identical_to_bruteforce(name):
+    # random colours, some blended pixels differ by more than the blend threshold and some by less
+    rng = np.random.default_rng(0)
+    left = rng.integers(0, 256, size=(31, 43, 3)).astype(np.uint8)
+    right = np.clip(left.astype(np.int64) + rng.integers(-40, 40, size=left.shape), 0, 255).astype(np.uint8)
+    homography = WARP_HOMOGRAPHIES[name]
+
+    expected = bruteforce_warp_and_blend(homography, left, right)
+    result = warp_and_blend(homography, left, right)
+    assert result.dtype == expected.dtype
+    assert np.array_equal(result, expected)
+
+    # pixels of the canvas right of the left image map outside the right image and are left black
+    assert np.any(np.all(expected[:, 43:] == 0, axis=-1))
+
+
+@pytest.fixture(scope="module")
+def untiled_result():
+    return transform_with_homography(HOMOGRAPHY, LEFT_IMAGE, RIGHT_IMAGE)
+
+
+def test_memmap_decode_is_identical_to_in_memory_decode():
+    memmap_array = IORW.readRGBImageToMemmap(LEFT_IMAGE)
+    assert isinstance(memmap_array, np.memmap)
+    assert np.array_equal(memmap_array, IORW.readRGBImageAndConvertToNdArray(LEFT_IMAGE))
+
+
+@pytest.mark.parametrize("tile_size", [97, 256])
+def test_tiled_result_is_identical_to_untiled(untiled_result, tile_size):
+    result = transform_with_homography(HOMOGRAPHY, LEFT_IMAGE, RIGHT_IMAGE, tile_size=tile_size)
+
+    assert isinstance(result, np.memmap)
+    assert np.array_equal(result, untiled_result)
+
+
+def test_streamed_tiles_cover_the_canvas_once(untiled_result):
+    canvas = np.zeros(untiled_result.shape, dtype=np.uint16)
+    tiles = {}
+
+    def write_tile(y, x, tile):
+        canvas[y:y + tile.shape[0], x:x + tile.shape[1]] += 1
+        tiles[(y, x)] = tile
+
+    assert transform_with_homography(HOMOGRAPHY, LEFT_IMAGE, RIGHT_IMAGE, tile_size=200, write_tile=write_tile) is None
+    assert np.all(canvas == 1)
+    for (y, x), tile in tiles.items():
+        assert np.array_equal(tile, untiled_result[y:y + tile.shape[0], x:x + tile.shape[1]])
+
+
+def measure_tiled_peak_memory(tmp_path, height):
+    # random pixels do not compress, small IDAT chunks so that the reader never holds much of the file
+    rgb_image = np.random.default_rng(0).integers(0, 256, size=(height, 320, 3)).astype(np.uint8)
+    left_path, right_path = str(tmp_path / f"left_{height}.png"), str(tmp_path / f"right_{height}.png")
+    IORW.writeNdArrayToPNG(left_path, rgb_image, chunk_limit=2 ** 14)
+    IORW.writeNdArrayToPNG(right_path, rgb_image[:, ::-1].copy(), chunk_limit=2 ** 14)
+    translation = np.array([[1.0, 0.0, -160.0], [0.0, 1.0, 5.0], [0.0, 0.0, 1.0]])
+
+    # numpy reports its allocations to tracemalloc, the memmaps are file backed and not counted
+    tracemalloc.start()
+    try:
+        transform_with_homography(translation, left_path, right_path, tile_size=64,
+                                  write_tile=lambda y, x, tile: None)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_tiled_peak_memory_does_not_grow_with_the_images(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("the tiled warp must not decode a whole source image in memory")
+
+    monkeypatch.setattr(homography_module.IORW, "readRGBImageAndConvertToNdArray", fail)
+    monkeypatch.setattr(homography_module.IORW, "readRGBImageToNdArray", fail)
+
+    small_peak = measure_tiled_peak_memory(tmp_path, 64)
+    large_peak = measure_tiled_peak_memory(tmp_path, 512)
+    # 8 times the pixels, the same tiles
+    assert large_peak < 1.1 * small_peak